@@ -1,12 +1,14 @@
 """ analyser.py """
-from typing import List, Optional 
+from typing import Dict, List, Optional 
 from datetime import datetime
+import asyncio
 import logging
 import re
 
 from fastapi import APIRouter, Query, HTTPException, Request
 
-from app.core.elasticsearcher import get_elasticsearch_client, build_combined_query
+from app.core.elasticsearcher import es_search, es_count, build_combined_query
+from app.core.cache import cached_response
 
 from app.models.response_models import (
     TopicSummary, TrendPoint, SentimentDistribution, Metadata, ArtistMentionsResponse, 
@@ -23,6 +25,21 @@ import json
 router = APIRouter()
 logger = logging.getLogger(__name__)
 
+# Period labels of the trend buckets; each interval needs its own so buckets stay distinct
+# (weeks use the week-based year, so the days around New Year get the right week)
+PERIOD_FORMATS = {
+    IntervalEnum.hour: "yyyyMMddHH",
+    IntervalEnum.day: "yyyyMMdd",
+    IntervalEnum.week: "YYYY-'W'ww",
+    IntervalEnum.month: "yyyyMM",
+}
+
+# Text fields searched for artist aliases while posts are not tagged with artist_ids yet
+MENTION_TEXT_FIELDS = ["content", "title"]
+
+# Set once a post with artist_ids has been seen; tagged posts are never untagged
+_artist_ids_tagged = False
+
 example_artist_mention_counts_response = {
     "mentions": {
         "Taylor Swift": 20,
@@ -40,6 +57,7 @@ example_artist_mention_counts_final_response = {
 
 
 @router.get("/total-artists-mention-count", response_model=ArtistMentionsCountResponse, tags=["analyser"]) 
+@cached_response("total-artists-mention-count")
 async def get_total_artists_mention_count(request: Request):
     """
     Get artists mention post counts in artists index.
@@ -48,11 +66,9 @@ async def get_total_artists_mention_count(request: Request):
         artist_data = request.app.state.my_data
         logger.info(f"artist_data: {artist_data}")
 
-        print("Querying international artists...")
-        results_artists = process_artist_group(artist_data.get("artists", {}))   
-
-        print("Querying Australian artists...")
-        results_artists_au = process_artist_group(artist_data.get("artists_au", {}))
+        print("Querying international and Australian artists...")
+        results_artists, results_artists_au = await process_artist_groups(
+            artist_data.get("artists", {}), artist_data.get("artists_au", {}))
 
         mentions = {"international": results_artists, "australia": results_artists_au}
         
@@ -89,6 +105,7 @@ async def get_total_artists_mention_count(request: Request):
                     }
                     }
             }, tags=["analyser"])
+@cached_response("mention-count-by-artist-final")
 async def get_mention_count_by_artist_final(request: Request):
     """
     Get artists mention post counts in artists index.
@@ -97,11 +114,9 @@ async def get_mention_count_by_artist_final(request: Request):
         artist_data = request.app.state.my_data
         logger.info(f"artist_data: {artist_data}")
 
-        print("Querying international artists...")
-        results_artists = process_artist_group(artist_data.get("artists", {}))   
-
-        print("Querying Australian artists...")
-        results_artists_au = process_artist_group(artist_data.get("artists_au", {}))
+        print("Querying international and Australian artists...")
+        results_artists, results_artists_au = await process_artist_groups(
+            artist_data.get("artists", {}), artist_data.get("artists_au", {}))
 
         mentions = {"international": results_artists, "australia": results_artists_au}
         
@@ -127,65 +142,21 @@ async def get_mention_count_by_artist_final(request: Request):
                     }
                     }
             }, tags=["analyser"])
+@cached_response("mention-count-by-artist")
 async def get_mention_count_by_artist(request: Request):
     """
     Get artists mention post counts in artists index.
     """
 
     data = request.app.state.my_data
-   
-    artists = []
-    for artist_dict in [data["artists"], data["artists_au"]]:
-        for names in artist_dict.values():
-            artists.extend(names)
 
-    logger.info(f"artists: {artists}")
+    # Canonical names (the artist_ids set on posts at ingest) and their aliases
+    artist_groups = merge_artist_groups(data["artists"], data["artists_au"])
 
-    artists = list(OrderedDict.fromkeys(artists))
+    logger.info(f"artists: {list(artist_groups)}")
 
     try:
-        es = get_elasticsearch_client()
-        # Construct filters for the DSL
-        filters = {
-            artist: {
-                "match_phrase": {
-                "content": artist
-                }
-            }
-        for artist in artists
-        }
-
-        query = {
-            "size": 0,
-            "aggs": {
-                "artist_mentions": {
-                    "filters": {
-                        "filters": filters
-                    }
-                }
-            }
-        }
-
-        logger.info(f"DSL Query: {query}")
-
-        response = es.search(index=settings.ELASTICSEARCH_ARTISTS_INDEX, body=query)
-        buckets = response["aggregations"]["artist_mentions"]["buckets"]
-
-        alias_to_canonical = {}
-        for artist_group in [data["artists"], data["artists_au"]]:
-            for canonical, aliases in artist_group.items():
-                for alias in aliases:
-                    alias_to_canonical[alias] = canonical
-
-        # Aggregate counts
-        results = {}
-        for alias, info in buckets.items():
-            canonical = alias_to_canonical.get(alias)
-            if canonical:
-                results[canonical] = results.get(canonical, 0) + info["doc_count"]
-
-        mentions = results
-        #mentions = {artist: buckets.get(artist, {}).get("doc_count", 0) for artist in artists}
+        mentions = await count_artist_mentions(artist_groups)
         logger.info(f"mentions: {mentions}")
 
         return ArtistMentionsResponse(mentions=mentions)
@@ -214,70 +185,89 @@ example_artist_mention_counts_trend_response = {
                     }
                     }
             }, tags=["analyser"])
+@cached_response("artist-mention-counts-trend")
 async def get_artist_mention_counts_trend(request: Request):
     """
     Get artists mention post counts in artists index.
     """
     data = request.app.state.my_exact_data
-   
-    artists = []
-    for artist_dict in [data["artists"], data["artists_au"]]:
-        for names in artist_dict.values():
-            artists.extend(names)
 
-    logger.info(f"artists: {artists}")
+    # Each exact-name list holds just its canonical name, the artist_ids set on posts at ingest
+    artists = list(OrderedDict.fromkeys(
+        artist for artist_dict in [data["artists"], data["artists_au"]] for artist in artist_dict
+    ))
 
-    artists = list(OrderedDict.fromkeys(artists))
+    logger.info(f"artists: {artists}")
 
+    if settings.USE_SENTIMENT_ROLLUPS:
+        try:
+            return ArtistMentionsTrendResponse(mentions=await rollup_monthly_mentions(artists))
+        except Exception as e:
+            logger.warning(f"Sentiment rollups unavailable, counting raw posts: {e}")
 
     try:
-        es = get_elasticsearch_client()
-        # Construct filters for the DSL
-        
-        filters = {
-            artist: {
-                "match_phrase": {
-                "content": artist
+        monthly_trend = {
+            "monthly_trend": {
+                "date_histogram": {
+                    "field": "created_at",
+                    "calendar_interval": "month",
+                    "format": "yyyyMM"
                 }
             }
-        for artist in artists
         }
-
-        query = {
-            "size": 0,
-            "aggs": {
-                "artist_filters": {
-                    "filters": {
-                        "filters": filters
-                    },
-                    "aggs": {
-                        "monthly_trend": {
-                            "date_histogram": {
-                                "field": "created_at",
-                                "calendar_interval": "month",
-                                "format": "yyyyMM"
-                            }
-                        }
+        if await artist_ids_tagged():
+            query = {
+                "size": 0,
+                "query": {
+                    "terms": {
+                        "artist_ids": artists
+                    }
+                },
+                "aggs": {
+                    "artist_terms": {
+                        "terms": {
+                            "field": "artist_ids",
+                            "include": artists,
+                            "size": len(artists)
+                        },
+                        "aggs": monthly_trend
+                    }
+                }
+            }
+        else:
+            # No post tagged yet (before the artist-ids backfill): search the aliases in the text
+            alias_data = request.app.state.my_data
+            artist_groups = merge_artist_groups(alias_data["artists"], alias_data["artists_au"])
+            query = {
+                "size": 0,
+                "aggs": {
+                    "artist_terms": {
+                        "filters": {"filters": artist_mention_filters(
+                            {artist: artist_groups.get(artist, [artist]) for artist in artists})},
+                        "aggs": monthly_trend
                     }
                 }
             }
-        }
 
-        mentions = {}
+        # Artists without posts are listed too, in the configured order
+        mentions = {artist: {} for artist in artists}
         
         logger.info(f"DSL Query: {query}")
 
-        response = es.search(index=settings.ELASTICSEARCH_ARTISTS_INDEX, body=query)
+        response = await es_search(index=settings.ELASTICSEARCH_ARTISTS_INDEX, body=query)
         
-        buckets = response["aggregations"]["artist_filters"]["buckets"]
+        buckets = response["aggregations"]["artist_terms"]["buckets"]
+        if isinstance(buckets, dict):
+            # Keyed filters buckets of the text search
+            buckets = [{"key": artist, **bucket} for artist, bucket in buckets.items()]
 
-        for artist, bucket in buckets.items():
+        for bucket in buckets:
             monthly_buckets = bucket.get("monthly_trend", {}).get("buckets", [])
             monthly_counts = {
                 entry["key_as_string"]: entry["doc_count"]
                 for entry in monthly_buckets
             }
-            mentions[artist] = monthly_counts
+            mentions[bucket["key"]] = monthly_counts
 
         result = ArtistMentionsTrendResponse(mentions=mentions)
         logger.info(f"response: {result}")
@@ -289,7 +279,9 @@ async def get_artist_mention_counts_trend(request: Request):
 
 
 @router.get("/sentiment_trends_per_artist", response_model=List[TrendPoint], tags=["analyser"])
+@cached_response("sentiment_trends_per_artist")
 async def get_trends(
+    request: Request,
     artist: str = Query(None, example="Katy Perry"),
     interval: IntervalEnum = Query(IntervalEnum.month, example=IntervalEnum.month),
     startTime: Optional[datetime] = Query(
@@ -307,9 +299,26 @@ async def get_trends(
     Get sentiment trend over time.
     Returns time-series trend data for a specific artist.
     """
-    try:
-        es = get_elasticsearch_client()
+    canonical = canonical_artist(artist, request.app.state.my_data)
+    if settings.USE_SENTIMENT_ROLLUPS and canonical is not None:
+        try:
+            return await rollup_trends(canonical, interval, startTime, endTime)
+        except Exception as e:
+            logger.warning(f"Sentiment rollups unavailable, counting raw posts: {e}")
+
+    if canonical is not None:
+        # Canonical artist_ids set on posts at ingest
+        artist_clauses = [{"term": {"artist_ids": canonical}}]
+    else:
+        # Names outside artists.json are searched in the content and tags, ignoring case and
+        # repeated spaces like the response cache key (match_phrase on the content already does)
+        artist_name = " ".join((artist or "").split())
+        artist_clauses = [
+            {"match_phrase": {"content": artist_name}},
+            {"term": {"tags.keyword": {"value": artist_name, "case_insensitive": True}}}
+        ]
 
+    try:
         query = {
                 "bool": {
                     "must": [
@@ -322,18 +331,7 @@ async def get_trends(
                         }
                         }
                     ],
-                    "should": [
-                        {
-                            "match_phrase": {
-                                "content": artist
-                            }
-                        },
-                        {
-                            "term": {
-                                "tags.keyword": artist
-                            }
-                        }
-                    ],
+                    "should": artist_clauses,
                     "minimum_should_match": 1
                 }
             }
@@ -343,7 +341,7 @@ async def get_trends(
                     "date_histogram": {
                         "field": "created_at",
                         "calendar_interval": interval,
-                        "format": "yyyyMM"
+                        "format": PERIOD_FORMATS[IntervalEnum(interval)]
                     },
                     "aggs": {
                         "positive": {
@@ -375,7 +373,7 @@ async def get_trends(
         logger.info(f"DSL Aggs: {aggs}")
 
         # Run aggregation query
-        response = es.search(
+        response = await es_search(
             index=settings.ELASTICSEARCH_ARTISTS_INDEX,
             size=0,
             query=query,
@@ -402,48 +400,40 @@ async def get_trends(
 
 
 @router.get("/sentiment-distribution-by-artist", response_model=SentimentCountResponse, tags=["analyser"])
-async def get_sentiment_distribution(artist: Optional[str] = Query(None, example="Katy Perry")):
+@cached_response("sentiment-distribution-by-artist")
+async def get_sentiment_distribution(
+    request: Request,
+    artist: Optional[str] = Query(None, example="Katy Perry")
+):
     """
     Get sentiment distribution.
     Returns sentiment distribution for a given artist.
     """
     try:
-        es = get_elasticsearch_client()
-        userInput = sanitize_input(artist)
-    
-        #artist_pattern = f".*{userInput.lower().replace(' ', '.*')}.*"
-
-        filters = {
-            userInput: {
-                "match_phrase": {
-                "content": userInput
-                }
-            }
-        }
+        canonical = canonical_artist(artist, request.app.state.my_data)
+        if canonical is not None:
+            # Canonical artist_ids set on posts at ingest
+            artist_query = {"term": {"artist_ids": canonical}}
+        else:
+            # Names outside artists.json are searched in the content
+            artist_query = {"match_phrase": {"content": sanitize_input(artist)}}
 
         query = {
-        "size": 0,
-        "aggs": {
-            "artist_filters": {
-                "filters": {
-                    "filters": filters
-                },
-                "aggs": {
-                    "sentiment_counts": {
-                        "terms": {
-                            "field": "roberta_sentiment_label.keyword"
-                        }
+            "size": 0,
+            "query": artist_query,
+            "aggs": {
+                "sentiment_counts": {
+                    "terms": {
+                        "field": "roberta_sentiment_label.keyword"
                     }
                 }
             }
         }
-    }
 
         logger.info(f"DSL Query: {query}")   
-        response = es.search(index=settings.ELASTICSEARCH_ARTISTS_INDEX, body=query)
+        response = await es_search(index=settings.ELASTICSEARCH_ARTISTS_INDEX, body=query)
 
-        buckets = response["aggregations"]["artist_filters"]["buckets"]
-        sentiment_buckets = buckets[userInput]["sentiment_counts"]["buckets"]
+        sentiment_buckets = response["aggregations"]["sentiment_counts"]["buckets"]
 
         sentiments = {bucket["key"]: bucket["doc_count"] for bucket in sentiment_buckets}
 
@@ -461,10 +451,8 @@ async def get_metadata():
     Returns metadata about the dataset such as last post creation time.
     """
     try:
-        es = get_elasticsearch_client()
-        
         # Get total post count
-        count_response = es.count(index=settings.ELASTICSEARCH_ARTISTS_INDEX)
+        count_response = await es_count(index=settings.ELASTICSEARCH_ARTISTS_INDEX)
         total_posts = count_response["count"]
         
         # Get unique topics count
@@ -478,7 +466,7 @@ async def get_metadata():
 
         logger.info(f"DSL Aggs: {aggs}")
         
-        response = es.search(
+        response = await es_search(
             index=settings.ELASTICSEARCH_ARTISTS_INDEX,
             size=0,
             aggs=aggs
@@ -512,43 +500,269 @@ def sanitize_input(user_input: str) -> str:
 
     return sanitized
 
-# Get post count for artist
-def get_post_count(aliases):
+def merge_artist_groups(*artist_dicts) -> Dict[str, List[str]]:
+    """Canonical name -> aliases of the given artist dicts, in the configured order"""
+    artist_groups = OrderedDict()
+    for artist_dict in artist_dicts:
+        for artist, aliases in artist_dict.items():
+            artist_groups.setdefault(artist, aliases)
+    return artist_groups
 
 
-    should_clauses = [{"match_phrase": {"content": alias}} for alias in aliases]
-    query = {
-        "query": {
+def artist_mention_filters(artist_groups: Dict[str, List[str]]) -> Dict[str, dict]:
+    """Phrase filters matching any alias of each artist in the post text, keyed by canonical name"""
+    return {
+        artist: {
             "bool": {
-                "should": should_clauses,
+                "should": [{"match_phrase": {field: alias}} for alias in OrderedDict.fromkeys([artist, *aliases])
+                           for field in MENTION_TEXT_FIELDS],
                 "minimum_should_match": 1
             }
-        },
-        "track_total_hits": True,
-        "size": 0
+        }
+        for artist, aliases in artist_groups.items()
     }
 
-    try:
 
-        es = get_elasticsearch_client()
+async def artist_ids_tagged() -> bool:
+    """Whether any post in the artists index has artist_ids yet"""
+    global _artist_ids_tagged
+    if not _artist_ids_tagged:
+        response = await es_count(index=settings.ELASTICSEARCH_ARTISTS_INDEX,
+                                  query={"exists": {"field": "artist_ids"}})
+        _artist_ids_tagged = response["count"] > 0
+    return _artist_ids_tagged
+
+
+# Get post counts for every artist with one terms aggregation
+async def count_artist_mentions(artist_groups: Dict[str, List[str]]) -> Dict[str, int]:
+    """
+    Count the posts tagged with each canonical artist id (artist_ids, set at ingest).
+    Until any post is tagged, count the posts whose text contains one of the artist's aliases.
+    """
+    artists = list(artist_groups)
+    if not artists:
+        return {}
 
-        response = es.search(
+    if not await artist_ids_tagged():
+        response = await es_search(
             index=settings.ELASTICSEARCH_ARTISTS_INDEX,
-            body=query
+            size=0,
+            aggs={"artist_mentions": {"filters": {"filters": artist_mention_filters(artist_groups)}}})
+        buckets = response["aggregations"]["artist_mentions"]["buckets"]
+        return {artist: buckets[artist]["doc_count"] for artist in artists}
+
+    response = await es_search(
+        index=settings.ELASTICSEARCH_ARTISTS_INDEX,
+        size=0,
+        query={"terms": {"artist_ids": artists}},
+        aggs={
+            "artist_mentions": {
+                "terms": {"field": "artist_ids", "include": artists, "size": len(artists)}
+            }
+        })
+
+    counts = {bucket["key"]: bucket["doc_count"] for bucket in response["aggregations"]["artist_mentions"]["buckets"]}
+    return {artist: counts.get(artist, 0) for artist in artists}
+
+
+async def process_artist_groups(*artist_dicts):
+    """
+    Count the posts mentioning each artist in a single request.
+    Returns one list of (padded name, count) per artist dict, in the configured order.
+    """
+    counts = await count_artist_mentions(merge_artist_groups(*artist_dicts))
+
+    results = []
+    for artist_dict in artist_dicts:
+        # Lists keep the configured artist order
+        results.append([("`" + artist.rjust(20), counts[artist]) for artist in artist_dict])
+    return results
+
+
+def canonical_artist(artist: Optional[str], data) -> Optional[str]:
+    """Canonical name of an artist given by any of its aliases, ignoring case; None if unknown"""
+    if not artist:
+        return None
+    wanted = " ".join(artist.split()).lower()
+    for artist_dict in [data["artists"], data["artists_au"]]:
+        for name, aliases in artist_dict.items():
+            if wanted in (alias.lower() for alias in [name, *aliases]):
+                return name
+    return None
+
+
+ROLLUP_COUNTS = ("positive", "negative", "neutral", "total")
+HOUR_MS = 3600 * 1000
+SENTIMENT_LABELS = ("positive", "negative", "neutral")
+
+
+async def rollup_coverage():
+    """
+    Where the hourly rollups are complete, as (cutoff, pending hours) in epoch milliseconds.
+    Hours from cutoff on, and hours the sentiment-rollup function has found but not
+    recomputed yet, must be counted from the raw posts. Raises before the first rollup run.
+    """
+    response = await es_search(
+        index=settings.ELASTICSEARCH_ROLLUP_STATE_INDEX,
+        size=1,
+        query={"ids": {"values": [settings.ELASTICSEARCH_ARTISTS_INDEX]}})
+    hits = response["hits"]["hits"]
+    if not hits or not hits[0]["_source"].get("watermark"):
+        raise RuntimeError("the sentiment rollups have not been built yet")
+    watermark = datetime.fromisoformat(hits[0]["_source"]["watermark"])
+    # Posts created from the watermark's hour on may not be rolled up yet
+    cutoff = int(watermark.timestamp() * 1000) // HOUR_MS * HOUR_MS
+    return cutoff, sorted(hits[0]["_source"].get("pending_hours") or [])
+
+
+def live_hour_ranges(cutoff: int, pending: List[int], field: str) -> List[dict]:
+    """Range clauses over field covering what the rollups miss; adjacent pending hours are merged"""
+    ranges = []
+    for hour in pending:
+        if hour >= cutoff:
+            continue
+        if ranges and ranges[-1][1] == hour:
+            ranges[-1][1] = hour + HOUR_MS
+        else:
+            ranges.append([hour, hour + HOUR_MS])
+    ranges.append([cutoff, None])
+    return [
+        {"range": {field: {"gte": start, **({"lt": end} if end else {}), "format": "epoch_millis"}}}
+        for start, end in ranges
+    ]
+
+
+def rolled_up_hours(cutoff: int, pending: List[int]) -> dict:
+    """Filter on the rollup documents that are complete"""
+    incomplete = [{"range": {"period_start": {"gte": cutoff, "format": "epoch_millis"}}}]
+    if pending:
+        incomplete.append({"terms": {"period_start": pending}})
+    return {"bool": {"must_not": incomplete}}
+
+
+async def rollup_trends(artist: str, interval, start_time, end_time) -> List[TrendPoint]:
+    """
+    Sentiment trend of one canonical artist, re-bucketing its hourly rollups into interval.
+    Hours the rollups do not cover yet are counted from the raw posts and added in.
+    """
+    cutoff, pending = await rollup_coverage()
+    histogram = {
+        "calendar_interval": interval,
+        "format": PERIOD_FORMATS[IntervalEnum(interval)]
+    }
+    rollup_search = es_search(
+        index=settings.ELASTICSEARCH_ROLLUP_INDEX,
+        size=0,
+        query={
+            "bool": {
+                "filter": [
+                    {"term": {"artist": artist}},
+                    {"range": {"period_start": {"gte": start_time, "lte": end_time}}},
+                    rolled_up_hours(cutoff, pending)
+                ]
+            }
+        },
+        aggs={
+            "periods": {
+                "date_histogram": {"field": "period_start", **histogram},
+                "aggs": {count: {"sum": {"field": count}} for count in ROLLUP_COUNTS}
+            }
+        })
+    live_search = es_search(
+        index=settings.ELASTICSEARCH_ARTISTS_INDEX,
+        size=0,
+        query={
+            "bool": {
+                "filter": [
+                    {"term": {"artist_ids": artist}},
+                    {"range": {"created_at": {"gte": start_time, "lte": end_time}}},
+                    {"bool": {"should": live_hour_ranges(cutoff, pending, "created_at"), "minimum_should_match": 1}}
+                ]
+            }
+        },
+        aggs={
+            "periods": {
+                "date_histogram": {"field": "created_at", "min_doc_count": 1, **histogram},
+                "aggs": {
+                    label: {"filter": {"term": {"roberta_sentiment_label.keyword": label}}}
+                    for label in SENTIMENT_LABELS
+                }
+            }
+        })
+    rollup_response, live_response = await asyncio.gather(rollup_search, live_search)
+
+    periods = {}
+    for bucket in rollup_response["aggregations"]["periods"]["buckets"]:
+        periods[bucket["key"]] = [bucket["key_as_string"]] + [int(bucket[count]["value"]) for count in ROLLUP_COUNTS]
+    for bucket in live_response["aggregations"]["periods"]["buckets"]:
+        counts = [bucket[label]["doc_count"] for label in SENTIMENT_LABELS] + [bucket["doc_count"]]
+        period = periods.setdefault(bucket["key"], [bucket["key_as_string"], 0, 0, 0, 0])
+        period[1:] = [total + count for total, count in zip(period[1:], counts)]
+
+    return [
+        TrendPoint(
+            period=period,
+            positiveSentimentCount=positive,
+            negativeSentimentCount=negative,
+            neutralSentimentCount=neutral,
+            totalPostCount=total
         )
+        for _, (period, positive, negative, neutral, total) in sorted(periods.items())
+    ]
 
-        return response["hits"]["total"]["value"]
 
-    except Exception as e:
-        print(f"Request failed for aliases {aliases}: {str(e)}")
-        return 0
-
-
-def process_artist_group(artist_dict):
-    results = []  # List used to keep sequence
-    for artist in artist_dict:
-        padded_name = "`" + artist.rjust(20)
-        aliases = artist_dict[artist]
-        count = get_post_count(aliases)
-        results.append((padded_name, count))
-    return results
\ No newline at end of file
+async def rollup_monthly_mentions(artists: List[str]):
+    """
+    Monthly post counts of the given canonical artists from their hourly rollups.
+    Hours the rollups do not cover yet are counted from the raw posts and added in.
+    """
+    if not await artist_ids_tagged():
+        raise RuntimeError("no post is tagged with artist_ids yet")
+    cutoff, pending = await rollup_coverage()
+    monthly_trend = {"calendar_interval": "month", "format": "yyyyMM"}
+    rollup_search = es_search(
+        index=settings.ELASTICSEARCH_ROLLUP_INDEX,
+        size=0,
+        query={"bool": {"filter": [{"terms": {"artist": artists}}, rolled_up_hours(cutoff, pending)]}},
+        aggs={
+            "artists": {
+                "terms": {"field": "artist", "size": len(artists)},
+                "aggs": {
+                    "monthly_trend": {
+                        "date_histogram": {"field": "period_start", **monthly_trend},
+                        "aggs": {"total": {"sum": {"field": "total"}}}
+                    }
+                }
+            }
+        })
+    live_search = es_search(
+        index=settings.ELASTICSEARCH_ARTISTS_INDEX,
+        size=0,
+        query={
+            "bool": {
+                "filter": [
+                    {"terms": {"artist_ids": artists}},
+                    {"bool": {"should": live_hour_ranges(cutoff, pending, "created_at"), "minimum_should_match": 1}}
+                ]
+            }
+        },
+        aggs={
+            "artists": {
+                "terms": {"field": "artist_ids", "include": artists, "size": len(artists)},
+                "aggs": {
+                    "monthly_trend": {"date_histogram": {"field": "created_at", "min_doc_count": 1, **monthly_trend}}
+                }
+            }
+        })
+    rollup_response, live_response = await asyncio.gather(rollup_search, live_search)
+
+    # Artists without posts are listed too, in the configured order
+    counts = {artist: {} for artist in artists}
+    for bucket in rollup_response["aggregations"]["artists"]["buckets"]:
+        for entry in bucket["monthly_trend"]["buckets"]:
+            counts[bucket["key"]][entry["key_as_string"]] = int(entry["total"]["value"])
+    for bucket in live_response["aggregations"]["artists"]["buckets"]:
+        months = counts[bucket["key"]]
+        for entry in bucket["monthly_trend"]["buckets"]:
+            months[entry["key_as_string"]] = months.get(entry["key_as_string"], 0) + entry["doc_count"]
+    return {artist: dict(sorted(months.items())) for artist, months in counts.items()}
@@ -35,6 +35,22 @@ class Settings(BaseSettings):
     ELASTICSEARCH_KATY_PERRY_INDEX: str = "katy-perry-index"
     ELASTICSEARCH_ALL_SINGERS_INDEX: str = "all-singers"
     ELASTICSEARCH_ARTISTS_INDEX: str = "artists"
+    ELASTICSEARCH_ROLLUP_INDEX: str = "artist-sentiment-rollup"  # Hourly counts kept by the sentiment-rollup function
+    ELASTICSEARCH_ROLLUP_STATE_INDEX: str = "sentiment-rollup-state"  # Its watermark and the hours it has yet to recompute
+    USE_SENTIMENT_ROLLUPS: bool = True  # Trend endpoints read the rollups, falling back to raw posts
+    # Connection pool and timeouts of the shared async client
+    ELASTICSEARCH_POOL_SIZE: int = 20  # Connections per node
+    ELASTICSEARCH_REQUEST_TIMEOUT: float = 30.0  # Seconds
+    ELASTICSEARCH_MAX_RETRIES: int = 3
+    ELASTICSEARCH_RETRY_ON_TIMEOUT: bool = True
+    
+    # Response cache: in-process LRU, shared through Redis when REDIS_URL is set
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_MAX_ENTRIES: int = 256
+    RESPONSE_CACHE_TTL_SECONDS: float = 600.0  # Recompute in the background after this even if the index looks unchanged
+    RESPONSE_CACHE_MAX_STALE_SECONDS: float = 86400.0  # Older entries are recomputed before answering
+    RESPONSE_CACHE_FRESHNESS_SECONDS: float = 15.0  # Interval between checks of the artists index's max created_at and doc count
+    REDIS_URL: str = ""  # e.g. redis://redis-headless.redis.svc.cluster.local:6379/0
     
     # Logging
     LOG_LEVEL: str = "INFO"
@@ -0,0 +1,202 @@
+"""
+===============================================================================
+Team 81
+
+Members:
+- Adam McMillan (1393533)
+- Ryan Kuang (1547320)
+- Tim Shen (1673715)
+- Yili Liu (883012)
+- Yuting Cai (1492060)
+
+===============================================================================
+"""
+
+""" cache.py """
+import asyncio
+import functools
+import json
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict, Optional
+
+from fastapi import Request
+from fastapi.encoders import jsonable_encoder
+
+from app.config import settings
+from app.core.elasticsearcher import es_search
+
+try:
+    import redis.asyncio as redis
+except ImportError:  # Redis tier is optional
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+class ResponseCache:
+    """
+    Two-tier cache of endpoint responses: an in-process LRU in front of an optional
+    Redis tier shared by all API replicas.
+
+    Every entry records the freshness token of the artists index (its max created_at
+    and doc count) it was computed from. An entry is fresh while that token is
+    unchanged and it is younger than the TTL; a stale entry is still served while a
+    background task recomputes it, so only the very first request for a key waits.
+    """
+
+    def __init__(self):
+        self._memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._redis = None
+        self._token: Optional[list] = None
+        self._token_checked = 0.0
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self._refreshing: Dict[str, asyncio.Task] = {}  # Background recomputes, by key
+
+        if settings.REDIS_URL:
+            if redis is None:
+                logger.warning("REDIS_URL is set but the redis package is not installed; using the in-process cache only")
+            else:
+                self._redis = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+
+    async def close(self):
+        """Close the Redis connection pool."""
+        if self._redis is not None:
+            await self._redis.close()
+            self._redis = None
+
+    async def freshness_token(self) -> Optional[list]:
+        """Max created_at and doc count of the artists index, re-read at most every few seconds."""
+        if time.monotonic() - self._token_checked < settings.RESPONSE_CACHE_FRESHNESS_SECONDS:
+            return self._token
+        try:
+            response = await es_search(
+                index=settings.ELASTICSEARCH_ARTISTS_INDEX,
+                size=0,
+                track_total_hits=True,
+                aggs={"latest_post": {"max": {"field": "created_at"}}}
+            )
+            self._token = [response["aggregations"]["latest_post"]["value"], response["hits"]["total"]["value"]]
+        except Exception as e:
+            # Keep the last known token: cached responses are served rather than failing
+            logger.error(f"Failed to read the freshness of {settings.ELASTICSEARCH_ARTISTS_INDEX}: {e}")
+        self._token_checked = time.monotonic()
+        return self._token
+
+    async def _get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._memory.get(key)
+        if entry is not None:
+            self._memory.move_to_end(key)
+            return entry
+        if self._redis is None:
+            return None
+        try:
+            raw = await self._redis.get(key)
+        except Exception as e:
+            logger.error(f"Redis cache read failed: {e}")
+            return None
+        if raw is None:
+            return None
+        entry = json.loads(raw)
+        self._remember(key, entry)
+        return entry
+
+    def _remember(self, key: str, entry: Dict[str, Any]):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > settings.RESPONSE_CACHE_MAX_ENTRIES:
+            self._memory.popitem(last=False)
+
+    async def _store(self, key: str, value: Any, token: Optional[list]):
+        entry = {"value": value, "token": token, "stored_at": time.time()}
+        self._remember(key, entry)
+        if self._redis is not None:
+            try:
+                await self._redis.set(key, json.dumps(entry), ex=int(settings.RESPONSE_CACHE_MAX_STALE_SECONDS))
+            except Exception as e:
+                logger.error(f"Redis cache write failed: {e}")
+
+    async def _compute(self, key: str, compute):
+        """Run compute once per key at a time; concurrent callers share its result."""
+        future = self._in_flight.get(key)
+        if future is not None:
+            return await future
+
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            token = await self.freshness_token()
+            value = jsonable_encoder(await compute())
+            await self._store(key, value, token)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            # Nobody else may be waiting; mark the exception as retrieved
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+
+    async def _refresh(self, key: str, compute):
+        try:
+            await self._compute(key, compute)
+        except Exception as e:
+            logger.error(f"Background refresh of {key} failed: {e}")
+        finally:
+            self._refreshing.pop(key, None)
+
+    async def get_or_compute(self, key: str, compute):
+        """Return the cached response for key, recomputing it in the background when stale."""
+        entry = await self._get(key)
+        if entry is None:
+            return await self._compute(key, compute)
+
+        age = time.time() - entry["stored_at"]
+        if age > settings.RESPONSE_CACHE_MAX_STALE_SECONDS:
+            return await self._compute(key, compute)
+
+        token = await self.freshness_token()
+        if entry["token"] != token or age > settings.RESPONSE_CACHE_TTL_SECONDS:
+            # Stale while revalidate: answer now, recompute once in the background
+            if key not in self._refreshing:
+                self._refreshing[key] = asyncio.create_task(self._refresh(key, compute))
+        return entry["value"]
+
+
+response_cache = ResponseCache()
+
+
+def _normalize(value) -> Optional[str]:
+    if value is None:
+        return None
+    if isinstance(value, Enum):
+        value = value.value
+    if isinstance(value, datetime):
+        return value.isoformat()
+    # Artist names are matched case-insensitively, so "katy  perry" and "Katy Perry" share an entry
+    return " ".join(str(value).split()).lower()
+
+
+def cache_key(endpoint: str, params: Dict[str, Any]) -> str:
+    """Key built from the endpoint and its normalized query parameters."""
+    normalized = sorted((name, _normalize(value)) for name, value in params.items()
+                        if not isinstance(value, Request) and value is not None)
+    query = "&".join(f"{name}={value}" for name, value in normalized)
+    return f"analyser-api:{endpoint}?{query}"
+
+
+def cached_response(endpoint: str):
+    """Serve a route from the response cache; the route's parameters form the key."""
+    def decorator(route):
+        @functools.wraps(route)
+        async def wrapper(*args, **kwargs):
+            if not settings.RESPONSE_CACHE_ENABLED:
+                return await route(*args, **kwargs)
+            key = cache_key(endpoint, kwargs)
+            return await response_cache.get_or_compute(key, lambda: route(*args, **kwargs))
+        return wrapper
+    return decorator
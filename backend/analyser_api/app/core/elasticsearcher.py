@@ -15,19 +15,25 @@ Members:
 """ elasticsearch.py """
 import logging
 import ssl
-from functools import lru_cache
-from elasticsearch import Elasticsearch
+from typing import Optional
+from elasticsearch import AsyncElasticsearch
 
 from app.config import settings
 
 logger = logging.getLogger(__name__)
 
-@lru_cache()
-def get_elasticsearch_client() -> Elasticsearch:
+# Shared by every request; created in the startup hook and closed on shutdown
+_client: Optional[AsyncElasticsearch] = None
+
+
+async def get_elasticsearch_client() -> AsyncElasticsearch:
     """
-    Create and return an Elasticsearch client instance.
-    Uses LRU cache to avoid creating multiple instances.
+    Return the shared AsyncElasticsearch client, creating it on first use.
+    Requests share its connection pool, so a slow query no longer blocks the others.
     """
+    global _client
+    if _client is not None:
+        return _client
 
     # Create an SSL context that skips certificate verification
     ssl_context = ssl.create_default_context()
@@ -37,7 +43,11 @@ def get_elasticsearch_client() -> Elasticsearch:
     es_config = {
         "hosts": settings.ELASTICSEARCH_HOSTS,
         "verify_certs": False,
-        "ssl_context": ssl_context
+        "ssl_context": ssl_context,
+        "connections_per_node": settings.ELASTICSEARCH_POOL_SIZE,
+        "request_timeout": settings.ELASTICSEARCH_REQUEST_TIMEOUT,
+        "max_retries": settings.ELASTICSEARCH_MAX_RETRIES,
+        "retry_on_timeout": settings.ELASTICSEARCH_RETRY_ON_TIMEOUT
     }
     
     # Add authentication if provided
@@ -48,17 +58,34 @@ def get_elasticsearch_client() -> Elasticsearch:
         )
     
     try:
-        client = Elasticsearch(**es_config)
-        # Verify connection
-        if not client.ping():
-            logger.error("Could not connect to Elasticsearch")
-            raise ConnectionError("Could not connect to Elasticsearch")
-        return client
+        _client = AsyncElasticsearch(**es_config)
+        return _client
     except Exception as e:
         logger.error(f"Error creating Elasticsearch client: {e}")
         raise
 
 
+async def close_elasticsearch_client():
+    """Close the shared client and its pooled connections."""
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
+
+
+# Awaitable query helpers
+async def es_search(index: str, **params):
+    """Run a search on the shared client."""
+    es = await get_elasticsearch_client()
+    return await es.search(index=index, **params)
+
+
+async def es_count(index: str, **params):
+    """Count documents on the shared client."""
+    es = await get_elasticsearch_client()
+    return await es.count(index=index, **params)
+
+
 # Helper functions for building Elasticsearch queries
 def build_date_range_query(start_time=None, end_time=None):
     """Build a date range query for Elasticsearch."""
@@ -19,7 +19,8 @@ from fastapi.middleware.cors import CORSMiddleware
 
 from app.config import settings
 from app.api.routes import analyser
-from app.core.elasticsearcher import get_elasticsearch_client
+from app.core.elasticsearcher import get_elasticsearch_client, close_elasticsearch_client
+from app.core.cache import response_cache
 import json
 
 # Configure logging
@@ -50,10 +51,10 @@ app.include_router(analyser.router)
 @app.on_event("startup")
 async def startup_db_client():
     """Initialize the Elasticsearch client connection on startup."""
-    # This will test the connection to Elasticsearch when the app starts
+    # This creates the pooled client and tests the connection to Elasticsearch when the app starts
     try:
-        es_client = get_elasticsearch_client()
-        info = es_client.info()
+        es_client = await get_elasticsearch_client()
+        info = await es_client.info()
         logger.info(f"Connected to Elasticsearch cluster: {info.get('cluster_name', 'unknown')}")
 
         with open("app/data/artists.json", "r", encoding="utf-8") as f:
@@ -70,6 +71,8 @@ async def startup_db_client():
 async def shutdown_db_client():
     """Close the Elasticsearch client connection on shutdown."""
     logger.info("Application shutting down")
+    await response_cache.close()
+    await close_elasticsearch_client()
 
 
 @app.get("/")
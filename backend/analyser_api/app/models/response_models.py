@@ -30,7 +30,7 @@ class TopicSummary(BaseModel):
 
 class TrendPoint(BaseModel):
     """Model for a single point in trend data."""
-    period: str = Field(..., description="Time interval label, e.g., '2024/01'")
+    period: str = Field(..., description="Time interval label: yyyyMMddHH, yyyyMMdd, YYYY-'W'ww or yyyyMM for hour, day, week or month")
     positiveSentimentCount: int
     negativeSentimentCount: int
     neutralSentimentCount: int
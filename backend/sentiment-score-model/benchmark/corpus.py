@@ -0,0 +1,91 @@
+"""
+corpus.py
+
+Synthetic Mastodon and Reddit documents for benchmarking the sentiment analyzer.
+
+Text lengths follow log-normal word counts, roughly matching what the
+harvesters store: short Mastodon toots and Reddit comments, and Reddit
+self-posts with a long tail beyond RoBERTa's 512-token window. A share of the
+documents are reposts of earlier texts (which exercise the score caches) and a
+few have no text at all. Documents carry the same fields as the production
+indices (content for Mastodon, body for comments, title/selftext for posts).
+"""
+
+import random
+
+ARTISTS = [
+    "Taylor Swift", "Kendrick Lamar", "Billie Eilish", "Tame Impala", "Troye Sivan", "Sia",
+    "Kylie Minogue", "Flume", "Vance Joy", "The Kid LAROI", "Gang of Youths", "Amyl and the Sniffers",
+]
+WORDS = (
+    "the a and to of in is it that this for on with was just i you we they my so but not at be have "
+    "new album song track tour concert show tickets gig live music set night crowd sound vocals "
+    "love great amazing best awesome brilliant beautiful fun happy excited incredible fire banger "
+    "hate awful worst terrible boring bad sad disappointed overrated mid cancelled expensive "
+    "today yesterday tonight week year again finally still really honestly literally maybe "
+    "listening playlist spotify release single video lyrics chorus verse bridge beat drop remix "
+    "melbourne sydney brisbane perth adelaide festival arena stadium venue queue merch"
+).split()
+HASHTAGS = ["#music", "#nowplaying", "#concert", "#australia", "#newmusic", "#tour", "#livemusic"]
+EMOJIS = ["\U0001F525", "\U0001F60D", "\U0001F62D", "\U0001F44F", "\U0001F3B6", "\U0001F621", "❤️"]
+
+# (index suffix, text field, median words, log-normal sigma)
+SOURCES = {
+    "mastodon": ("content", 28, 0.8),
+    "reddit-comments": ("body", 24, 1.0),
+    "reddit": ("selftext", 70, 1.1),
+}
+MAX_WORDS = 2000
+REPOST_RATE = 0.05
+EMPTY_RATE = 0.03
+
+
+def _text(rng, median_words, sigma):
+    word_count = max(1, min(MAX_WORDS, int(rng.lognormvariate(0, sigma) * median_words)))
+    words = []
+    for _ in range(word_count):
+        roll = rng.random()
+        if roll < 0.03:
+            words.append(rng.choice(ARTISTS))
+        elif roll < 0.05:
+            words.append(rng.choice(HASHTAGS))
+        elif roll < 0.07:
+            words.append(rng.choice(EMOJIS))
+        elif roll < 0.075:
+            words.append(f"@user{rng.randrange(5000)}")
+        elif roll < 0.078:
+            words.append(f"https://example.social/{rng.randrange(10 ** 6)}")
+        else:
+            words.append(rng.choice(WORDS))
+    return " ".join(words)
+
+
+def generate_documents(source, count, seed=0):
+    """Return count (id, _source) pairs shaped like documents of the given source"""
+    field, median_words, sigma = SOURCES[source]
+    rng = random.Random(f"{source}-{seed}")
+    documents = []
+    texts = []
+    for number in range(count):
+        roll = rng.random()
+        if roll < EMPTY_RATE:
+            text = ""
+        elif roll < EMPTY_RATE + REPOST_RATE and texts:
+            text = rng.choice(texts)
+        else:
+            text = _text(rng, median_words, sigma)
+            texts.append(text)
+
+        doc = {field: text, "created_at": f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T12:00:00Z"}
+        if source == "mastodon":
+            doc["language"] = "en"
+        elif source == "reddit":
+            doc["title"] = _text(rng, 9, 0.5)
+        documents.append((f"{source}-{seed}-{number}", doc))
+    return documents
+
+
+def training_texts(count=2000, seed=0):
+    """Texts to fit the benchmark tokenizer on"""
+    rng = random.Random(f"tokenizer-{seed}")
+    return [_text(rng, 30, 1.0) for _ in range(count)]
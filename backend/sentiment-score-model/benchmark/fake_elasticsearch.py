@@ -0,0 +1,361 @@
+"""
+fake_elasticsearch.py
+
+In-memory stand-in for the Elasticsearch client calls made by
+sentiment_analyzer_index.py: ping, index management, get/index/update of state
+documents, count, search (from/size, scroll, point in time with sliced
+search_after paging, field sorts), bulk updates with optimistic concurrency, and point in
+time open/close, and _cat/thread_pool for the write pool.
+
+Queries support match_all, exists, term, terms, range and bool
+(must/filter/should/must_not). Point in time searches see a snapshot of the
+index taken when it was opened. An optional per-request latency stands in for
+the network round trip, and an optional bulk capacity rejects (HTTP 429) the
+items of a bulk request beyond it, like a full write queue.
+"""
+
+import copy
+import functools
+import itertools
+import time
+import zlib
+
+# Action metadata accepted by the bulk API; anything else fails the whole request
+BULK_METADATA = {"_index", "_id", "routing", "if_seq_no", "if_primary_term", "retry_on_conflict",
+                 "version", "version_type", "pipeline", "require_alias"}
+
+
+def _field(source, name):
+    value = source
+    for part in name.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return None
+        value = value[part]
+    return value
+
+
+def _as_list(clauses):
+    if clauses is None:
+        return []
+    return clauses if isinstance(clauses, list) else [clauses]
+
+
+def matches(query, source):
+    """Evaluate the supported subset of the query DSL against a document source"""
+    if not query or "match_all" in query:
+        return True
+    if "exists" in query:
+        return _field(source, query["exists"]["field"]) is not None
+    if "term" in query:
+        (name, value), = query["term"].items()
+        value = value["value"] if isinstance(value, dict) else value
+        return _field(source, name.removesuffix(".keyword")) == value
+    if "terms" in query:
+        (name, values), = query["terms"].items()
+        value = _field(source, name.removesuffix(".keyword"))
+        if isinstance(value, list):
+            return any(item in values for item in value)
+        return value in values
+    if "range" in query:
+        (name, bounds), = query["range"].items()
+        value = _field(source, name)
+        if value is None:
+            return False
+        return all((
+            "gt" not in bounds or value > bounds["gt"],
+            "gte" not in bounds or value >= bounds["gte"],
+            "lt" not in bounds or value < bounds["lt"],
+            "lte" not in bounds or value <= bounds["lte"],
+        ))
+    if "bool" in query:
+        clauses = query["bool"]
+        if not all(matches(c, source) for c in _as_list(clauses.get("must")) + _as_list(clauses.get("filter"))):
+            return False
+        if any(matches(c, source) for c in _as_list(clauses.get("must_not"))):
+            return False
+        should = _as_list(clauses.get("should"))
+        return not should or any(matches(c, source) for c in should)
+    raise NotImplementedError(f"Unsupported query: {query}")
+
+
+class _Document:
+    __slots__ = ("ordinal", "source", "seq_no")
+
+    def __init__(self, ordinal, source, seq_no):
+        self.ordinal = ordinal
+        self.source = source
+        self.seq_no = seq_no
+
+
+def _sort_field(clause):
+    return clause if isinstance(clause, str) else next(iter(clause))
+
+
+def _sort_order(clause):
+    options = "asc" if isinstance(clause, str) else next(iter(clause.values()))
+    return options if isinstance(options, str) else options.get("order", "asc")
+
+
+def _compare_sort_values(orders, left, right):
+    """Compare two sort tuples; missing values sort last in either order, like missing: _last"""
+    for order, a, b in zip(orders, left, right):
+        if a == b:
+            continue
+        if a is None or b is None:
+            return 1 if a is None else -1
+        result = -1 if a < b else 1
+        return -result if order == "desc" else result
+    return 0
+
+
+class _Indices:
+    def __init__(self, client):
+        self._client = client
+
+    def exists(self, index):
+        self._client._request()
+        return index in self._client.store
+
+    def create(self, index, settings=None, mappings=None, **kwargs):
+        self._client._request()
+        self._client.store.setdefault(index, {})
+        return {"acknowledged": True, "index": index}
+
+    def put_mapping(self, index, properties=None, **kwargs):
+        self._client._request()
+        return {"acknowledged": True}
+
+    def refresh(self, index=None, **kwargs):
+        self._client._request()
+        self._client.refreshes += 1
+        return {"_shards": {"failed": 0}}
+
+    def stats(self, index, **kwargs):
+        self._client._request()
+        return {"indices": {index: {"primaries": {"docs": {
+            "count": len(self._client.store.get(index, {})), "deleted": 0}}}}}
+
+
+class _Cat:
+    def __init__(self, client):
+        self._client = client
+
+    def thread_pool(self, thread_pool_patterns=None, format=None, h=None, **kwargs):
+        self._client._request()
+        return [{"node_name": "fake-0", "active": "0", "queue": "0", "queue_size": "10000",
+                 "rejected": str(self._client.rejected_items)}]
+
+
+class FakeElasticsearch:
+    """Elasticsearch client double backed by dicts; one instance plays the whole cluster"""
+
+    def __init__(self, latency_ms=0.0, bulk_capacity=None):
+        self.latency = latency_ms / 1000.0
+        self.bulk_capacity = bulk_capacity
+        self.rejected_items = 0
+        self.store = {}
+        self.indices = _Indices(self)
+        self.cat = _Cat(self)
+        self.requests = 0
+        self.refreshes = 0
+        self.bulk_requests = 0
+        self.first_search_at = None
+        self.last_bulk_at = None
+        self._seq = itertools.count(1)
+        self._ordinals = itertools.count()
+        self._pits = {}
+        self._scrolls = {}
+        self._ids = itertools.count()
+
+    # The analyzer constructs a client per host it tries; they all share this cluster
+    def __call__(self, *args, **kwargs):
+        return self
+
+    def _request(self):
+        self.requests += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def load(self, index, documents):
+        """Add (id, source) pairs to an index without request overhead"""
+        docs = self.store.setdefault(index, {})
+        for doc_id, source in documents:
+            docs[doc_id] = _Document(next(self._ordinals), source, next(self._seq))
+
+    def ping(self):
+        return True
+
+    def close(self):
+        pass
+
+    def exists(self, index, id):
+        self._request()
+        return id in self.store.get(index, {})
+
+    def get(self, index, id):
+        self._request()
+        document = self.store[index][id]
+        return {"_index": index, "_id": id, "_source": copy.deepcopy(document.source),
+                "_seq_no": document.seq_no, "_primary_term": 1}
+
+    def index(self, index, document, id=None, **kwargs):
+        self._request()
+        doc_id = id if id is not None else f"auto-{next(self._ids)}"
+        self.load(index, [(doc_id, copy.deepcopy(document))])
+        return {"_index": index, "_id": doc_id, "result": "created"}
+
+    def update(self, index, id, doc=None, doc_as_upsert=False, body=None, **kwargs):
+        self._request()
+        if body:
+            doc = body.get("doc", doc)
+            doc_as_upsert = body.get("doc_as_upsert", doc_as_upsert)
+        docs = self.store.get(index, {})
+        if id not in docs:
+            if doc_as_upsert:
+                self.load(index, [(id, copy.deepcopy(doc))])
+                return {"_index": index, "_id": id, "result": "created"}
+            raise KeyError(f"document {id} not found in {index}")
+        self._apply_update(docs[id], doc)
+        return {"_index": index, "_id": id, "result": "updated"}
+
+    def _apply_update(self, document, partial):
+        # Replace rather than mutate the source so open points in time keep their snapshot
+        source = dict(document.source)
+        source.update(copy.deepcopy(partial))
+        document.source = source
+        document.seq_no = next(self._seq)
+
+    def count(self, index, query=None, **kwargs):
+        self._request()
+        return {"count": sum(matches(query, d.source) for d in self.store.get(index, {}).values())}
+
+    def open_point_in_time(self, index, keep_alive=None, **kwargs):
+        self._request()
+        pit_id = f"pit-{next(self._ids)}"
+        snapshot = [
+            (name, doc_id, d.ordinal, d.source, d.seq_no)
+            for name in index.split(",")
+            for doc_id, d in self.store.get(name, {}).items()
+        ]
+        self._pits[pit_id] = sorted(snapshot, key=lambda entry: entry[2])
+        return {"id": pit_id}
+
+    def close_point_in_time(self, id=None, body=None, **kwargs):
+        self._request()
+        pit_id = id or body["id"]
+        return {"succeeded": self._pits.pop(pit_id, None) is not None, "num_freed": 1}
+
+    def search(self, index=None, query=None, size=10, from_=0, _source=None, pit=None, search_after=None,
+               sort=None, slice=None, scroll=None, seq_no_primary_term=False, body=None, **kwargs):
+        self._request()
+        if body:
+            query = body.get("query", query)
+            size = body.get("size", size)
+            from_ = body.get("from", from_)
+            _source = body.get("_source", _source)
+        if self.first_search_at is None:
+            self.first_search_at = time.perf_counter()
+
+        if pit is not None:
+            if pit["id"] not in self._pits:
+                raise KeyError(f"point in time {pit['id']} not found")
+            candidates = self._pits[pit["id"]]
+        else:
+            candidates = sorted(
+                ((name, doc_id, d.ordinal, d.source, d.seq_no)
+                 for name in index.split(",") for doc_id, d in self.store.get(name, {}).items()),
+                key=lambda entry: entry[2]
+            )
+
+        sort = sort or [{"_shard_doc": "asc"}]
+        compare = functools.partial(_compare_sort_values, [_sort_order(clause) for clause in sort])
+        hits = []
+        for name, doc_id, ordinal, source, seq_no in candidates:
+            if slice and zlib.crc32(doc_id.encode("utf-8")) % slice["max"] != slice["id"]:
+                continue
+            if not matches(query, source):
+                continue
+            values = [ordinal if _sort_field(clause) == "_shard_doc" else _field(source, _sort_field(clause))
+                      for clause in sort]
+            if search_after and compare(values, list(search_after)) <= 0:
+                continue
+            hit = {"_index": name, "_id": doc_id, "_source": self._project(source, _source), "sort": values}
+            if seq_no_primary_term:
+                hit["_seq_no"] = seq_no
+                hit["_primary_term"] = 1
+            hits.append(hit)
+        hits.sort(key=functools.cmp_to_key(lambda a, b: compare(a["sort"], b["sort"])))
+
+        response = {"hits": {"total": {"value": len(hits), "relation": "eq"}, "hits": hits[from_:from_ + size]}}
+        if pit is not None:
+            response["pit_id"] = pit["id"]
+        if scroll:
+            scroll_id = f"scroll-{next(self._ids)}"
+            self._scrolls[scroll_id] = (hits[from_ + size:], size)
+            response["_scroll_id"] = scroll_id
+        return response
+
+    @staticmethod
+    def _project(source, fields):
+        if fields is None or fields is True:
+            return copy.deepcopy(source)
+        if fields is False:
+            return {}
+        fields = [fields] if isinstance(fields, str) else fields
+        return {k: copy.deepcopy(v) for k, v in source.items() if k in fields}
+
+    def scroll(self, scroll_id, scroll=None, **kwargs):
+        self._request()
+        remaining, size = self._scrolls[scroll_id]
+        self._scrolls[scroll_id] = (remaining[size:], size)
+        return {"_scroll_id": scroll_id, "hits": {"hits": remaining[:size]}}
+
+    def clear_scroll(self, scroll_id=None, **kwargs):
+        self._request()
+        self._scrolls.pop(scroll_id, None)
+
+    def bulk(self, operations, refresh=None, **kwargs):
+        self._request()
+        self.bulk_requests += 1
+        if refresh:
+            self.refreshes += 1
+        items = []
+        operations = list(operations)
+        position = 0
+        while position < len(operations):
+            (action, meta), = operations[position].items()
+            unknown = set(meta) - BULK_METADATA
+            if unknown:
+                raise ValueError(f"Action/metadata line [{position + 1}] contains an unknown parameter {sorted(unknown)}")
+            index, doc_id = meta["_index"], meta.get("_id")
+            if action == "delete":
+                existed = self.store.get(index, {}).pop(doc_id, None) is not None
+                items.append({action: {"_index": index, "_id": doc_id, "status": 200 if existed else 404}})
+                position += 1
+                continue
+
+            payload = operations[position + 1]
+            position += 2
+            if action in ("index", "create"):
+                doc_id = doc_id if doc_id is not None else f"auto-{next(self._ids)}"
+                self.load(index, [(doc_id, copy.deepcopy(payload))])
+                items.append({action: {"_index": index, "_id": doc_id, "status": 201}})
+                continue
+
+            document = self.store.get(index, {}).get(doc_id)
+            if self.bulk_capacity is not None and len(items) >= self.bulk_capacity:
+                self.rejected_items += 1
+                items.append({action: {"_index": index, "_id": doc_id, "status": 429,
+                                       "error": {"type": "es_rejected_execution_exception"}}})
+            elif document is None:
+                items.append({action: {"_index": index, "_id": doc_id, "status": 404,
+                                       "error": {"type": "document_missing_exception"}}})
+            elif "if_seq_no" in meta and meta["if_seq_no"] != document.seq_no:
+                items.append({action: {"_index": index, "_id": doc_id, "status": 409,
+                                       "error": {"type": "version_conflict_engine_exception"}}})
+            else:
+                self._apply_update(document, payload["doc"])
+                items.append({action: {"_index": index, "_id": doc_id, "status": 200}})
+
+        self.last_bulk_at = time.perf_counter()
+        return {"errors": any(item[next(iter(item))]["status"] >= 300 for item in items), "items": items}
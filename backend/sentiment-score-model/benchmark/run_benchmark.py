@@ -0,0 +1,141 @@
+"""
+run_benchmark.py
+
+Offline throughput benchmark for sentiment_analyzer_index.py.
+
+Runs the analyzer unchanged against an in-memory Elasticsearch seeded with a
+synthetic Mastodon/Reddit corpus and a randomly initialised RoBERTa-shaped
+model, then reports documents/sec, tokens/sec, p50/p99 forward-pass latency
+and peak RSS. Arguments after "--" are passed to the analyzer, so batching,
+pipeline and backend settings can be compared on the same corpus:
+
+    python benchmark/run_benchmark.py --docs 5000 -- --pipeline --max-batch-tokens 4096
+    python benchmark/run_benchmark.py --docs 5000 --model-size base -- --backend onnx-int8
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import resource
+import runpy
+import sys
+import tempfile
+import time
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+ANALYZER_DIR = os.path.dirname(BENCHMARK_DIR)
+ANALYZER = os.path.join(ANALYZER_DIR, "sentiment_analyzer_index.py")
+sys.path.insert(0, ANALYZER_DIR)
+
+import elasticsearch  # noqa: E402
+
+from corpus import SOURCES, generate_documents, training_texts  # noqa: E402
+from fake_elasticsearch import FakeElasticsearch  # noqa: E402
+from tiny_model import PRESETS, build_model  # noqa: E402
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process and of its largest child (inference workers)"""
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return own / 1024, children / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the sentiment analyzer offline")
+    parser.add_argument("--docs", type=int, default=3000, help="Documents per source index")
+    parser.add_argument("--sources", nargs="+", choices=sorted(SOURCES), default=sorted(SOURCES),
+                        help="Source indices to generate")
+    parser.add_argument("--model-size", choices=sorted(PRESETS), default="tiny", help="Random model shape")
+    parser.add_argument("--work-dir", default=os.path.join(tempfile.gettempdir(), "sentiment-benchmark"),
+                        help="Where the random model is built (reused between runs)")
+    parser.add_argument("--es-latency-ms", type=float, default=0.0, help="Simulated latency per Elasticsearch request")
+    parser.add_argument("--es-bulk-capacity", type=int, help="Bulk items accepted per request; the rest are rejected with 429")
+    parser.add_argument("--seed", type=int, default=0, help="Corpus and model seed")
+    parser.add_argument("--verbose", action="store_true", help="Show the analyzer's own output")
+    parser.add_argument("--json", help="Also write the report to this file")
+    args, analyzer_args = parser.parse_known_args()
+    if analyzer_args[:1] == ["--"]:
+        analyzer_args = analyzer_args[1:]
+
+    model_path = os.path.join(args.work_dir, args.model_size)
+    build_model(model_path, training_texts(seed=args.seed), args.model_size, args.seed)
+    if any(arg.startswith("onnx") for arg in analyzer_args):
+        from inference_backends import ONNX_MODEL_FILES, export_onnx
+        if not os.path.exists(os.path.join(model_path, ONNX_MODEL_FILES["onnx"])):
+            from transformers import AutoModelForSequenceClassification, AutoTokenizer
+            export_onnx(AutoModelForSequenceClassification.from_pretrained(f"{model_path}/model"),
+                        AutoTokenizer.from_pretrained(f"{model_path}/tokenizer"), model_path)
+
+    cluster = FakeElasticsearch(args.es_latency_ms, args.es_bulk_capacity)
+    indices = []
+    for source in args.sources:
+        index = f"{source}-benchmark"
+        cluster.load(index, generate_documents(source, args.docs, args.seed))
+        indices.append(f"{index}:{args.docs}")
+    elasticsearch.Elasticsearch = cluster
+
+    sys.argv = [ANALYZER, "--index", *indices, "--model-path", model_path, "--no-cache", *analyzer_args]
+    output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    started = time.perf_counter()
+    try:
+        with output:
+            analyzer = runpy.run_path(ANALYZER, run_name="__main__")
+    except SystemExit as e:
+        if e.code:
+            print(f"Analyzer exited with status {e.code}; rerun with --verbose for its output")
+            sys.exit(1)
+        raise
+    elapsed = time.perf_counter() - started
+
+    stats = analyzer["inference_stats"]
+    labeled = sum(
+        "roberta_sentiment_label" in document.source
+        for index in indices
+        for document in cluster.store[index.split(":")[0]].values()
+    )
+    processing = (cluster.last_bulk_at or time.perf_counter()) - (cluster.first_search_at or started)
+    inference = sum(stats["batch_seconds"])
+    own_rss, child_rss = peak_rss_mb()
+    report = {
+        "documents": labeled,
+        "texts_scored": stats["texts"],
+        "windows_scored": stats["windows"],
+        "lexicon_labeled": stats["lexicon_texts"],
+        "language_skipped": stats["skipped_language"] + stats["skipped_empty"],
+        "wall_seconds": round(elapsed, 3),
+        "startup_seconds": round((cluster.first_search_at or started) - started, 3),
+        "startup_phases": {name: round(seconds, 3) for name, seconds in analyzer["startup_timings"].items()},
+        "docs_per_sec": round(labeled / processing, 1) if processing else 0.0,
+        "tokens_per_sec": round(stats["tokens"] / inference, 1) if inference else 0.0,
+        "padding_waste": round(1 - stats["tokens"] / stats["padded_tokens"], 3) if stats["padded_tokens"] else 0.0,
+        "batches": len(stats["batch_seconds"]),
+        "batch_p50_ms": round(percentile(stats["batch_seconds"], 0.50) * 1000, 2),
+        "batch_p99_ms": round(percentile(stats["batch_seconds"], 0.99) * 1000, 2),
+        "peak_rss_mb": round(own_rss, 1),
+        "peak_worker_rss_mb": round(child_rss, 1),
+        "es_requests": cluster.requests,
+        "bulk_requests": cluster.bulk_requests,
+        "bulk_rejected_items": cluster.rejected_items,
+        "analyzer_args": analyzer_args,
+        "model_size": args.model_size,
+    }
+
+    for key, value in report.items():
+        print(f"{key:>20}: {value}")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
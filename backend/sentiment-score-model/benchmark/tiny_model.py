@@ -0,0 +1,67 @@
+"""
+tiny_model.py
+
+Builds a randomly initialised RoBERTa sequence classifier and a byte-level BPE
+tokenizer in the layout the analyzer loads from the model volume
+(<path>/tokenizer and <path>/model), so benchmarks run without downloading the
+real model. The "base" preset has the shape of twitter-roberta-base-sentiment
+for realistic compute; the smaller presets keep runs fast.
+"""
+
+import json
+import os
+
+import torch
+from tokenizers import ByteLevelBPETokenizer
+from transformers import RobertaConfig, RobertaForSequenceClassification, RobertaTokenizerFast
+
+# hidden size, layers, attention heads, feed-forward size
+PRESETS = {
+    "tiny": (64, 2, 2, 256),
+    "small": (256, 4, 4, 1024),
+    "base": (768, 12, 12, 3072),
+}
+VOCAB_SIZE = 8000
+LABELS = {0: "negative", 1: "neutral", 2: "positive"}
+
+
+def build_model(path, texts, preset="tiny", seed=0):
+    """Write a random-weight model and a tokenizer trained on texts; reuse an existing build of the same preset"""
+    marker = os.path.join(path, "benchmark-model.json")
+    spec = {"preset": preset, "seed": seed}
+    if os.path.exists(marker):
+        with open(marker) as f:
+            if json.load(f) == spec:
+                return path
+
+    tokenizer_dir = os.path.join(path, "tokenizer")
+    model_dir = os.path.join(path, "model")
+    os.makedirs(tokenizer_dir, exist_ok=True)
+    os.makedirs(model_dir, exist_ok=True)
+
+    bpe = ByteLevelBPETokenizer()
+    bpe.train_from_iterator(texts, vocab_size=VOCAB_SIZE, special_tokens=["<s>", "<pad>", "</s>", "<unk>", "<mask>"])
+    bpe.save_model(tokenizer_dir)
+    tokenizer = RobertaTokenizerFast(os.path.join(tokenizer_dir, "vocab.json"), os.path.join(tokenizer_dir, "merges.txt"))
+    tokenizer.model_max_length = 512
+    tokenizer.save_pretrained(tokenizer_dir)
+
+    hidden_size, layers, heads, intermediate_size = PRESETS[preset]
+    config = RobertaConfig(
+        vocab_size=len(tokenizer),
+        hidden_size=hidden_size,
+        num_hidden_layers=layers,
+        num_attention_heads=heads,
+        intermediate_size=intermediate_size,
+        max_position_embeddings=514,
+        pad_token_id=tokenizer.pad_token_id,
+        num_labels=len(LABELS),
+        id2label=LABELS,
+        label2id={label: i for i, label in LABELS.items()},
+    )
+    torch.manual_seed(seed)
+    RobertaForSequenceClassification(config).save_pretrained(model_dir)
+
+    with open(marker, "w") as f:
+        json.dump(spec, f)
+    return path
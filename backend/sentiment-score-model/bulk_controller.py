@@ -0,0 +1,119 @@
+"""
+bulk_controller.py
+
+Adaptive pacing of the analyzer's bulk writes to Elasticsearch.
+
+The controller picks the number of documents per bulk request and the pause
+before each request from what the cluster reports back:
+
+- rejected items (HTTP 429 / es_rejected_execution_exception) or a failed
+  request halve the bulk size and double the pause
+- a request slower than the target latency shrinks the bulk size
+- a fast, clean request grows the bulk size by a fixed step (min_size) and
+  halves the pause
+- every few seconds the write thread pool is sampled (_cat/thread_pool); a
+  filling queue or new rejections on any node count as pressure even before
+  this client sees a rejection
+
+An idle cluster therefore gets large back-to-back requests and a busy one
+gets small, spaced ones. Only rejected items are retried.
+"""
+
+import time
+
+REJECTED_STATUS = 429
+
+
+class BulkController:
+    """Additive-increase / multiplicative-decrease controller for bulk size and pacing"""
+
+    def __init__(self, es, initial_size=500, min_size=50, max_size=5000, target_latency=1.0,
+                 max_delay=30.0, stats_interval=10.0):
+        self.es = es
+        self.size = max(min_size, min(initial_size, max_size))
+        self.min_size = min_size
+        self.max_size = max_size
+        self.target_latency = target_latency
+        self.max_delay = max_delay
+        self.delay = 0.0
+        self.stats_interval = stats_interval
+        self.next_stats_check = 0.0
+        self.pool_rejected = None  # Write pool rejections across nodes at the last sample
+        self.stats_available = True
+        self.requests = 0
+        self.rejected_items = 0
+        self.failed_requests = 0
+        self.paused_seconds = 0.0
+
+    def _shrink(self, factor):
+        self.size = max(self.min_size, int(self.size * factor))
+
+    def _back_off(self):
+        self._shrink(0.5)
+        self.delay = min(self.max_delay, max(self.delay * 2, 0.25))
+
+    def wait(self):
+        """Pause before the next bulk request, after checking the write thread pool if due"""
+        if self.stats_available and time.monotonic() >= self.next_stats_check:
+            self.next_stats_check = time.monotonic() + self.stats_interval
+            self.sample_thread_pool()
+        if self.delay:
+            time.sleep(self.delay)
+            self.paused_seconds += self.delay
+
+    def sample_thread_pool(self):
+        try:
+            nodes = self.es.cat.thread_pool(thread_pool_patterns="write", format="json",
+                                            h="node_name,active,queue,queue_size,rejected")
+        except Exception as e:
+            # Usually missing monitor privileges; latency and rejections still drive the controller
+            print(f"Write thread pool stats unavailable, pacing on bulk responses only: {e}")
+            self.stats_available = False
+            return
+
+        rejected = sum(int(node.get("rejected") or 0) for node in nodes)
+        fill = max((int(node.get("queue") or 0) / max(1, int(node.get("queue_size") or 0)) for node in nodes),
+                   default=0.0)
+        new_rejections = self.pool_rejected is not None and rejected > self.pool_rejected
+        self.pool_rejected = rejected
+        if new_rejections:
+            self._back_off()
+        elif fill > 0.5:
+            # Other writers are filling the queue: ease off before requests get rejected
+            self._shrink(0.75)
+            self.delay = min(self.max_delay, max(self.delay, 0.1))
+
+    def record_response(self, latency, items, rejected):
+        """Adjust after a bulk response with items documents, of which rejected were rejected"""
+        self.requests += 1
+        self.rejected_items += rejected
+        if rejected:
+            self._back_off()
+            return
+        if latency > self.target_latency:
+            self._shrink(0.75)
+        elif items >= self.size:
+            # Additive step: only a full request says anything about a larger one
+            self.size = min(self.max_size, self.size + self.min_size)
+        self.delay = self.delay / 2 if self.delay >= 0.02 else 0.0
+
+    def record_failure(self, error):
+        """Adjust after a bulk request failed as a whole (timeout, 429, connection error)"""
+        self.requests += 1
+        self.failed_requests += 1
+        self._back_off()
+        # A request that failed outright waits at least a second before it is sent again
+        self.delay = min(self.max_delay, max(self.delay, 1.0))
+
+    def summary(self):
+        return (f"bulk size {self.size}, pause {self.delay:.2f}s, {self.requests} requests, "
+                f"{self.rejected_items} rejected items, {self.failed_requests} failed requests, "
+                f"{self.paused_seconds:.1f}s paused")
+
+
+def is_rejection(item_result):
+    """Whether a bulk item failed because the cluster was overloaded (worth retrying)"""
+    if item_result.get("status") == REJECTED_STATUS:
+        return True
+    error = item_result.get("error")
+    return isinstance(error, dict) and error.get("type") == "es_rejected_execution_exception"
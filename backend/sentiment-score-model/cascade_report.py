@@ -0,0 +1,140 @@
+"""
+cascade_report.py
+
+Offline agreement report for the analyzer's lexicon cascade (--cascade-threshold).
+
+Samples documents that RoBERTa has already labeled, scores their text with the
+lexicon stage and, for each candidate threshold, reports:
+
+    coverage            share of texts the lexicon would label on its own
+    lexicon agreement   how often those lexicon labels match RoBERTa
+    cascade agreement   overall label agreement of the cascade with the full model
+                        (lexicon labels for covered texts, RoBERTa for the rest)
+
+Pick the lowest threshold whose cascade agreement is acceptable; coverage is
+the share of forward passes it saves.
+
+    python cascade_report.py --index mastodon-prod-v3 reddit-prod-v6 --sample 5000 --target 0.97
+"""
+
+import argparse
+import json
+
+from elasticsearch import Elasticsearch
+
+from lexicon_scorer import cascade_threshold, score_texts
+
+DEFAULT_THRESHOLDS = [0.55, 0.6, 0.67, 0.7, 0.75, 0.8, 0.85, 0.9, 0.95]
+
+
+def extract_content(doc_source):
+    for field in ("content", "body", "selftext"):
+        if isinstance(doc_source.get(field), str):
+            return doc_source[field]
+    return None
+
+
+def sample_labeled(es, index, size, seed):
+    """Random sample of (text, RoBERTa label) from documents the model labeled"""
+    response = es.search(
+        index=index,
+        size=size,
+        query={
+            "function_score": {
+                "query": {
+                    "bool": {
+                        "filter": {"exists": {"field": "roberta_sentiment_label"}},
+                        "must_not": {"term": {"sentiment_stage": "lexicon"}}
+                    }
+                },
+                "random_score": {"seed": seed, "field": "_seq_no"}
+            }
+        },
+        _source=["content", "body", "selftext", "roberta_sentiment_label"]
+    )
+    samples = []
+    for hit in response["hits"]["hits"]:
+        text = extract_content(hit["_source"])
+        if text:
+            samples.append((text, hit["_source"]["roberta_sentiment_label"]))
+    return samples
+
+
+def agreement_table(samples, thresholds):
+    scored = [
+        (max(scores, key=scores.get), confidence, model_label)
+        for (scores, confidence), (_, model_label) in zip(score_texts([text for text, _ in samples]), samples)
+    ]
+    rows = []
+    for threshold in thresholds:
+        covered = [(label, model_label) for label, confidence, model_label in scored if confidence >= threshold]
+        agreeing = sum(label == model_label for label, model_label in covered)
+        disagreeing = len(covered) - agreeing
+        rows.append({
+            "threshold": threshold,
+            "coverage": len(covered) / len(scored) if scored else 0.0,
+            "lexicon_agreement": agreeing / len(covered) if covered else None,
+            "cascade_agreement": 1 - disagreeing / len(scored) if scored else None,
+        })
+    return rows
+
+
+def print_table(name, sample_count, rows):
+    print(f"{name}: {sample_count} texts labeled by RoBERTa")
+    print(f"{'threshold':>10} {'coverage':>9} {'lexicon agreement':>18} {'cascade agreement':>18}")
+    for row in rows:
+        lexicon = f"{row['lexicon_agreement'] * 100:.2f}%" if row["lexicon_agreement"] is not None else "-"
+        cascade = f"{row['cascade_agreement'] * 100:.2f}%" if row["cascade_agreement"] is not None else "-"
+        print(f"{row['threshold']:>10.2f} {row['coverage'] * 100:>8.2f}% {lexicon:>18} {cascade:>18}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Lexicon cascade agreement with RoBERTa labels")
+    parser.add_argument("--index", nargs="+", required=True, help="Indices to sample labeled documents from")
+    parser.add_argument("--sample", type=int, default=5000, help="Documents sampled per index (at most 10000)")
+    parser.add_argument("--thresholds", type=cascade_threshold, nargs="+", default=DEFAULT_THRESHOLDS, help="Confidence thresholds to evaluate")
+    parser.add_argument("--target", type=float, default=0.97, help="Cascade agreement the suggested threshold must reach")
+    parser.add_argument("--seed", type=int, default=42, help="Sampling seed")
+    parser.add_argument("--es-url", default="https://elasticsearch-master.elastic.svc.cluster.local:9200", help="Elasticsearch URL")
+    parser.add_argument("--json", help="Also write the report to this file")
+    args = parser.parse_args()
+
+    es = Elasticsearch(
+        [args.es_url],
+        verify_certs=False,
+        ssl_show_warn=False,
+        basic_auth=("elastic", "elastic"),
+        request_timeout=60
+    )
+
+    thresholds = sorted(args.thresholds)
+    report = {}
+    all_samples = []
+    for index in args.index:
+        samples = sample_labeled(es, index, min(args.sample, 10000), args.seed)
+        all_samples.extend(samples)
+        report[index] = agreement_table(samples, thresholds)
+        print_table(index, len(samples), report[index])
+        print()
+
+    if len(args.index) > 1:
+        report["all"] = agreement_table(all_samples, thresholds)
+        print_table("All indices", len(all_samples), report["all"])
+        print()
+
+    overall = report.get("all") or report[args.index[0]]
+    suitable = [row for row in overall if row["cascade_agreement"] is not None and row["cascade_agreement"] >= args.target]
+    if suitable:
+        best = suitable[0]
+        print(f"Suggested --cascade-threshold {best['threshold']}: {best['coverage'] * 100:.2f}% of texts skip RoBERTa "
+              f"at {best['cascade_agreement'] * 100:.2f}% agreement with the full model")
+    else:
+        print(f"No threshold reaches {args.target * 100:.2f}% cascade agreement; leave the cascade disabled")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
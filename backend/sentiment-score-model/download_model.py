@@ -7,6 +7,8 @@ designed for sentiment classification of text.
 
 The script creates directories for the tokenizer and model, downloads both components,
 and saves them to the specified paths for later use in sentiment analysis tasks.
+It then exports the model to ONNX (onnx/model.onnx) and writes a dynamically
+int8-quantized copy (onnx/model-int8.onnx) for the analyzers' --backend option.
 
 Returns:
      0 if model download successful, 1 if not download successful
@@ -16,6 +18,8 @@ from transformers import AutoTokenizer, AutoModelForSequenceClassification
 import os
 import sys
 
+from inference_backends import export_onnx
+
 def download_model():
     try:
         # Create directories for tokenizer and model if they don't exist
@@ -33,9 +37,16 @@ def download_model():
 
         # Download and save the tokenizer
         model = AutoModelForSequenceClassification.from_pretrained(MODEL_NAME)
-        model.save_pretrained("/models/roberta-sentiment/model")
+        model.save_pretrained("/models/roberta-sentiment/model", safe_serialization=True)  # memory-mapped by the analyzers
         print("Model saved successfully")
 
+        # Export CPU-optimized artifacts; the fp32 model stays usable if this fails
+        try:
+            onnx_file, int8_file = export_onnx(model, tokenizer, "/models/roberta-sentiment")
+            print(f"ONNX model exported to {onnx_file}, int8 model to {int8_file}")
+        except Exception as e:
+            print(f"ONNX export failed, only the torch backends will be available: {e}")
+
         print("Model download and preparation complete!")
         return True
     except Exception as e:
@@ -0,0 +1,136 @@
+"""
+inference_backends.py
+
+CPU-oriented inference backends for the RoBERTa sentiment model.
+
+- torch:      the fp32 PyTorch model (reference)
+- torch-int8: the same model with its Linear layers dynamically quantized to int8
+- onnx:       ONNX Runtime over the exported model (onnx/model.onnx)
+- onnx-int8:  ONNX Runtime over the dynamically quantized export (onnx/model-int8.onnx)
+
+download_model.py produces the ONNX artifacts next to the saved model. Every
+backend takes a batch padded by the tokenizer (as tensors of its tensor_type)
+and returns softmax rows in label order: negative, neutral, positive.
+
+torch and onnxruntime are imported when a backend first needs them, so
+importing this module (e.g. for BACKENDS) stays cheap.
+"""
+
+import os
+
+import numpy as np
+
+BACKENDS = ("torch", "torch-int8", "onnx", "onnx-int8")
+ONNX_MODEL_FILES = {
+    "onnx": "onnx/model.onnx",
+    "onnx-int8": "onnx/model-int8.onnx",
+}
+
+
+class TorchBackend:
+    """PyTorch model, fp32 or dynamically quantized"""
+    tensor_type = "pt"
+
+    def __init__(self, model, device):
+        self.model = model
+        self.device = device
+
+    def predict(self, inputs):
+        import torch
+
+        inputs = {k: v.to(self.device) for k, v in inputs.items()}
+        with torch.no_grad():
+            logits = self.model(**inputs).logits
+        return torch.nn.functional.softmax(logits, dim=1).tolist()
+
+
+class OnnxBackend:
+    """ONNX Runtime session on the CPU execution provider"""
+    tensor_type = "np"
+
+    def __init__(self, model_file, threads):
+        import onnxruntime
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = threads
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(model_file, options, providers=["CPUExecutionProvider"])
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+    def predict(self, inputs):
+        feeds = {k: np.asarray(v, dtype=np.int64) for k, v in inputs.items() if k in self.input_names}
+        logits = self.session.run(None, feeds)[0]
+        # Numerically stable softmax
+        exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+        return (exp / exp.sum(axis=1, keepdims=True)).tolist()
+
+
+def load_backend(name, model, device, model_path, threads):
+    """Build the named backend from the loaded fp32 model or its exported artifacts"""
+    if name == "torch":
+        return TorchBackend(model, device)
+    if name == "torch-int8":
+        import torch
+
+        # Dynamic quantization only runs on CPU; returns a quantized copy of the model
+        quantized = torch.ao.quantization.quantize_dynamic(model.to("cpu"), {torch.nn.Linear}, dtype=torch.qint8)
+        return TorchBackend(quantized, torch.device("cpu"))
+    if name in ONNX_MODEL_FILES:
+        model_file = os.path.join(model_path, ONNX_MODEL_FILES[name])
+        if not os.path.exists(model_file):
+            raise FileNotFoundError(f"{model_file} not found, run download_model.py to export it")
+        return OnnxBackend(model_file, threads)
+    raise ValueError(f"Unknown inference backend: {name}")
+
+
+def export_onnx(model, tokenizer, model_path):
+    """Export the fp32 model to ONNX and write a dynamically int8-quantized copy"""
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    onnx_file = os.path.join(model_path, ONNX_MODEL_FILES["onnx"])
+    int8_file = os.path.join(model_path, ONNX_MODEL_FILES["onnx-int8"])
+    os.makedirs(os.path.dirname(onnx_file), exist_ok=True)
+
+    model.eval()
+    sample = tokenizer(["an example post", "another one"], padding=True, return_tensors="pt")
+    torch.onnx.export(
+        model,
+        (sample["input_ids"], sample["attention_mask"]),
+        onnx_file,
+        input_names=["input_ids", "attention_mask"],
+        output_names=["logits"],
+        dynamic_axes={
+            "input_ids": {0: "batch", 1: "sequence"},
+            "attention_mask": {0: "batch", 1: "sequence"},
+            "logits": {0: "batch"}
+        },
+        opset_version=17,
+        dynamo=False
+    )
+    quantize_dynamic(onnx_file, int8_file, weight_type=QuantType.QInt8)
+    return onnx_file, int8_file
+
+
+def parity_check(reference, candidate, tokenizer, texts, max_length=512, batch_size=32):
+    """Compare a candidate backend with the fp32 reference on sample texts.
+
+    Returns label agreement (fraction of texts with the same argmax label) and
+    the largest absolute difference between any two probabilities.
+    """
+    agreeing = 0
+    max_abs_diff = 0.0
+    for start in range(0, len(texts), batch_size):
+        chunk = texts[start:start + batch_size]
+        reference_rows = reference.predict(
+            tokenizer(chunk, truncation=True, max_length=max_length, padding=True, return_tensors=reference.tensor_type))
+        candidate_rows = candidate.predict(
+            tokenizer(chunk, truncation=True, max_length=max_length, padding=True, return_tensors=candidate.tensor_type))
+        for expected, actual in zip(reference_rows, candidate_rows):
+            agreeing += int(np.argmax(expected) == np.argmax(actual))
+            max_abs_diff = max(max_abs_diff, float(np.max(np.abs(np.subtract(expected, actual)))))
+    return {
+        "samples": len(texts),
+        "agreement": agreeing / len(texts) if texts else 1.0,
+        "max_abs_diff": max_abs_diff
+    }
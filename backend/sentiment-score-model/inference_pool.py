@@ -0,0 +1,93 @@
+"""
+inference_pool.py
+
+Multi-process inference for the sentiment analyzers.
+
+One Python process saturates at the intra-op parallelism of a single forward
+pass, so larger pods run several worker processes, each with a fixed number of
+intra-op threads. Workers are forked from the analyzer after the fp32 model is
+loaded and before it has run any forward pass (OpenMP does not survive a fork
+once its thread pool is started), so they share the model weights
+copy-on-write instead of loading one copy each. Only the fp32 torch backend
+runs in workers: a quantized model is a new copy and an ONNX Runtime session
+cannot be shared across a fork, so either would be built once per worker and
+memory would grow with the worker count.
+"""
+
+import multiprocessing
+import os
+import signal
+
+from inference_backends import TorchBackend
+
+# Set in the parent before forking; inherited by every worker
+_shared = {}
+
+
+def available_cpus():
+    """CPUs this container may use: the cgroup CPU limit, else the affinity mask"""
+    # cgroup v2
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        if quota != "max":
+            return max(1, int(quota) // int(period))
+    except (OSError, ValueError):
+        pass
+    # cgroup v1
+    try:
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_quota_us") as f:
+            quota = int(f.read())
+        with open("/sys/fs/cgroup/cpu/cpu.cfs_period_us") as f:
+            period = int(f.read())
+        if quota > 0:
+            return max(1, quota // period)
+    except (OSError, ValueError):
+        pass
+    return len(os.sched_getaffinity(0))
+
+
+def _init_worker(threads):
+    import torch
+
+    # The analyzer's graceful SIGTERM handler is inherited through fork; workers just exit
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    torch.set_num_threads(threads)
+
+
+def _predict(task):
+    input_ids, attention_mask = task
+    try:
+        # Wraps the inherited model; nothing is copied
+        backend = TorchBackend(_shared["model"], _shared["device"])
+        inputs = _shared["tokenizer"].pad({"input_ids": input_ids, "attention_mask": attention_mask},
+                                          return_tensors=backend.tensor_type)
+        return backend.predict(inputs)
+    except Exception as e:
+        print(f"Inference worker {os.getpid()} failed on a batch of {len(input_ids)} texts: {e}")
+        return None
+
+
+class InferencePool:
+    """Fork-based pool of inference processes sharing one copy of the fp32 model"""
+
+    def __init__(self, model, tokenizer, device, workers, threads_per_worker):
+        # Inherited through fork; the weights are only read, so their pages stay shared
+        _shared.update(model=model, tokenizer=tokenizer, device=device)
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker
+        self.pool = multiprocessing.get_context("fork").Pool(
+            workers, initializer=_init_worker, initargs=(threads_per_worker,))
+
+    def predict_batches(self, batches):
+        """Score (input_ids, attention_mask) batches in order; a failed batch yields None"""
+        return self.pool.imap(_predict, list(batches))
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+    def terminate(self):
+        """Stop the workers without waiting for queued batches"""
+        self.pool.terminate()
+        self.pool.join()
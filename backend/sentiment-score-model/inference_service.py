@@ -0,0 +1,325 @@
+"""
+inference_service.py
+
+Standalone HTTP service that keeps one warm copy of the RoBERTa sentiment model
+and scores texts for any consumer (the Fission sentiment generator, notebooks,
+ad-hoc jobs) instead of each of them loading the model.
+
+Requests are split into texts and queued. A single inference thread forms
+batches dynamically: a batch is closed when its oldest text has waited
+--max-wait-ms, when adding the next text would push texts x longest length
+over --max-batch-tokens, or at --max-batch-size texts. Concurrent callers are
+therefore served by shared, well-filled forward passes.
+
+Endpoints:
+    POST /predict  {"texts": [...]} -> {"model_version": ..., "results": [{negative, neutral, positive, label} or null]}
+                   (null for texts without content)
+    GET  /health   readiness and model_version
+    GET  /metrics  Prometheus text format: batch latency, batch size, batch tokens, queue wait
+    GET  /stats    recent batch latency percentiles as JSON
+"""
+
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import queue
+import threading
+import time
+from typing import List, Optional
+
+import torch
+import uvicorn
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import PlainTextResponse
+from pydantic import BaseModel
+from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+from inference_backends import BACKENDS, load_backend
+
+MODEL_NAME = "cardiffnlp/twitter-roberta-base-sentiment-latest"
+MAX_SEQ_LENGTH = 512
+LABELS = ("negative", "neutral", "positive")
+MAX_TEXTS_PER_REQUEST = 1000
+
+# Histogram upper bounds for the /metrics endpoint
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128)
+TOKEN_BUCKETS = (256, 512, 1024, 2048, 4096, 8192, 16384)
+
+
+class PredictRequest(BaseModel):
+    texts: List[Optional[str]]
+
+
+class Histogram:
+    """Cumulative Prometheus histogram"""
+
+    def __init__(self, name, help_text, buckets):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += 1
+        self.sum += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for bound, count in zip(self.buckets, self.counts):
+            lines.append(f'{self.name}_bucket{{le="{bound}"}} {count}')
+        lines.append(f'{self.name}_bucket{{le="+Inf"}} {self.total}')
+        lines.append(f"{self.name}_sum {self.sum}")
+        lines.append(f"{self.name}_count {self.total}")
+        return lines
+
+
+class BatchMetrics:
+    """Per-batch measurements, exported by /metrics and summarised by /stats"""
+
+    def __init__(self, recent=1000):
+        self.lock = threading.Lock()
+        self.latency = Histogram("sentiment_batch_latency_seconds", "Forward pass latency per batch", LATENCY_BUCKETS)
+        self.queue_wait = Histogram("sentiment_queue_wait_seconds", "Time texts waited before their batch ran",
+                                    LATENCY_BUCKETS)
+        self.size = Histogram("sentiment_batch_size", "Texts per batch", SIZE_BUCKETS)
+        self.tokens = Histogram("sentiment_batch_padded_tokens", "Padded tokens per batch", TOKEN_BUCKETS)
+        self.texts = 0
+        self.failed_batches = 0
+        self.recent_latency = collections.deque(maxlen=recent)
+
+    def record(self, latency, size, padded_tokens, waits):
+        with self.lock:
+            self.latency.observe(latency)
+            self.size.observe(size)
+            self.tokens.observe(padded_tokens)
+            for wait in waits:
+                self.queue_wait.observe(wait)
+            self.texts += size
+            self.recent_latency.append(latency)
+
+    def record_failure(self):
+        with self.lock:
+            self.failed_batches += 1
+
+    def render(self, queue_depth):
+        with self.lock:
+            lines = []
+            for histogram in (self.latency, self.queue_wait, self.size, self.tokens):
+                lines.extend(histogram.render())
+            lines += [
+                "# HELP sentiment_texts_total Texts scored",
+                "# TYPE sentiment_texts_total counter",
+                f"sentiment_texts_total {self.texts}",
+                "# HELP sentiment_failed_batches_total Batches whose forward pass failed",
+                "# TYPE sentiment_failed_batches_total counter",
+                f"sentiment_failed_batches_total {self.failed_batches}",
+                "# HELP sentiment_queue_depth Texts waiting for a batch",
+                "# TYPE sentiment_queue_depth gauge",
+                f"sentiment_queue_depth {queue_depth}",
+            ]
+        return "\n".join(lines) + "\n"
+
+    def summary(self):
+        with self.lock:
+            recent = sorted(self.recent_latency)
+            batches = self.latency.total
+            texts = self.texts
+        if not recent:
+            return {"batches": batches, "texts": texts}
+
+        def percentile(fraction):
+            return round(recent[min(len(recent) - 1, int(round(fraction * (len(recent) - 1))))] * 1000, 2)
+
+        return {
+            "batches": batches,
+            "texts": texts,
+            "mean_batch_size": round(texts / batches, 2) if batches else 0.0,
+            "recent_batch_p50_ms": percentile(0.50),
+            "recent_batch_p99_ms": percentile(0.99),
+        }
+
+
+class PendingText:
+    __slots__ = ("input_ids", "attention_mask", "future", "enqueued")
+
+    def __init__(self, input_ids, attention_mask):
+        self.input_ids = input_ids
+        self.attention_mask = attention_mask
+        self.future = concurrent.futures.Future()
+        self.enqueued = time.monotonic()
+
+
+class DynamicBatcher:
+    """Collects queued texts into token-budgeted batches on one inference thread"""
+
+    def __init__(self, backend, tokenizer, max_wait_ms, max_batch_tokens, max_batch_size, metrics):
+        self.backend = backend
+        self.tokenizer = tokenizer
+        self.max_wait = max_wait_ms / 1000.0
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self.metrics = metrics
+        self.queue = queue.Queue()
+        self.thread = threading.Thread(target=self._run, name="inference", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.queue.put(None)
+        self.thread.join()
+
+    def submit(self, input_ids, attention_mask):
+        pending = PendingText(input_ids, attention_mask)
+        self.queue.put(pending)
+        return pending.future
+
+    def _next_batch(self, first):
+        """Fill a batch starting with first; returns it and any text that did not fit"""
+        batch = [first]
+        longest = len(first.input_ids)
+        deadline = first.enqueued + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            try:
+                # Past the deadline, still take whatever is already queued
+                item = self.queue.get(timeout=timeout) if timeout > 0 else self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                self.queue.put(None)
+                break
+            if max(longest, len(item.input_ids)) * (len(batch) + 1) > self.max_batch_tokens:
+                return batch, item
+            batch.append(item)
+            longest = max(longest, len(item.input_ids))
+        return batch, None
+
+    def _run(self):
+        carried = None
+        while True:
+            first = carried or self.queue.get()
+            if first is None:
+                break
+            batch, carried = self._next_batch(first)
+            self._predict(batch)
+
+    def _predict(self, batch):
+        started = time.monotonic()
+        waits = [started - item.enqueued for item in batch]
+        try:
+            inputs = self.tokenizer.pad(
+                {
+                    "input_ids": [item.input_ids for item in batch],
+                    "attention_mask": [item.attention_mask for item in batch]
+                },
+                return_tensors=self.backend.tensor_type
+            )
+            rows = self.backend.predict(inputs)
+        except Exception as e:
+            self.metrics.record_failure()
+            for item in batch:
+                item.future.set_exception(e)
+            return
+
+        padded_tokens = max(len(item.input_ids) for item in batch) * len(batch)
+        self.metrics.record(time.monotonic() - started, len(batch), padded_tokens, waits)
+        for item, row in zip(batch, rows):
+            item.future.set_result(row)
+
+
+def create_app(args):
+    app = FastAPI(
+        title="Sentiment Inference Service",
+        description="Shared RoBERTa sentiment model with server-side dynamic batching.",
+    )
+    metrics = BatchMetrics()
+
+    @app.on_event("startup")
+    async def load_model():
+        torch.set_num_threads(args.threads)
+        tokenizer = AutoTokenizer.from_pretrained(f"{args.model_path}/tokenizer", local_files_only=True)
+        model = AutoModelForSequenceClassification.from_pretrained(f"{args.model_path}/model", local_files_only=True)
+        model.eval()
+        backend = load_backend(args.backend, model, torch.device("cpu"), args.model_path, args.threads)
+        app.state.tokenizer = tokenizer
+        app.state.model_version = MODEL_NAME if args.backend == "torch" else f"{MODEL_NAME}+{args.backend}"
+        app.state.batcher = DynamicBatcher(backend, tokenizer, args.max_wait_ms, args.max_batch_tokens,
+                                           args.max_batch_size, metrics)
+        app.state.batcher.start()
+        print(f"Loaded model from {args.model_path} with the {args.backend} backend; batching up to "
+              f"{args.max_batch_size} texts / {args.max_batch_tokens} tokens within {args.max_wait_ms} ms")
+
+    @app.on_event("shutdown")
+    async def stop_batcher():
+        app.state.batcher.stop()
+
+    @app.post("/predict")
+    async def predict(request: PredictRequest):
+        if len(request.texts) > MAX_TEXTS_PER_REQUEST:
+            raise HTTPException(status_code=413, detail=f"At most {MAX_TEXTS_PER_REQUEST} texts per request")
+
+        # Texts without content get no scores (null): the batch analyzers leave them unlabeled too
+        results = [None for _ in request.texts]
+        positions = [i for i, text in enumerate(request.texts) if text and text.strip()]
+        if not positions:
+            return {"model_version": app.state.model_version, "results": results}
+
+        encoded = app.state.tokenizer([request.texts[i] for i in positions], truncation=True,
+                                      max_length=MAX_SEQ_LENGTH)
+        futures = [
+            asyncio.wrap_future(app.state.batcher.submit(input_ids, attention_mask))
+            for input_ids, attention_mask in zip(encoded["input_ids"], encoded["attention_mask"])
+        ]
+        try:
+            rows = await asyncio.gather(*futures)
+        except Exception as e:
+            raise HTTPException(status_code=503, detail=f"Inference failed: {e}")
+
+        for position, row in zip(positions, rows):
+            scores = dict(zip(LABELS, row))
+            results[position] = {**scores, "label": max(scores, key=scores.get)}
+        return {"model_version": app.state.model_version, "results": results}
+
+    @app.get("/health")
+    async def health():
+        if not hasattr(app.state, "batcher"):
+            raise HTTPException(status_code=503, detail="Model not loaded")
+        return {"status": "ok", "model_version": app.state.model_version}
+
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def prometheus_metrics():
+        batcher = getattr(app.state, "batcher", None)
+        return metrics.render(batcher.queue.qsize() if batcher else 0)
+
+    @app.get("/stats")
+    async def stats():
+        return metrics.summary()
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serve the sentiment model with dynamic batching')
+    parser.add_argument('--host', type=str, default='0.0.0.0', help='Address to listen on')
+    parser.add_argument('--port', type=int, default=8080, help='Port to listen on')
+    parser.add_argument('--model-path', type=str, default='/models/roberta-sentiment', help='Directory holding the tokenizer/ and model/ folders')
+    parser.add_argument('--backend', type=str, choices=BACKENDS, default='torch', help='Inference backend')
+    parser.add_argument('--threads', type=int, default=2, help='Intra-op threads for the forward pass')
+    parser.add_argument('--max-wait-ms', type=float, default=10, help='Longest a text waits for its batch to fill')
+    parser.add_argument('--max-batch-tokens', type=int, default=8192, help='Token budget (texts x padded length) per batch')
+    parser.add_argument('--max-batch-size', type=int, default=64, help='Maximum texts per batch')
+    args = parser.parse_args()
+
+    uvicorn.run(create_app(args), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+language_filter.py
+
+Pre-filter run by the analyzer before inference (--languages). The sentiment
+model is an English Twitter RoBERTa, so texts in other languages get poor
+labels at full inference cost, and texts with nothing left after cleaning
+(only links, mentions or markup) carry no sentiment at all.
+
+A text is skipped when, after removing HTML tags, URLs and @mentions, it has
+no letters or emoji left ("empty"), or when its language is known and not one
+of the target languages ("language"). The language comes from the document's
+own field when present (Mastodon stores the ISO 639-1 code of each status) and
+otherwise from a small detector: the dominant script for non-Latin text, and
+for Latin text the language whose common function words occur most often.
+Texts the detector cannot decide are kept, so short English posts are not lost.
+"""
+
+import re
+
+HTML_TAG_PATTERN = re.compile(r"<[^>]+>")
+URL_PATTERN = re.compile(r"https?://\S+|www\.\S+")
+MENTION_PATTERN = re.compile(r"@[\w.-]+(?:@[\w.-]+)?")
+WORD_PATTERN = re.compile(r"[^\W\d_]+")
+CONTENT_PATTERN = re.compile(r"[^\W\d_]|[\U0001F300-\U0001FAFF\u2600-\u27BF]")
+
+# Unicode ranges of scripts that identify a language (family) on their own
+SCRIPTS = (
+    ("ja", re.compile(r"[\u3040-\u30FF]")),               # hiragana / katakana
+    ("ko", re.compile(r"[\uAC00-\uD7AF\u1100-\u11FF]")),   # hangul
+    ("zh", re.compile(r"[\u4E00-\u9FFF]")),               # han without kana
+    ("ru", re.compile(r"[\u0400-\u04FF]")),               # cyrillic
+    ("el", re.compile(r"[\u0370-\u03FF]")),               # greek
+    ("ar", re.compile(r"[\u0600-\u06FF]")),               # arabic
+    ("he", re.compile(r"[\u0590-\u05FF]")),               # hebrew
+    ("th", re.compile(r"[\u0E00-\u0E7F]")),               # thai
+    ("hi", re.compile(r"[\u0900-\u097F]")),               # devanagari
+)
+
+# Frequent function words of common Latin-script languages on Mastodon and Reddit
+FUNCTION_WORDS = {
+    "en": "the and is are was were of to in that it for with this you not have be on at but they what",
+    "de": "der die das und ist nicht ich sie ein eine zu mit auf auch den dem wir aber sind war wie",
+    "fr": "le la les et est une des pas je vous que qui dans pour sur avec mais sont ce du au",
+    "es": "el la los las y es una que por para con pero muy como del se lo esta este son",
+    "it": "il lo gli della che non una sono per con anche come questo del alla ma ho è",
+    "nl": "de het een en niet ik dat is van op zijn met voor maar ook wel er naar",
+    "pt": "o os as um uma que não com para por mas muito como do da em são está",
+}
+FUNCTION_WORD_LANGUAGES = {}
+for _language, _words in FUNCTION_WORDS.items():
+    for _word in _words.split():
+        FUNCTION_WORD_LANGUAGES.setdefault(_word, []).append(_language)
+
+MIN_FUNCTION_WORDS = 2  # Fewer matches than this leave the language undetermined
+
+
+def clean_text(text):
+    """Text without HTML tags, URLs and mentions, whitespace collapsed"""
+    text = HTML_TAG_PATTERN.sub(" ", text)
+    text = URL_PATTERN.sub(" ", text)
+    text = MENTION_PATTERN.sub(" ", text)
+    return " ".join(text.split())
+
+
+def detect_language(text):
+    """ISO 639-1 code of text, or None when it cannot be told"""
+    if not WORD_PATTERN.search(text):
+        return None
+    for language, pattern in SCRIPTS:
+        # A script that makes up a good share of the text decides it
+        if len(pattern.findall(text)) * 2 >= len(text.replace(" ", "")):
+            return language
+
+    counts = {}
+    for word in WORD_PATTERN.findall(text.lower()):
+        for language in FUNCTION_WORD_LANGUAGES.get(word, ()):
+            counts[language] = counts.get(language, 0) + 1
+    if not counts:
+        return None
+    best = max(counts, key=counts.get)
+    if counts[best] < MIN_FUNCTION_WORDS:
+        return None
+    # Shared words ("de", "la") make close calls unreliable; keep English on a tie
+    if counts.get("en", 0) == counts[best]:
+        return "en"
+    return best
+
+
+def normalize_language(code):
+    """'en-US', 'EN', 'en_GB' -> 'en'"""
+    return re.split(r"[-_]", code.strip().lower(), maxsplit=1)[0] if code else None
+
+
+def skip_reason(text, language, target_languages):
+    """Return (reason, language): reason is "empty", "language" or None when the text should be scored"""
+    cleaned = clean_text(text or "")
+    if not CONTENT_PATTERN.search(cleaned):
+        return "empty", None
+    language = normalize_language(language) or detect_language(cleaned)
+    if language is not None and language not in target_languages:
+        return "language", language
+    return None, language
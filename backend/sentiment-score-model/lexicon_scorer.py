@@ -0,0 +1,148 @@
+"""
+lexicon_scorer.py
+
+Fast first-stage sentiment scorer for the analyzer's confidence-gated cascade.
+
+Texts are split into lowercase words, emoji and emoticons, and each token is
+looked up in a small weighted lexicon. Negators ("not", "never", ...) flip the
+polarity of the next few tokens and boosters ("very", "so", ...) amplify the
+next one. The whole batch is scored at once: tokens of every text are
+flattened into one array and summed per text with numpy, so the cost is a
+dictionary lookup per token.
+
+The polarity of a text is (positive - negative) / (positive + negative + 1);
+its absolute value is the confidence. A text with one mild word, mixed
+sentiment or no sentiment words at all has low confidence and is left to
+RoBERTa. The lexicon never labels a text neutral, so cascade thresholds must
+be above MIN_THRESHOLD, where the polarity score starts to beat neutral.
+"""
+
+import argparse
+import re
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(
+    r"[a-z]+(?:'[a-z]+)?"                      # words, keeping contractions such as don't
+    r"|[:;]-?[()dp]"                           # :) :-( ;) :d :p
+    r"|[\U0001F300-\U0001FAFF\u2600-\u27BF]"   # emoji
+)
+
+# Word -> weight; stronger words get larger magnitudes
+POSITIVE_WORDS = {
+    1.0: "good nice fine like liked likes enjoy enjoyed enjoying fun glad happy pleased cool cute fresh "
+         "catchy chill smooth solid decent worth recommend recommended support supporting thanks thank "
+         "grateful hope hopeful proud win won winning success successful better improve improved "
+         "interesting pretty sweet clean helpful positive safe fair agree excited exciting",
+    2.0: "great love loved loves loving lovely awesome amazing excellent fantastic wonderful beautiful "
+         "brilliant superb perfect incredible gorgeous stunning favourite favorite banger bangers "
+         "impressive epic legendary killer delighted thrilled stoked blessed yay hooray congrats "
+         "congratulations best bravo",
+    3.0: "masterpiece phenomenal outstanding magnificent flawless iconic",
+}
+NEGATIVE_WORDS = {
+    1.0: "bad sad boring bored meh mid dull weak poor wrong annoying annoyed tired lame overrated "
+         "overpriced expensive problem problems issue issues fail failed failing lose lost losing "
+         "worse worry worried concern concerned difficult hard unfair sorry cancel cancelled canceled "
+         "delay delayed broken negative confused confusing mess messy skip fake",
+    2.0: "hate hated hates awful terrible horrible worst disappointing disappointed disappointment "
+         "disgusting angry furious ugly pathetic garbage trash rubbish useless ridiculous shameful "
+         "disaster disastrous nightmare scam crap sucks sucked dreadful toxic corrupt liar lies "
+         "outrage outraged",
+    3.0: "abysmal atrocious appalling horrendous despise vile",
+}
+EMOJI_WEIGHTS = {
+    "\U0001F60D": 2.0, "\U0001F970": 2.0, "\U0001F618": 1.5, "\U0001F60A": 1.5, "\U0001F600": 1.0,
+    "\U0001F603": 1.0, "\U0001F604": 1.5, "\U0001F601": 1.5, "\U0001F642": 1.0, "\U0001F929": 2.0,
+    "\U0001F44F": 1.5, "\U0001F44D": 1.5, "\U0001F64C": 1.5, "\U0001F389": 1.5, "\U0001F973": 1.5,
+    "\U0001F496": 2.0, "\U0001F495": 2.0, "\U0001F499": 1.5, "\U0001F49C": 1.5, "\U0001F49A": 1.5,
+    "\u2764": 2.0, "\u2728": 1.0, "\U0001F525": 1.0,
+    "\U0001F621": -2.0, "\U0001F620": -2.0, "\U0001F92C": -2.5, "\U0001F44E": -1.5, "\U0001F612": -1.5,
+    "\U0001F644": -1.0, "\U0001F61E": -1.5, "\U0001F614": -1.0, "\U0001F622": -1.0, "\U0001F494": -2.0,
+    "\U0001F92E": -2.0, "\U0001F4A9": -1.5, "\U0001F615": -1.0, "\U0001F611": -0.5,
+    ":)": 1.0, ":-)": 1.0, ";)": 1.0, ";-)": 1.0, ":d": 1.5, ":-d": 1.5, ":p": 0.5, ":-p": 0.5,
+    ":(": -1.0, ":-(": -1.0,
+}
+NEGATORS = frozenset(
+    "not no never nothing nobody none neither nor without isn't aren't wasn't weren't don't doesn't "
+    "didn't can't couldn't won't wouldn't shouldn't hasn't haven't hadn't ain't cannot dont doesnt "
+    "didnt cant wont isnt wasnt".split()
+)
+BOOSTERS = frozenset(
+    "very so really extremely absolutely totally truly super incredibly insanely highly most "
+    "literally completely".split()
+)
+
+NEGATION_SCOPE = 3       # Tokens after a negator whose polarity is flipped
+NEGATION_FACTOR = -0.75  # "not good" is milder than "bad"
+BOOST_FACTOR = 1.5
+SMOOTHING = 1.0          # Keeps texts with a single mild word below high confidence
+MIN_THRESHOLD = 0.5      # At or below this confidence neutral ties or beats the polarity
+
+
+def _build_weights():
+    weights = dict(EMOJI_WEIGHTS)
+    for sign, groups in ((1.0, POSITIVE_WORDS), (-1.0, NEGATIVE_WORDS)):
+        for weight, words in groups.items():
+            for word in words.split():
+                weights[word] = sign * weight
+    return weights
+
+
+WEIGHTS = _build_weights()
+
+
+def polarity(texts):
+    """Signed polarity in [-1, 1] for each text, scored as one vectorized batch"""
+    tokens = [TOKEN_PATTERN.findall(text.lower()) if text else [] for text in texts]
+    counts = np.fromiter((len(t) for t in tokens), dtype=np.int64, count=len(tokens))
+    flat = [token for text_tokens in tokens for token in text_tokens]
+    if not flat:
+        return np.zeros(len(texts))
+
+    owner = np.repeat(np.arange(len(texts)), counts)
+    weights = np.fromiter((WEIGHTS.get(token, 0.0) for token in flat), dtype=np.float64, count=len(flat))
+    negator = np.fromiter((token in NEGATORS for token in flat), dtype=bool, count=len(flat))
+    booster = np.fromiter((token in BOOSTERS for token in flat), dtype=bool, count=len(flat))
+
+    # Modifiers only reach tokens of the same text
+    factor = np.ones(len(flat))
+    for shift in range(1, NEGATION_SCOPE + 1):
+        negated = np.zeros(len(flat), dtype=bool)
+        negated[shift:] = negator[:-shift] & (owner[shift:] == owner[:-shift])
+        factor[negated] *= NEGATION_FACTOR
+    boosted = np.zeros(len(flat), dtype=bool)
+    boosted[1:] = booster[:-1] & (owner[1:] == owner[:-1])
+    factor[boosted] *= BOOST_FACTOR
+
+    contributions = weights * factor
+    positive = np.bincount(owner, weights=np.clip(contributions, 0, None), minlength=len(texts))
+    negative = np.bincount(owner, weights=np.clip(-contributions, 0, None), minlength=len(texts))
+    return (positive - negative) / (positive + negative + SMOOTHING)
+
+
+def score_texts(texts):
+    """Return (scores, confidence) per text.
+
+    scores has the analyzer's negative/neutral/positive keys: the detected
+    polarity gets the confidence and neutral the remainder, so the label is
+    the polarity whenever the confidence is above 0.5.
+    """
+    results = []
+    for value in polarity(texts):
+        confidence = float(abs(value))
+        scores = {"negative": 0.0, "neutral": 1.0 - confidence, "positive": 0.0}
+        scores["positive" if value > 0 else "negative"] = confidence
+        results.append((scores, confidence))
+    return results
+
+
+def cascade_threshold(value):
+    """argparse type for cascade thresholds: 0 (cascade off) or above MIN_THRESHOLD, at most 1"""
+    threshold = float(value)
+    if threshold > 1:
+        raise argparse.ArgumentTypeError(f"{value} is above 1, the highest lexicon confidence")
+    if threshold != 0 and threshold <= MIN_THRESHOLD:
+        raise argparse.ArgumentTypeError(
+            f"{value} would let the lexicon write neutral labels; use 0 or a value above {MIN_THRESHOLD}")
+    return threshold
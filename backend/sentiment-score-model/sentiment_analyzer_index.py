@@ -1,40 +1,172 @@
 import time
-import torch
-from elasticsearch import Elasticsearch
-from tqdm import tqdm
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
+STARTUP_BEGAN = time.perf_counter()
 
-import concurrent.futures
-import threading
 import argparse
+import os
+import queue
+import shutil
+import signal
+import threading
+
+from elasticsearch import Elasticsearch
+
+from bulk_controller import BulkController, is_rejection
+from inference_backends import BACKENDS, load_backend, parity_check
+from inference_pool import InferencePool, available_cpus
+from language_filter import skip_reason
+from lexicon_scorer import cascade_threshold, score_texts as lexicon_score_texts
+from sentiment_cache import SentimentCache, content_digest, DEFAULT_CACHE_PATH, DEFAULT_MAX_ENTRIES
+
+# An --index entry: index name, optionally with its own document budget (name:max_docs)
+def index_budget(spec):
+    name, _, budget = spec.partition(":")
+    if not name:
+        raise argparse.ArgumentTypeError(f"invalid index entry: {spec!r}")
+    if not budget:
+        return name, None
+    try:
+        max_docs = int(budget)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid document budget in {spec!r}")
+    if max_docs <= 0:
+        raise argparse.ArgumentTypeError(f"document budget must be positive in {spec!r}")
+    return name, max_docs
+
 
 # Add argument parsing for sharding
 parser = argparse.ArgumentParser(description='Process documents with sentiment analysis in parallel')
 parser.add_argument('--shard-index', type=int, default=0, help='The shard index for this worker')
 parser.add_argument('--shard-total', type=int, default=1, help='Total number of shards')
-parser.add_argument('--max-docs', type=int, default=5000, help='Maximum number of documents to process per run')
+parser.add_argument('--max-docs', type=int, default=5000, help='Maximum number of documents to process per index per run')
 parser.add_argument('--batch-size', type=int, default=2000, help='Number of documents per batch')
-parser.add_argument('--threads', type=int, default=2, help='Number of threads for parallel processing')
-parser.add_argument('--index', type=str, required=True, help='Index to process')
+parser.add_argument('--threads', type=int, default=2, help='Intra-op threads per inference process')
+parser.add_argument('--workers', type=int, default=1, help='Inference processes sharing the fp32 model, --backend torch only (capped at the pod CPU limit)')
+parser.add_argument('--inference-batch-size', type=int, default=64, help='Maximum number of texts per model forward pass')
+parser.add_argument('--max-batch-tokens', type=int, default=8192, help='Token budget (texts x padded length) per model forward pass')
+parser.add_argument('--index', type=index_budget, nargs='+', required=True,
+                    help='Indices to process in order, each as name or name:max_docs')
+parser.add_argument('--cache-path', type=str, default=DEFAULT_CACHE_PATH, help='Persistent sentiment cache file')
+parser.add_argument('--cache-max-entries', type=int, default=DEFAULT_MAX_ENTRIES, help='Maximum entries kept in the persistent cache')
+parser.add_argument('--no-cache', action='store_true', help='Disable the persistent sentiment cache')
+parser.add_argument('--pipeline', action='store_true', help='Run fetch, inference and bulk writes as concurrent stages')
+parser.add_argument('--backend', type=str, choices=BACKENDS, default='torch', help='Inference backend')
+parser.add_argument('--parity-sample', type=int, default=200, help='Texts scored by both the backend and fp32 model before switching (0 to skip)')
+parser.add_argument('--parity-min-agreement', type=float, default=0.97, help='Minimum label agreement with fp32 to keep the backend')
+parser.add_argument('--queue-depth', type=int, default=2, help='Pages buffered between pipeline stages')
+parser.add_argument('--max-windows', type=int, default=1, help='Overlapping 512-token windows scored per long text (1 truncates)')
+parser.add_argument('--window-overlap', type=int, default=64, help='Tokens shared by consecutive windows of a long text')
+parser.add_argument('--model-path', type=str, default='/models/roberta-sentiment', help='Directory holding the tokenizer/ and model/ folders')
+parser.add_argument('--checkpoint-interval', type=float, default=60, help='Seconds between checkpoint writes')
+parser.add_argument('--checkpoint-batches', type=int, default=10, help='Batches between checkpoint writes')
+parser.add_argument('--cascade-threshold', type=cascade_threshold, default=0, help='Lexicon confidence above 0.5 at which a text is labeled without RoBERTa (0 disables the cascade)')
+parser.add_argument('--languages', nargs='+', metavar='CODE', help='ISO 639-1 languages to score (e.g. en); other-language and empty texts are marked skipped without inference')
+parser.add_argument('--bulk-size', type=int, default=500, help='Documents per bulk request to start from; adapted to the cluster while running')
+parser.add_argument('--bulk-max-size', type=int, default=5000, help='Largest bulk request the controller may grow to')
+parser.add_argument('--bulk-target-latency', type=float, default=1.0, help='Bulk latency in seconds above which requests are made smaller')
+parser.add_argument('--time-budget', type=float, default=0, help='Wall-clock seconds for the whole run, startup included (0 for no limit)')
+parser.add_argument('--model-version', type=str, help='Id stamped on each labeled document as sentiment_model_version (defaults to the model name); change it with the weights')
+parser.add_argument('--rescore', action='store_true', help='Re-score documents labeled by another model version, freshest first, instead of labeling new ones')
+parser.add_argument('--rescore-sort-fields', nargs='+', default=['created_at', 'created_utc'], help='Date fields that order a re-score, newest first')
+parser.add_argument('--reconcile', action='store_true', help='Run exact document counts at the end of each index')
 
 args = parser.parse_args()
+if args.workers > 1 and args.backend != "torch":
+    # Workers share the fp32 weights copy-on-write; a quantized copy or ONNX session would be built per worker
+    parser.error(f"--workers > 1 only supports --backend torch; {args.backend} would load one model per worker")
 
 # Configuration parameters
-MAX_DOCS_PER_RUN = args.max_docs  # Maximum number of documents to process per run
+INDEX_BUDGETS = [(name, max_docs or args.max_docs) for name, max_docs in args.index]  # Indices and their document budgets
+INDEX_NAME, MAX_DOCS_PER_RUN = INDEX_BUDGETS[0]  # Index being processed and its budget (see the run loop below)
 BATCH_SIZE = args.batch_size  # Number of documents per batch
-INDEX_NAME = args.index  # Index to process
 STATE_INDEX = "sentiment-processing-state"  # State index
-SHARD_INDEX = args.shard_index
-SHARD_TOTAL = args.shard_total
-NUM_THREADS = min(args.threads, 2) # limit 2 threads
+SHARD_INDEX = args.shard_index  # Slice of the index read by this worker
+SHARD_TOTAL = args.shard_total  # Number of slices the index is split into
+PIT_KEEP_ALIVE = "10m"  # Point in time keep-alive between pages
+PIPELINE = args.pipeline  # Overlap fetch, inference and writes
+QUEUE_DEPTH = args.queue_depth  # Pages buffered between pipeline stages
+CHECKPOINT_INTERVAL = args.checkpoint_interval  # Seconds between checkpoint writes
+CHECKPOINT_BATCHES = args.checkpoint_batches  # Batches between checkpoint writes
+CPU_LIMIT = available_cpus()  # Pod CPU limit (cgroup quota) or affinity mask
+NUM_WORKERS = max(1, min(args.workers, CPU_LIMIT))  # Inference processes
+NUM_THREADS = max(1, min(args.threads, CPU_LIMIT // NUM_WORKERS))  # Intra-op threads per inference process
+INFERENCE_BATCH_SIZE = args.inference_batch_size  # Maximum number of texts per model forward pass
+MAX_BATCH_TOKENS = args.max_batch_tokens  # Padded token budget per model forward pass
+MAX_SEQ_LENGTH = 512  # RoBERTa position limit
+LENGTH_BUCKETS = (16, 32, 48, 64, 96, 128, 192, 256, 384, 512)  # Upper token length of each batching bucket
+MAX_WINDOWS = max(1, args.max_windows)  # Windows scored per long text
+WINDOW_OVERLAP = min(max(0, args.window_overlap), MAX_SEQ_LENGTH // 2)  # Tokens shared by consecutive windows
+CASCADE_THRESHOLD = args.cascade_threshold  # Lexicon confidence that skips RoBERTa; 0 sends every text to the model
+TARGET_LANGUAGES = {code.lower() for code in args.languages or []}  # Languages sent to the model; empty scores every text
+RESCORE = args.rescore  # Replace labels written by other model versions rather than label new documents
+TIME_BUDGET = args.time_budget  # Seconds from process start until results and checkpoints must be written; 0 for no limit
+BUDGET_SAFETY = 0.8  # Share of the remaining budget that new pages are sized to fill
+
+# Totals over every forward pass of the run (also read by benchmark/run_benchmark.py)
+inference_stats = {"texts": 0, "windows": 0, "tokens": 0, "padded_tokens": 0, "batch_seconds": [], "lexicon_texts": 0,
+                   "filter_checked": 0, "skipped_language": 0, "skipped_empty": 0, "failed_texts": 0}
+
+# Seconds spent in each startup phase, in order; printed once the model is ready
+startup_timings = {"imports": time.perf_counter() - STARTUP_BEGAN}
+
+
+def record_startup_phase(name, began):
+    startup_timings[name] = time.perf_counter() - began
+    return time.perf_counter()
+
+
+# Set on SIGTERM or once the time budget is spent: the work in hand is finished and
+# written together with the checkpoint, and nothing new is started
+stop_requested = threading.Event()
+# Documents and seconds of inference so far, to size pages to the remaining budget
+throughput = {"docs": 0, "seconds": 0.0}
+
+
+def handle_sigterm(signum, frame):
+    print("Received SIGTERM: writing completed results and the checkpoint before exiting")
+    stop_requested.set()
+
+
+signal.signal(signal.SIGTERM, handle_sigterm)
+
+
+def seconds_left():
+    if TIME_BUDGET <= 0:
+        return float("inf")
+    return TIME_BUDGET - (time.perf_counter() - STARTUP_BEGAN)
+
+
+def should_stop():
+    if not stop_requested.is_set() and seconds_left() <= 0:
+        print(f"Time budget of {TIME_BUDGET:.0f}s spent: writing completed results and the checkpoint")
+        stop_requested.set()
+    return stop_requested.is_set()
+
+
+def docs_that_fit(wanted):
+    """How many of the wanted documents the remaining time budget is expected to cover"""
+    if TIME_BUDGET <= 0 or not throughput["seconds"]:
+        return wanted
+    rate = throughput["docs"] / throughput["seconds"]
+    return max(0, min(wanted, int(seconds_left() * BUDGET_SAFETY * rate)))
 
 print(f"Starting worker {SHARD_INDEX + 1} of {SHARD_TOTAL} total shards")
-print(f"This worker will process up to {MAX_DOCS_PER_RUN} documents")
-print(f"Using {NUM_THREADS} threads for parallel processing")
+print(f"Using {NUM_WORKERS} inference process(es) x {NUM_THREADS} threads (CPU limit {CPU_LIMIT})")
 print(f"Batch size: {BATCH_SIZE}")
-print(f"Processing index: {INDEX_NAME}")
+print(f"Inference batch size: up to {INFERENCE_BATCH_SIZE} texts / {MAX_BATCH_TOKENS} tokens")
+if MAX_WINDOWS > 1:
+    print(f"Long texts: up to {MAX_WINDOWS} windows of {MAX_SEQ_LENGTH} tokens overlapping by {WINDOW_OVERLAP}")
+if TIME_BUDGET > 0:
+    print(f"Time budget: {TIME_BUDGET:.0f}s")
+if CASCADE_THRESHOLD > 0:
+    print(f"Cascade: texts with lexicon confidence >= {CASCADE_THRESHOLD} are labeled without RoBERTa")
+if RESCORE:
+    print("Re-scoring documents labeled by other model versions, freshest first")
+if TARGET_LANGUAGES:
+    print(f"Language filter: scoring {', '.join(sorted(TARGET_LANGUAGES))} texts; others are marked skipped")
+print("Processing indices: " + ", ".join(f"{name} (up to {max_docs} documents)" for name, max_docs in INDEX_BUDGETS))
 
 # Elasticsearch connection configuration
+phase_began = time.perf_counter()
 es_hosts = [
     "https://elasticsearch-master.elastic.svc.cluster.local:9200",
     "https://elasticsearch-master-0.elasticsearch-master-headless.elastic.svc.cluster.local:9200",
@@ -66,27 +198,117 @@ if not es:
     print("Unable to connect to Elasticsearch")
     exit(1)
 
-# Load model
-print("Loading model...")
-MODEL_PATH = "/models/roberta-sentiment"
-try:
-    tokenizer = AutoTokenizer.from_pretrained(f"{MODEL_PATH}/tokenizer")
-    model = AutoModelForSequenceClassification.from_pretrained(f"{MODEL_PATH}/model")
-    print("Successfully loaded model from persistent storage")
-except Exception as e:
-    print(f"Failed to load model from persistent storage: {e}")
-    MODEL_NAME = "cardiffnlp/twitter-roberta-base-sentiment-latest"
-    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
-    model = AutoModelForSequenceClassification.from_pretrained(MODEL_NAME)
-    print("Successfully downloaded model from HuggingFace")
-
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-model.to(device)
-print(f"Using device: {device}")
-
-# Create locks for thread-safe operations
-model_lock = threading.Lock()
-cache_lock = threading.Lock()
+# Sizes and paces bulk writes to what the cluster currently accepts
+bulk_controller = BulkController(es, args.bulk_size, max_size=args.bulk_max_size,
+                                 target_latency=args.bulk_target_latency)
+
+record_startup_phase("elasticsearch", phase_began)
+
+MODEL_PATH = args.model_path
+MODEL_NAME = "cardiffnlp/twitter-roberta-base-sentiment-latest"
+MODEL_ID = args.model_version or MODEL_NAME  # Stamped on labeled documents; --rescore replaces labels with another id
+MODEL_VERSION = MODEL_ID  # Part of the cache key: change it whenever the weights change (see select_inference_backend)
+if MAX_WINDOWS > 1:
+    # Long texts score differently from their truncated form
+    MODEL_VERSION = f"{MODEL_VERSION}+windows{MAX_WINDOWS}/{WINDOW_OVERLAP}"
+print(f"Model version: {MODEL_ID}")
+
+# Loaded by load_model when the first index with pending documents is reached, so runs
+# with nothing to do never import torch or read the weights
+torch = None
+tokenizer = None
+model = None
+device = None
+inference_backend = None
+inference_backend_name = None
+inference_pool = None
+
+
+# Write the weights as safetensors next to a pytorch_model.bin so later runs memory-map them
+def convert_to_safetensors(loaded_model, model_dir):
+    staging_dir = os.path.join(model_dir, f".safetensors-{os.getpid()}")
+    try:
+        loaded_model.save_pretrained(staging_dir, safe_serialization=True)
+        # Atomic, so concurrent shards never see a partial file
+        os.replace(os.path.join(staging_dir, "model.safetensors"), os.path.join(model_dir, "model.safetensors"))
+        print(f"Converted the weights in {model_dir} to model.safetensors for faster startup")
+    except Exception as e:
+        print(f"Could not convert the weights to safetensors, continuing with pytorch_model.bin: {e}")
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+
+# Load the tokenizer, weights and inference backend from the model volume
+def load_model():
+    global torch, tokenizer, model, device, inference_backend, inference_backend_name, inference_pool
+    if model is not None:
+        return
+
+    # The model volume is the only source: never reach for the Hugging Face Hub
+    phase_began = time.perf_counter()
+    os.environ.setdefault("HF_HUB_OFFLINE", "1")
+    os.environ.setdefault("TRANSFORMERS_OFFLINE", "1")
+    import torch
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+    phase_began = record_startup_phase("torch/transformers import", phase_began)
+
+    print("Loading model...")
+    model_dir = f"{MODEL_PATH}/model"
+    safetensors_file = os.path.join(model_dir, "model.safetensors")
+    try:
+        for required_dir in (f"{MODEL_PATH}/tokenizer", model_dir):
+            if not os.path.isdir(required_dir):
+                raise FileNotFoundError(f"{required_dir} does not exist")
+        tokenizer = AutoTokenizer.from_pretrained(f"{MODEL_PATH}/tokenizer", local_files_only=True)
+        phase_began = record_startup_phase("tokenizer", phase_began)
+        # safetensors weights are memory-mapped rather than unpickled and copied
+        has_safetensors = os.path.exists(safetensors_file)
+        model = AutoModelForSequenceClassification.from_pretrained(model_dir, local_files_only=True,
+                                                                   use_safetensors=has_safetensors)
+        phase_began = record_startup_phase("weights", phase_began)
+    except Exception as e:
+        print(f"Failed to load the model from {MODEL_PATH}: {e}")
+        print("Populate the model volume with model-download-job.yaml; the analyzer does not download models")
+        exit(1)
+    print(f"Successfully loaded model from {MODEL_PATH} ({'safetensors' if has_safetensors else 'pytorch_model.bin'})")
+    if not has_safetensors:
+        convert_to_safetensors(model, model_dir)
+        phase_began = record_startup_phase("safetensors conversion", phase_began)
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    model.to(device)
+    model.eval()
+    print(f"Using device: {device}")
+
+    # Threads are spent inside each forward pass (intra-op) rather than on one document each
+    torch.set_num_threads(NUM_THREADS)
+
+    # fp32 PyTorch until select_inference_backend has checked the requested backend
+    inference_backend = load_backend("torch", model, device, MODEL_PATH, NUM_THREADS)
+    inference_backend_name = "torch"
+
+    # Worker processes must be forked before this process runs any forward pass
+    if NUM_WORKERS > 1 and device.type == "cpu":
+        inference_pool = InferencePool(model, tokenizer, device, NUM_WORKERS, NUM_THREADS)
+        print(f"Started {NUM_WORKERS} inference worker processes sharing the model weights")
+    phase_began = record_startup_phase("inference backend", phase_began)
+
+    # Settles MODEL_VERSION, so it must run before any cache digest is computed
+    select_inference_backend()
+    record_startup_phase("backend selection", phase_began)
+
+    print("Startup timing: " + ", ".join(f"{name} {seconds:.2f}s" for name, seconds in startup_timings.items())
+          + f" (total {sum(startup_timings.values()):.2f}s)")
+
+
+# Persistent cache of scores shared across runs and indices
+sentiment_cache = None
+if not args.no_cache:
+    try:
+        sentiment_cache = SentimentCache(args.cache_path, args.cache_max_entries)
+        print(f"Using persistent sentiment cache at {args.cache_path} ({sentiment_cache.entry_count} entries)")
+    except Exception as e:
+        print(f"Persistent sentiment cache unavailable, continuing without it: {e}")
 
 # Ensure state index exists
 def ensure_state_index():
@@ -103,16 +325,24 @@ def ensure_state_index():
                     "last_id": {"type": "keyword"},
                     "processed": {"type": "long"},
                     "total": {"type": "long"},
-                    "last_updated": {"type": "date"}
+                    "last_updated": {"type": "date"},
+                    "shard_total": {"type": "integer"},  # Slice checkpoint
+                    "pit_id": {"type": "keyword", "index": False},  # Slice checkpoint
+                    "search_after": {"type": "long"}  # Slice checkpoint
                 }
             }
         )
 
 
+# State document of this shard; a re-score keeps its own progress and slice checkpoint
+def state_document_id():
+    return f"{INDEX_NAME}-rescore-shard-{SHARD_INDEX}" if RESCORE else f"{INDEX_NAME}-shard-{SHARD_INDEX}"
+
+
 # Get processing state
 def get_processing_state():
     ensure_state_index()
-    shard_state_id = f"{INDEX_NAME}-shard-{SHARD_INDEX}"
+    shard_state_id = state_document_id()
     try:
         if es.exists(index=STATE_INDEX, id=shard_state_id):
             return es.get(index=STATE_INDEX, id=shard_state_id)["_source"]
@@ -120,9 +350,12 @@ def get_processing_state():
             initial_state = {
                 "index_name": INDEX_NAME,
                 "shard_index": SHARD_INDEX,
+                "shard_total": SHARD_TOTAL,
                 "last_id": "",
                 "processed": 0,
                 "total": 0,
+                "pit_id": None,
+                "search_after": None,
                 "last_updated": time.strftime("%Y-%m-%dT%H:%M:%S")
             }
             es.index(index=STATE_INDEX, id=shard_state_id, document=initial_state)
@@ -132,22 +365,21 @@ def get_processing_state():
         return {
             "index_name": INDEX_NAME,
             "shard_index": SHARD_INDEX,
+            "shard_total": SHARD_TOTAL,
             "last_id": "",
             "processed": 0,
             "total": 0,
+            "pit_id": None,
+            "search_after": None,
             "last_updated": time.strftime("%Y-%m-%dT%H:%M:%S")
         }
 
-# Update processing state for this shard
-def update_processing_state(last_id, processed, total):
-    shard_state_id = f"{INDEX_NAME}-shard-{SHARD_INDEX}"
+# Update processing state for this shard, including the slice checkpoint
+# (point in time id and search_after position) used to resume the slice
+# Progress figures come from the run's in-memory counters; see count_labeled_documents
+def update_processing_state(last_id, processed, total, labeled_count, pit_id=None, search_after=None):
+    shard_state_id = state_document_id()
     try:
-        # Get current count of documents with sentiment labels
-        labeled_count = es.count(
-            index=INDEX_NAME,
-            query={"exists": {"field": "roberta_sentiment_label"}}
-        )["count"]
-
         es.update(
             index=STATE_INDEX,
             id=shard_state_id,
@@ -156,6 +388,9 @@ def update_processing_state(last_id, processed, total):
                 "processed": processed,
                 "total": total,
                 "labeled_count": labeled_count,
+                "shard_total": SHARD_TOTAL,
+                "pit_id": pit_id,
+                "search_after": search_after,
                 "last_updated": time.strftime("%Y-%m-%dT%H:%M:%S")
             }
         )
@@ -166,29 +401,186 @@ def update_processing_state(last_id, processed, total):
         print(f"Failed to update state: {e}")
 
 
-# Thread-safe sentiment analysis function
-def get_sentiment_thread_safe(text):
-    if not text or not isinstance(text, str):
-        return {"negative": 0.0, "neutral": 0.0, "positive": 0.0}
+# Length-bucketed batch scheduler
+def schedule_token_batches(lengths):
+    """Group text positions into batches that fit the padded token budget.
+
+    Texts are sorted by tokenized length and batches never span two
+    LENGTH_BUCKETS, so each batch holds texts of similar length. A batch is
+    also closed once adding the next text would push texts x longest length
+    over MAX_BATCH_TOKENS (or over INFERENCE_BATCH_SIZE texts).
+    """
+    def bucket_of(length):
+        return next((b for b in LENGTH_BUCKETS if length <= b), LENGTH_BUCKETS[-1])
+
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    batches = []
+    current = []
+    for i in order:
+        # Lengths are ascending, so the new text sets the padded length of the batch
+        if current and (bucket_of(lengths[i]) != bucket_of(lengths[current[0]])
+                        or (len(current) + 1) * lengths[i] > MAX_BATCH_TOKENS
+                        or len(current) >= INFERENCE_BATCH_SIZE):
+            batches.append(current)
+            current = []
+        current.append(i)
+    if current:
+        batches.append(current)
+    return batches
+
+
+# Batched sentiment analysis function
+def predict_in_process(input_ids, attention_mask):
+    """Score one padded batch in this process; None if the forward pass fails"""
+    try:
+        inputs = tokenizer.pad({"input_ids": input_ids, "attention_mask": attention_mask},
+                               return_tensors=inference_backend.tensor_type)
+        return inference_backend.predict(inputs)
+    except Exception as e:
+        print(f"Sentiment analysis error: {e}")
+        return None
+
 
+def tokenize_windows(texts):
+    """Tokenize texts into model inputs of at most MAX_SEQ_LENGTH tokens.
+
+    With MAX_WINDOWS > 1 a long text becomes several overlapping windows; when
+    it has more than MAX_WINDOWS, windows spread evenly over the text are kept
+    so its end still counts. Returns input ids, attention masks and, for each
+    input, the position of the text it came from.
+    """
+    if MAX_WINDOWS == 1:
+        encoded = tokenizer(texts, truncation=True, max_length=MAX_SEQ_LENGTH)
+        return encoded["input_ids"], encoded["attention_mask"], list(range(len(texts)))
+
+    encoded = tokenizer(texts, truncation=True, max_length=MAX_SEQ_LENGTH, stride=WINDOW_OVERLAP,
+                        return_overflowing_tokens=True)
+    windows_of = {}
+    for k, owner in enumerate(encoded["overflow_to_sample_mapping"]):
+        windows_of.setdefault(owner, []).append(k)
+    kept = []
+    for windows in windows_of.values():
+        if len(windows) > MAX_WINDOWS:
+            step = (len(windows) - 1) / (MAX_WINDOWS - 1)
+            windows = [windows[round(j * step)] for j in range(MAX_WINDOWS)]
+        kept.extend(windows)
+    kept.sort()
+    return (
+        [encoded["input_ids"][k] for k in kept],
+        [encoded["attention_mask"][k] for k in kept],
+        [encoded["overflow_to_sample_mapping"][k] for k in kept]
+    )
+
+
+def get_sentiment_batch(texts):
+    """Score a list of texts, running one padded forward pass per scheduled batch.
+
+    Windows of long texts share batches with short texts; a text's score is
+    the average of its window scores weighted by window length. Returns one
+    score dict per input text, in input order, and the positions of texts in
+    failed batches, whose scores are None. When a stop is requested the
+    remaining batches are skipped and texts not fully scored also get None.
+    """
+    input_ids, attention_mask, owners = tokenize_windows(texts)
+    lengths = [len(ids) for ids in input_ids]
+    window_scores = [[] for _ in texts]
+    failed = set()
+
+    total_real_tokens = 0
+    total_padded_tokens = 0
+    batches = schedule_token_batches(lengths)
+    batch_inputs = [
+        ([input_ids[i] for i in batch], [attention_mask[i] for i in batch])
+        for batch in batches
+    ]
+    if inference_pool is not None:
+        outputs = inference_pool.predict_batches(batch_inputs)
+    else:
+        outputs = (predict_in_process(input_ids, attention_mask) for input_ids, attention_mask in batch_inputs)
+
+    interrupted = False
+    waited_since = time.perf_counter()
+    for batch_number, (batch, scores) in enumerate(zip(batches, outputs), start=1):
+        # Time spent waiting for this batch; with an inference pool, batches overlap
+        batch_seconds = time.perf_counter() - waited_since
+        padded_length = max(lengths[i] for i in batch)
+        real_tokens = sum(lengths[i] for i in batch)
+        padded_tokens = padded_length * len(batch)
+        if scores is None:
+            print(f"Sentiment analysis failed for a batch of {len(batch)} texts")
+            failed.update(owners[i] for i in batch)
+        else:
+            for i, row in zip(batch, scores):
+                window_scores[owners[i]].append((lengths[i], row))
+
+        # Padding report for tuning --max-batch-tokens
+        wasted = padded_tokens - real_tokens
+        print(f"Inference batch {batch_number}/{len(batches)}: {len(batch)} texts x {padded_length} tokens, "
+              f"{wasted} padding tokens wasted ({wasted / padded_tokens * 100:.1f}%)")
+        total_real_tokens += real_tokens
+        total_padded_tokens += padded_tokens
+        inference_stats["batch_seconds"].append(batch_seconds)
+        waited_since = time.perf_counter()
+
+        if batch_number < len(batches) and should_stop():
+            print(f"Stopping inference after {batch_number} of {len(batches)} batches")
+            interrupted = True
+            break
+
+    window_counts = [0] * len(texts)
+    for owner in owners:
+        window_counts[owner] += 1
+    results = []
+    for position, scored in enumerate(window_scores):
+        if interrupted and position not in failed and len(scored) < window_counts[position]:
+            results.append(None)
+            continue
+        if position in failed or not scored:
+            # No model output: all-zero scores would label as negative and be cached
+            failed.add(position)
+            results.append(None)
+            continue
+        if len(scored) == 1:
+            row = scored[0][1]
+        else:
+            weight = sum(length for length, _ in scored)
+            row = [sum(length * window[label] for length, window in scored) / weight for label in range(3)]
+        results.append({"negative": row[0], "neutral": row[1], "positive": row[2]})
+
+    inference_stats["texts"] += sum(result is not None for result in results)
+    inference_stats["failed_texts"] += len(failed)
+    inference_stats["windows"] += len(lengths)
+    inference_stats["tokens"] += total_real_tokens
+    inference_stats["padded_tokens"] += total_padded_tokens
+    if total_padded_tokens:
+        wasted = total_padded_tokens - total_real_tokens
+        windows = f" ({len(lengths)} windows)" if len(lengths) != len(texts) else ""
+        print(f"Inference summary: {len(texts)} texts{windows} in {len(batches)} batches, {total_real_tokens} tokens, "
+              f"{wasted} padding tokens wasted ({wasted / total_padded_tokens * 100:.1f}%)")
+    return results, failed
+
+
+# Auxiliary function: Exact number of labeled or skipped documents (a full count, only used to reconcile);
+# a re-score counts the documents labeled by the current model version
+def count_labeled_documents():
     try:
-        # Use lock to ensure thread safety during model inference
-        with model_lock:
-            inputs = tokenizer(text, return_tensors="pt", truncation=True, max_length=512)
-            inputs = {k: v.to(device) for k, v in inputs.items()}
+        if RESCORE:
+            query = {"term": {"sentiment_model_version": MODEL_ID}}
+        else:
+            query = {"bool": {"should": [{"exists": {"field": "roberta_sentiment_label"}},
+                                         {"exists": {"field": "sentiment_skipped"}}]}}
+        return es.count(index=INDEX_NAME, query=query)["count"]
+    except Exception as e:
+        print(f"Failed to count labeled documents: {e}")
+        return None
 
-            with torch.no_grad():
-                outputs = model(**inputs)
 
-            scores = torch.nn.functional.softmax(outputs.logits, dim=1)
-        return {
-            "negative": scores[0][0].item(),
-            "neutral": scores[0][1].item(),
-            "positive": scores[0][2].item()
-        }
+# Auxiliary function: Map sentiment_model_version as a keyword so re-score queries match ids exactly
+def ensure_model_version_mapping():
+    try:
+        es.indices.put_mapping(index=INDEX_NAME, properties={"sentiment_model_version": {"type": "keyword"}})
     except Exception as e:
-        print(f"Sentiment analysis failed: {e}")
-        return {"negative": 0.0, "neutral": 0.0, "positive": 0.0}
+        print(f"Warning: Failed to map sentiment_model_version as a keyword in {INDEX_NAME}: {e}")
 
 
 # Auxiliary function: Get the number of deleted documents
@@ -201,46 +593,526 @@ def get_deleted_count():
         return 0
 
 
-# Process a single document
-def process_single_document(hit, content_hash_cache):
-    doc_id = hit["_id"]
-    doc_source = hit["_source"]
-
-    # Check if content exists - look for real content field
-    content = None
-    if "content" in doc_source and isinstance(doc_source["content"], str):
-        content = doc_source["content"]
-    elif "body" in doc_source and isinstance(doc_source["body"], str):
-        content = doc_source["body"]
-    elif "selftext" in doc_source and isinstance(doc_source["selftext"], str):
-        content = doc_source["selftext"]
-    if not content:
-        return None
+# Fields that may hold a document's text, in the order they are tried: Reddit comment
+# bodies and post selftext, Mastodon and index content, then the Reddit post title
+TEXT_FIELDS = ["body", "selftext", "content", "title"]
 
-    # Check cache with thread safety
-    content_hash = hash(content)
-    sentiment_scores = None
 
-    with cache_lock:
-        if content_hash in content_hash_cache:
-            sentiment_scores = content_hash_cache[content_hash]
+# Extract the text to analyze from a document - the first non-blank text field
+def extract_content(doc_source):
+    for field in TEXT_FIELDS:
+        value = doc_source.get(field)
+        if isinstance(value, str) and value.strip():
+            return value
+    return None
 
-    # If not in cache, perform sentiment analysis
-    if sentiment_scores is None:
-        sentiment_scores = get_sentiment_thread_safe(content)
-        with cache_lock:
-            content_hash_cache[content_hash] = sentiment_scores
 
-    sentiment_label = max(sentiment_scores, key=sentiment_scores.get)
+# Switch to the requested inference backend once it agrees with the fp32 model
+def select_inference_backend():
+    global inference_backend, inference_backend_name, MODEL_VERSION
+    if args.backend == "torch":
+        return
 
-    # Return document data for bulk update
-    return {
-        "doc_id": doc_id,
+    try:
+        candidate = load_backend(args.backend, model, device, MODEL_PATH, NUM_THREADS)
+    except Exception as e:
+        print(f"Failed to load {args.backend} backend, staying on fp32 torch: {e}")
+        return
+
+    if args.parity_sample > 0:
+        try:
+            # Sample across every configured index, since they all share the backend
+            response = es.search(index=",".join(name for name, _ in INDEX_BUDGETS), size=args.parity_sample,
+                                 _source=TEXT_FIELDS, ignore_unavailable=True)
+            texts = [extract_content(hit["_source"]) for hit in response["hits"]["hits"]]
+            texts = [text for text in texts if text]
+            parity = parity_check(inference_backend, candidate, tokenizer, texts, MAX_SEQ_LENGTH)
+        except Exception as e:
+            print(f"Parity check for {args.backend} backend failed, staying on fp32 torch: {e}")
+            return
+
+        print(f"Parity check {args.backend} vs fp32 torch on {parity['samples']} texts: "
+              f"{parity['agreement'] * 100:.2f}% label agreement, max probability difference {parity['max_abs_diff']:.4f}")
+        if parity["agreement"] < args.parity_min_agreement:
+            print(f"Label agreement below {args.parity_min_agreement * 100:.2f}%, staying on fp32 torch")
+            return
+
+    inference_backend = candidate
+    inference_backend_name = args.backend
+    # Scores differ slightly between backends, so they must not share cache entries
+    MODEL_VERSION = f"{MODEL_VERSION}+{args.backend}"
+    print(f"Using inference backend: {args.backend}")
+
+
+# First cascade stage: take the lexicon's label for texts it is confident about
+def label_confident_texts(uncached):
+    """Return {digest: scores} for the texts labeled by the lexicon and remove them from uncached"""
+    labeled = {}
+    for digest, (scores, confidence) in zip(list(uncached), lexicon_score_texts(list(uncached.values()))):
+        if confidence >= CASCADE_THRESHOLD:
+            labeled[digest] = scores
+            del uncached[digest]
+    inference_stats["lexicon_texts"] += len(labeled)
+    return labeled
+
+
+# Process a page of search hits with batched inference
+def process_hits(hits, run_cache):
+    """Map hits to bulk update results; run_cache maps digest -> (scores, stage that produced them).
+
+    Returns the results and how many leading hits are fully handled, which is
+    fewer than len(hits) only when inference was interrupted by a stop.
+    """
+    # Keep only documents that have content to analyze; with a language filter the
+    # rest are marked skipped so they are not read again
+    pending = []
+    skipped = []
+    for hit in hits:
+        content = extract_content(hit["_source"])
+        if TARGET_LANGUAGES:
+            inference_stats["filter_checked"] += 1
+            reason, language = skip_reason(content, hit["_source"].get("language"), TARGET_LANGUAGES)
+            if reason:
+                inference_stats[f"skipped_{reason}"] += 1
+                skipped.append((hit, reason, language))
+                continue
+        if content:
+            pending.append((hit, content_digest(content, MODEL_VERSION), content))
+
+    # Distinct texts not scored yet in this run
+    uncached = {}
+    for _, digest, content in pending:
+        if digest not in run_cache and digest not in uncached:
+            uncached[digest] = content
+
+    # Then texts scored by earlier runs or other indices
+    if uncached and sentiment_cache is not None:
+        try:
+            found = sentiment_cache.get_many(uncached.keys())
+        except Exception as e:
+            print(f"Sentiment cache lookup failed: {e}")
+            found = {}
+        run_cache.update((digest, (scores, "roberta")) for digest, scores in found.items())
+        for digest in found:
+            del uncached[digest]
+
+    # Cheap lexicon labels are not cached across runs: the persistent cache holds model scores only
+    if uncached and CASCADE_THRESHOLD > 0:
+        labeled = label_confident_texts(uncached)
+        run_cache.update((digest, (scores, "lexicon")) for digest, scores in labeled.items())
+
+    # Score each remaining distinct text once; only real model outputs are kept and cached
+    failed_digests = set()
+    if uncached:
+        batch_scores, failed = get_sentiment_batch(list(uncached.values()))
+        failed_digests = {digest for position, digest in enumerate(uncached) if position in failed}
+        scores = {
+            digest: text_scores
+            for digest, text_scores in zip(uncached.keys(), batch_scores)
+            if text_scores is not None
+        }
+        run_cache.update((digest, (text_scores, "roberta")) for digest, text_scores in scores.items())
+        if sentiment_cache is not None:
+            try:
+                sentiment_cache.put_many(scores)
+            except Exception as e:
+                print(f"Sentiment cache update failed: {e}")
+
+    # Map scores back to document ids for bulk update; texts left unscored by a stop are written next run,
+    # texts whose batch failed stay unlabeled for the next run without holding up this one
+    results = [{
+        "doc_id": hit["_id"],
         "seq_no": hit.get("_seq_no"),
         "primary_term": hit.get("_primary_term"),
-        "sentiment_scores": sentiment_scores,
-        "sentiment_label": sentiment_label
+        "skipped": reason,
+        "language": language
+    } for hit, reason, language in skipped]
+    unscored = set()
+    for hit, digest, _ in pending:
+        if digest in failed_digests:
+            continue
+        if digest not in run_cache:
+            unscored.add(hit["_id"])
+            continue
+        sentiment_scores, stage = run_cache[digest]
+        results.append({
+            "doc_id": hit["_id"],
+            "seq_no": hit.get("_seq_no"),
+            "primary_term": hit.get("_primary_term"),
+            "sentiment_scores": sentiment_scores,
+            "sentiment_label": max(sentiment_scores, key=sentiment_scores.get),
+            "sentiment_stage": stage
+        })
+    done = next((i for i, hit in enumerate(hits) if hit["_id"] in unscored), len(hits))
+    return results, done
+
+
+# Open a point in time so every page of this slice reads the same index snapshot
+def open_point_in_time():
+    return es.open_point_in_time(index=INDEX_NAME, keep_alive=PIT_KEEP_ALIVE)["id"]
+
+
+def close_point_in_time(pit_id):
+    try:
+        es.close_point_in_time(id=pit_id)
+    except Exception as e:
+        print(f"Warning: Failed to close point in time: {e}")
+
+
+# Re-score order: newest posts first by whichever date field the index has, then index order
+FRESHEST_FIRST_SORT = [
+    {field: {"order": "desc", "missing": "_last", "unmapped_type": "date"}} for field in args.rescore_sort_fields
+] + [{"_shard_doc": "asc"}]
+
+
+# Fetch the next page of this worker's slice of the unprocessed documents
+def search_slice(query, pit_id, search_after, size):
+    search_params = {
+        "query": query,
+        "size": size,
+        "_source": TEXT_FIELDS + ["language"],  # Possible text fields and Mastodon's language
+        "seq_no_primary_term": True,  # Needed for optimistic concurrency control on update
+        "pit": {"id": pit_id, "keep_alive": PIT_KEEP_ALIVE},
+        "sort": FRESHEST_FIRST_SORT if RESCORE else [{"_shard_doc": "asc"}]
     }
+    # Slices are disjoint, so parallel workers never update the same documents
+    if SHARD_TOTAL > 1:
+        search_params["slice"] = {"id": SHARD_INDEX, "max": SHARD_TOTAL}
+    if search_after:
+        search_params["search_after"] = search_after
+    return es.search(**search_params)
+
+
+# Streaming reader over this worker's slice of the unprocessed documents
+def stream_unprocessed_pages(query, page_size, pit_id=None, search_after=None):
+    """Yield (pit_id, hits) pages, following search_after through a point in time.
+
+    When the point in time is lost (expired keep-alive, node restart) a new one is
+    opened and reading continues from the start of the slice: documents scored so
+    far no longer match the query, so nothing is re-read or skipped. The point in
+    time is closed once the slice is exhausted; if the consumer stops early it is
+    left open so the checkpoint can resume it.
+    """
+    max_retries = 3
+    retry_count = 0
+    while True:
+        if pit_id is None:
+            pit_id = open_point_in_time()
+            search_after = None
+
+        try:
+            response = search_slice(query, pit_id, search_after, page_size)
+        except Exception as e:
+            retry_count += 1
+            if retry_count >= max_retries:
+                raise
+            print(f"Shard {SHARD_INDEX}: Point in time search failed ({retry_count}/{max_retries}): {e}. Reopening...")
+            close_point_in_time(pit_id)
+            pit_id = None
+            time.sleep(2 ** retry_count)
+            continue
+
+        retry_count = 0
+        pit_id = response.get("pit_id", pit_id)
+        hits = response["hits"]["hits"]
+        if not hits:
+            close_point_in_time(pit_id)
+            return
+
+        search_after = hits[-1]["sort"]
+        yield pit_id, hits
+
+
+# Bulk writer: partial updates that leave refreshing to the index refresh interval
+def bulk_update_results(results):
+    # Tells the sentiment rollups (fission sentiment_rollup.py) which posts changed
+    updated_at = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+    bulk_actions = []
+    for result in results:
+        update_action = {"update": {"_index": INDEX_NAME, "_id": result["doc_id"]}}
+
+        # Add optimistic concurrency control if available
+        if result["seq_no"] is not None and result["primary_term"] is not None:
+            update_action["update"]["if_seq_no"] = result["seq_no"]
+            update_action["update"]["if_primary_term"] = result["primary_term"]
+
+        bulk_actions.append(update_action)
+        if "skipped" in result:
+            # Out of scope for the model: a marker instead of a label keeps it out of the next query
+            doc = {"sentiment_skipped": result["skipped"], "sentiment_updated_at": updated_at}
+            if result["language"]:
+                doc["sentiment_language"] = result["language"]
+            if RESCORE:
+                # The filter now rejects a text an older model labeled; drop that label
+                doc.update(roberta_sentiment=None, roberta_sentiment_label=None, sentiment_stage=None,
+                           sentiment_model_version=None)
+        else:
+            doc = {
+                "roberta_sentiment": result["sentiment_scores"],
+                "roberta_sentiment_label": result["sentiment_label"],
+                "sentiment_stage": result["sentiment_stage"],  # Which cascade stage produced the label
+                "sentiment_model_version": MODEL_ID,
+                "sentiment_updated_at": updated_at
+            }
+        bulk_actions.append({"doc": doc})
+
+    if not bulk_actions:
+        return 0
+
+    # (action, document) pairs still to write, sent in requests sized by the controller
+    pending = list(zip(bulk_actions[::2], bulk_actions[1::2]))
+    success_count = 0
+    conflict_count = 0
+    failed_count = 0
+    retries = 0
+    max_bulk_retries = 5
+    while pending:
+        chunk, pending = pending[:bulk_controller.size], pending[bulk_controller.size:]
+        bulk_controller.wait()
+        started = time.perf_counter()
+        try:
+            response = es.bulk(operations=[line for pair in chunk for line in pair])
+        except Exception as e:
+            bulk_controller.record_failure(e)
+            retries += 1
+            print(f"Bulk update failed (attempt {retries}/{max_bulk_retries}): {e}")
+            if retries >= max_bulk_retries:
+                failed_count += len(chunk) + len(pending)
+                break
+            pending = chunk + pending
+            continue
+
+        # Only items rejected by an overloaded cluster are worth sending again
+        rejected = []
+        for pair, item in zip(chunk, response['items']):
+            result = item.get('update', {})
+            status = result.get('status')
+            if status in (200, 201):
+                success_count += 1
+            elif status == 409:  # Conflict
+                conflict_count += 1
+            elif is_rejection(result):
+                rejected.append(pair)
+            else:
+                failed_count += 1
+        bulk_controller.record_response(time.perf_counter() - started, len(chunk), len(rejected))
+
+        if rejected:
+            retries += 1
+            if retries >= max_bulk_retries:
+                failed_count += len(rejected) + len(pending)
+                break
+            pending = rejected + pending
+        else:
+            retries = 0
+
+    if conflict_count > 0:
+        print(f"Encountered {conflict_count} conflicts during update")
+    if failed_count > 0:
+        print(f"{failed_count} updates failed and are left for a later run")
+    return success_count
+
+
+# Write the in-memory progress and slice position to the state index
+def flush_checkpoint(progress):
+    update_processing_state(
+        progress["last_id"],
+        progress["processed_count"] + progress["processed_this_run"],
+        progress["total_docs"],
+        progress["labeled_count"] + progress["processed_this_run"],
+        progress["pit_id"],
+        progress["search_after"]
+    )
+    progress["batches_since_checkpoint"] = 0
+    progress["last_checkpoint"] = time.time()
+
+
+# Record a written page: update counters, the slice checkpoint and the log
+def record_written_page(progress, pit_id, hits, results, success_count):
+    if results:
+        progress["last_id"] = results[-1]["doc_id"]
+
+    progress["processed_this_run"] += success_count
+    progress["pit_id"] = pit_id
+    if hits:
+        progress["search_after"] = hits[-1]["sort"]
+    progress["batches_since_checkpoint"] += 1
+    total_processed = progress["processed_count"] + progress["processed_this_run"]
+    total_docs = progress["total_docs"]
+
+    # Checkpoint every few batches or seconds; a restart may then redo the batches
+    # since the last checkpoint, whose conditional updates are rejected as conflicts
+    if (progress["batches_since_checkpoint"] >= CHECKPOINT_BATCHES
+            or time.time() - progress["last_checkpoint"] >= CHECKPOINT_INTERVAL):
+        flush_checkpoint(progress)
+
+    print(
+        f"Shard {SHARD_INDEX} batch stats: {len(hits)} documents completed, {len(results)} processed, {success_count} successful updates")
+    print(
+        f"Shard {SHARD_INDEX}: Current progress: {total_processed}/{total_docs} ({(total_processed / total_docs) * 100:.2f}%)")
+
+
+# Sequential mode: fetch, infer and write one page at a time
+def run_sequential(pages, run_cache, progress, docs_this_run):
+    while not should_stop():
+        try:
+            pit_id, hits = next(pages)
+        except StopIteration:
+            print(f"Shard {SHARD_INDEX}: No more documents to process in this slice")
+            progress["slice_exhausted"] = True
+            return
+
+        # Never take more documents than this run still has room for, or than fit in the time budget
+        wanted = min(len(hits), docs_this_run - progress["processed_this_run"])
+        fitting = docs_that_fit(wanted)
+        if fitting < wanted:
+            print(f"Shard {SHARD_INDEX}: The remaining time budget fits {fitting} more documents")
+        if not fitting:
+            return
+        hits = hits[:fitting]
+        print(f"Shard {SHARD_INDEX}: Processing a batch of {len(hits)} documents")
+
+        # Batched inference over the whole page
+        started = time.perf_counter()
+        results, done = process_hits(hits, run_cache)
+
+        # Perform batch updates; the checkpoint only covers the documents handled
+        success_count = bulk_update_results(results)
+        record_written_page(progress, pit_id, hits[:done], results, success_count)
+        throughput["docs"] += done
+        throughput["seconds"] += time.perf_counter() - started
+
+        if progress["processed_this_run"] >= docs_this_run:
+            print(f"Shard {SHARD_INDEX}: Reached document limit of {docs_this_run} for this run")
+            return
+        # A page cut to the budget ends the slice for this run; the checkpoint is at its end
+        if fitting < wanted:
+            return
+
+    print(f"Shard {SHARD_INDEX}: Stopping early; the next run resumes from the checkpoint")
+
+
+# Per-stage counters for pipeline mode
+class StageStats:
+    def __init__(self, name):
+        self.name = name
+        self.pages = 0
+        self.docs = 0
+        self.busy_seconds = 0.0
+        self.queue_depths = []  # Depth of the stage's input queue each time it takes a page
+
+    def record(self, docs, seconds):
+        self.pages += 1
+        self.docs += docs
+        self.busy_seconds += seconds
+
+    def summary(self):
+        rate = self.docs / self.busy_seconds if self.busy_seconds else 0.0
+        line = f"{self.name}: {self.pages} pages, {self.docs} docs, {self.busy_seconds:.1f}s busy, {rate:.1f} docs/sec"
+        if self.queue_depths:
+            average_depth = sum(self.queue_depths) / len(self.queue_depths)
+            line += f", input queue depth avg {average_depth:.1f} max {max(self.queue_depths)}/{QUEUE_DEPTH}"
+        return line
+
+
+# Pipeline mode: a prefetching reader thread, inference on the main thread and a
+# bulk writer thread, joined by bounded queues so inference never waits on Elasticsearch
+def run_pipeline(pages, run_cache, progress, docs_this_run):
+    fetch_queue = queue.Queue(maxsize=QUEUE_DEPTH)
+    write_queue = queue.Queue(maxsize=QUEUE_DEPTH)
+    stop = threading.Event()
+    end_of_stream = object()
+    stats = {name: StageStats(name) for name in ("fetch", "infer", "write")}
+    reader_errors = []
+
+    def reader():
+        fetched = 0
+        try:
+            while not stop.is_set() and not should_stop() and fetched < docs_this_run:
+                started = time.perf_counter()
+                try:
+                    pit_id, hits = next(pages)
+                except StopIteration:
+                    print(f"Shard {SHARD_INDEX}: No more documents to process in this slice")
+                    progress["slice_exhausted"] = True
+                    break
+                # Never fetch more documents than this run has room for
+                hits = hits[:docs_this_run - fetched]
+                fetched += len(hits)
+                stats["fetch"].record(len(hits), time.perf_counter() - started)
+                fetch_queue.put((pit_id, hits))
+        except Exception as e:
+            reader_errors.append(e)
+        finally:
+            fetch_queue.put(end_of_stream)
+
+    def writer():
+        while True:
+            stats["write"].queue_depths.append(write_queue.qsize())
+            item = write_queue.get()
+            if item is end_of_stream:
+                return
+            pit_id, hits, results = item
+            started = time.perf_counter()
+            success_count = bulk_update_results(results)
+            record_written_page(progress, pit_id, hits, results, success_count)
+            stats["write"].record(len(results), time.perf_counter() - started)
+
+    reader_thread = threading.Thread(target=reader, name="es-reader", daemon=True)
+    writer_thread = threading.Thread(target=writer, name="es-writer", daemon=True)
+    reader_thread.start()
+    writer_thread.start()
+    run_started = time.perf_counter()
+
+    try:
+        while True:
+            stats["infer"].queue_depths.append(fetch_queue.qsize())
+            item = fetch_queue.get()
+            if item is end_of_stream:
+                break
+            # Pages fetched but not yet inferred are dropped on a stop; they are re-read next run
+            if should_stop():
+                print(f"Shard {SHARD_INDEX}: Stopping early; the next run resumes from the checkpoint")
+                break
+            pit_id, hits = item
+            page_size = len(hits)
+            fitting = docs_that_fit(page_size)
+            if fitting < page_size:
+                print(f"Shard {SHARD_INDEX}: The remaining time budget fits {fitting} more documents")
+            if not fitting:
+                break
+            hits = hits[:fitting]
+            print(f"Shard {SHARD_INDEX}: Processing a batch of {len(hits)} documents")
+            started = time.perf_counter()
+            results, done = process_hits(hits, run_cache)
+            elapsed = time.perf_counter() - started
+            stats["infer"].record(len(hits), elapsed)
+            throughput["docs"] += done
+            throughput["seconds"] += elapsed
+            # The checkpoint only covers the documents handled
+            write_queue.put((pit_id, hits[:done], results))
+            # A page cut to the budget ends the slice for this run; later pages would leave a gap
+            if fitting < page_size or done < len(hits):
+                break
+    finally:
+        # Let the reader finish (it may be blocked on a full queue) and flush the writer
+        stop.set()
+        while reader_thread.is_alive() or not fetch_queue.empty():
+            try:
+                fetch_queue.get(timeout=0.1)
+            except queue.Empty:
+                pass
+        write_queue.put(end_of_stream)
+        writer_thread.join()
+
+    elapsed = time.perf_counter() - run_started
+    print(f"Shard {SHARD_INDEX}: Pipeline finished in {elapsed:.1f}s "
+          f"({progress['processed_this_run'] / elapsed if elapsed else 0.0:.1f} docs/sec written)")
+    for stage in stats.values():
+        print(f"Shard {SHARD_INDEX}: Pipeline stage {stage.summary()}")
+
+    if reader_errors:
+        raise reader_errors[0]
 
 
 # Main processing function
@@ -257,15 +1129,30 @@ def process_documents():
     # Count total documents
     total_docs = es.count(index=INDEX_NAME)["count"]
 
+    ensure_model_version_mapping()
+
     # Create a query to find unprocessed documents
     query = {
         "bool": {
             "must_not": [
                 {"exists": {"field": "roberta_sentiment"}},
-                {"exists": {"field": "roberta_sentiment_label"}}
-            ]
+                {"exists": {"field": "roberta_sentiment_label"}},
+                {"exists": {"field": "sentiment_skipped"}}
+            ],
+            # Documents without any text field are never read
+            "should": [{"exists": {"field": field}} for field in TEXT_FIELDS],
+            "minimum_should_match": 1
         }
     }
+    if RESCORE:
+        # Labeled by another model version, or before versions were stamped; unlabeled
+        # documents are left to the regular runs
+        query = {
+            "bool": {
+                "filter": [{"exists": {"field": "roberta_sentiment_label"}}],
+                "must_not": [{"term": {"sentiment_model_version": MODEL_ID}}]
+            }
+        }
 
     # Calculate documents to be processed by this shard
     to_process = es.count(index=INDEX_NAME, query=query)["count"]
@@ -280,215 +1167,110 @@ def process_documents():
         print(f"Shard {SHARD_INDEX}: All documents in this shard are analyzed!")
         return
 
+    # The first index with work pays for the model; later indices reuse it
+    load_model()
+
     # Limit the number of documents to process in this run
     docs_this_run = min(MAX_DOCS_PER_RUN, to_process)
     print(f"Shard {SHARD_INDEX}: This run will process up to {docs_this_run} documents")
 
-    # Content hash cache to avoid repeated processing of the same content
-    content_hash_cache = {}
+    # In-run cache in front of the persistent cache, keyed by content digest
+    run_cache = {}
+    if sentiment_cache is not None:
+        cache_hits, cache_misses = sentiment_cache.hits, sentiment_cache.misses
+    lexicon_texts, model_texts = inference_stats["lexicon_texts"], inference_stats["texts"]
+    filter_checked, failed_texts = inference_stats["filter_checked"], inference_stats["failed_texts"]
+    skipped_language, skipped_empty = inference_stats["skipped_language"], inference_stats["skipped_empty"]
+
+    # Resume this slice from its checkpoint when the previous run used the same slicing
+    pit_id = None
+    search_after = None
+    if state.get("shard_total") == SHARD_TOTAL and state.get("pit_id"):
+        pit_id = state["pit_id"]
+        search_after = state.get("search_after")
+        print(f"Shard {SHARD_INDEX}: Resuming slice from checkpoint after {search_after}")
 
     # Start processing
-    processed_this_run = 0
-    last_id = None
-    max_retries = 3
-    retry_count = 0
+    progress = {
+        "processed_count": processed_count,
+        "processed_this_run": 0,
+        "total_docs": total_docs,
+        "labeled_count": total_docs - to_process,
+        "last_id": None,
+        "pit_id": pit_id,
+        "search_after": search_after,
+        "batches_since_checkpoint": 0,
+        "last_checkpoint": time.time(),
+        "slice_exhausted": False
+    }
 
-    # Processing loop with retry mechanism
-    while processed_this_run < docs_this_run and retry_count < max_retries:
+    pages = stream_unprocessed_pages(query, min(BATCH_SIZE, docs_this_run), pit_id, search_after)
+    try:
+        if PIPELINE:
+            run_pipeline(pages, run_cache, progress, docs_this_run)
+        else:
+            run_sequential(pages, run_cache, progress, docs_this_run)
+    except Exception as e:
+        print(f"Shard {SHARD_INDEX}: Processing stopped after repeated search failures: {e}")
+    finally:
+        pages.close()
+
+    processed_this_run = progress["processed_this_run"]
+
+    # The reader released the point in time once the slice was done, so clear it from
+    # the checkpoint; otherwise keep it so a restarted worker picks up where this one stopped
+    if progress["slice_exhausted"]:
+        progress["pit_id"] = None
+        progress["search_after"] = None
+    if progress["slice_exhausted"] or progress["batches_since_checkpoint"]:
+        flush_checkpoint(progress)
+
+    # Make this run's updates visible to searches once, instead of refreshing per batch
+    if processed_this_run > 0:
         try:
-            # Initialize or reinitialize search
-            response = es.search(
-                index=INDEX_NAME,
-                query=query,
-                size=BATCH_SIZE,
-                _source=["content", "body", "selftext"],  # Add possible text fields
-                version=True,
-                scroll="10m"  # Increased to 10 minutes for larger batches
-            )
-
-            scroll_id = response["_scroll_id"]
-            hits = response["hits"]["hits"]
-
-            # Process batches
-            while hits and processed_this_run < docs_this_run:
-                print(f"Shard {SHARD_INDEX}: Processing a batch of {len(hits)} documents")
-
-                # Use ThreadPoolExecutor for parallel processing
-                results = []
-                with concurrent.futures.ThreadPoolExecutor(max_workers=NUM_THREADS) as executor:
-                    # Create a list of futures
-                    futures = [executor.submit(process_single_document, hit, content_hash_cache) for hit in hits]
-
-                    # Process results as they complete
-                    for future in tqdm(concurrent.futures.as_completed(futures), total=len(futures)):
-                        try:
-                            result = future.result()
-                            if result:
-                                results.append(result)
-                        except Exception as e:
-                            print(f"Error processing document: {e}")
-
-                # Prepare bulk update actions
-                bulk_actions = []
-                for result in results:
-                    update_action = {"update": {"_index": INDEX_NAME, "_id": result["doc_id"]}}
-
-                    # Add optimistic concurrency control if available
-                    if result["seq_no"] is not None and result["primary_term"] is not None:
-                        update_action["update"]["_if_seq_no"] = result["seq_no"]
-                        update_action["update"]["_if_primary_term"] = result["primary_term"]
-
-                    bulk_actions.append(update_action)
-                    bulk_actions.append({
-                        "doc": {
-                            "roberta_sentiment": result["sentiment_scores"],
-                            "roberta_sentiment_label": result["sentiment_label"]
-                        }
-                    })
-
-                # Perform batch updates
-                if bulk_actions:
-                    bulk_retry = 0
-                    max_bulk_retries = 3
-                    success_count = 0
-
-                    while bulk_retry < max_bulk_retries:
-                        try:
-                            response = es.bulk(operations=bulk_actions, refresh=True)
-
-                            # Count successful updates
-                            success_count = 0
-                            conflict_count = 0
-
-                            for i, item in enumerate(response['items']):
-                                if i % 2 == 0:  # Only count update operations
-                                    status = item.get('update', {}).get('status')
-                                    if status in (200, 201):
-                                        success_count += 1
-                                    elif status == 409:  # Conflict
-                                        conflict_count += 1
-
-                            if conflict_count > 0:
-                                print(f"Encountered {conflict_count} conflicts during update")
-
-                            break  # Exit retry loop on success
-
-                        except Exception as e:
-                            bulk_retry += 1
-                            print(f"Bulk update failed (attempt {bulk_retry}/{max_bulk_retries}): {e}")
-                            if bulk_retry < max_bulk_retries:
-                                print(f"Retrying in {2 ** bulk_retry} seconds...")
-                                time.sleep(2 ** bulk_retry)  # Exponential backoff
-                            else:
-                                print(f"Max bulk retries reached, continuing with next batch")
-                                break
-
-                # Update tracking information
-                if results:
-                    last_id = results[-1]["doc_id"]
-
-                processed_this_run += success_count
-                total_processed = processed_count + processed_this_run
-
-                # Update processing status
-                update_processing_state(last_id, total_processed, total_docs)
-
-                print(
-                    f"Shard {SHARD_INDEX} batch stats: {len(hits)} documents retrieved, {len(results)} processed, {success_count} successful updates")
-                print(
-                    f"Shard {SHARD_INDEX}: Current progress: {total_processed}/{total_docs} ({(total_processed / total_docs) * 100:.2f}%)")
-
-                if processed_this_run >= docs_this_run:
-                    print(f"Shard {SHARD_INDEX}: Reached document limit of {docs_this_run} for this run")
-                    break
-
-                # Get next batch
-                try:
-                    # Calculate remaining docs to process
-                    remaining = docs_this_run - processed_this_run
-                    batch_size = min(BATCH_SIZE, remaining)
-
-                    response = es.scroll(
-                        scroll_id=scroll_id,
-                        scroll="10m"  # Keep extended timeout
-                    )
-
-                    scroll_id = response["_scroll_id"]
-                    hits = response["hits"]["hits"]
-
-                    # If we got fewer hits than expected but haven't reached our limit,
-                    # we might have reached the end of available documents
-                    if not hits and processed_this_run < docs_this_run:
-                        print(f"Shard {SHARD_INDEX}: No more documents to process in this run")
-                        break
-                except Exception as scroll_error:
-                    # Handle search context lost errors
-                    if "No search context found" in str(scroll_error) or "search_phase_execution_exception" in str(
-                            scroll_error):
-                        print(f"Search context lost: {scroll_error}. Reinitializing search...")
-
-                        # Check if we still have documents to process
-                        remaining_count = es.count(index=INDEX_NAME, query=query)["count"]
-                        if remaining_count > 0 and processed_this_run < docs_this_run:
-                            print(f"Still have {remaining_count} documents to process. Reinitializing search...")
-
-                            # Reinitialize search
-                            response = es.search(
-                                index=INDEX_NAME,
-                                query=query,
-                                size=BATCH_SIZE,
-                                _source=["content", "body", "selftext"],
-                                version=True,
-                                scroll="10m"
-                            )
-
-                            scroll_id = response["_scroll_id"]
-                            hits = response["hits"]["hits"]
-
-                            if not hits:
-                                print("No documents returned after reinitialization. Breaking loop.")
-                                break
-                        else:
-                            print("No more documents to process after context loss. Breaking loop.")
-                            break
-                    else:
-                        # For other errors, raise to outer exception handler
-                        raise scroll_error
-
-                # Small pause between batches to reduce system load
-                time.sleep(1)
-
-            # Clean up scroll context
-            try:
-                es.clear_scroll(scroll_id=scroll_id)
-            except Exception as e:
-                print(f"Warning: Failed to clear scroll context: {e}")
-            # If we've reached this point without errors, break the retry loop
-            break
-
+            es.indices.refresh(index=INDEX_NAME)
         except Exception as e:
-            retry_count += 1
-            print(f"Shard {SHARD_INDEX}: Processing attempt {retry_count}/{max_retries} failed: {e}")
-
-            if retry_count < max_retries:
-                wait_time = 5 * (2 ** (retry_count - 1))  # Exponential backoff
-                print(f"Retrying in {wait_time} seconds...")
-                time.sleep(wait_time)
-            else:
-                print(f"Max retries ({max_retries}) reached. Giving up this run.")
-                break
+            print(f"Warning: Failed to refresh index {INDEX_NAME}: {e}")
 
     # Final cleanup and status
-    content_hash_cache.clear()
+    run_cache.clear()
+    if sentiment_cache is not None:
+        print(f"Sentiment cache: {sentiment_cache.hits - cache_hits} hits, "
+              f"{sentiment_cache.misses - cache_misses} misses for {INDEX_NAME}")
+    if CASCADE_THRESHOLD > 0:
+        print(f"Cascade: {inference_stats['lexicon_texts'] - lexicon_texts} texts labeled by the lexicon, "
+              f"{inference_stats['texts'] - model_texts} by RoBERTa for {INDEX_NAME}")
+    if TARGET_LANGUAGES:
+        language_skips = inference_stats["skipped_language"] - skipped_language
+        empty_skips = inference_stats["skipped_empty"] - skipped_empty
+        checked = inference_stats["filter_checked"] - filter_checked
+        skip_rate = (language_skips + empty_skips) / checked * 100 if checked else 0.0
+        print(f"Language filter: skipped {language_skips} other-language and {empty_skips} empty of {checked} "
+              f"documents ({skip_rate:.2f}%) for {INDEX_NAME}")
+    if inference_stats["failed_texts"] > failed_texts:
+        print(f"Inference failed for {inference_stats['failed_texts'] - failed_texts} texts of {INDEX_NAME}; "
+              f"they stay unlabeled for the next run")
+    print(f"Bulk writes so far: {bulk_controller.summary()}")
 
     # Final status update
     print(f"Shard {SHARD_INDEX}: This run processed {processed_this_run} documents")
     print(
         f"Shard {SHARD_INDEX}: Total processed in this shard: {processed_count + processed_this_run} documents out of {total_docs} total")
-    print(f"Current deleted documents: {get_deleted_count()}")
 
-    # Check if there are still documents to process
-    remaining_count = es.count(index=INDEX_NAME, query=query)["count"]
+    # Exact counts scan the whole index, so they only run when asked for
+    if args.reconcile:
+        print(f"Current deleted documents: {get_deleted_count()}")
+        labeled_count = count_labeled_documents()
+        if labeled_count is not None:
+            print(f"Shard {SHARD_INDEX}: Reconciled labeled count {labeled_count} "
+                  f"(tracked {progress['labeled_count'] + processed_this_run})")
+            progress["labeled_count"] = labeled_count - processed_this_run
+            flush_checkpoint(progress)
+        remaining_count = es.count(index=INDEX_NAME, query=query)["count"]
+    else:
+        # Other shards write to the same index, so this is an upper bound
+        remaining_count = max(0, to_process - processed_this_run)
+
     if remaining_count > 0:
         print(f"Shard {SHARD_INDEX}: Still has {remaining_count} documents left to process.")
         print(f"Shard {SHARD_INDEX}: Job should be restarted to continue processing.")
@@ -496,7 +1278,30 @@ def process_documents():
         print(f"Shard {SHARD_INDEX}: All documents in this shard have been processed!")
 
 
-# Execute processing
-print(f"Starting to process index: {INDEX_NAME} with shard {SHARD_INDEX} of {SHARD_TOTAL}")
-process_documents()
-print(f"Processing of index {INDEX_NAME} shard {SHARD_INDEX} completed")
\ No newline at end of file
+# Execute processing: the model, inference backend and caches are shared by every index
+failed_indices = []
+for INDEX_NAME, MAX_DOCS_PER_RUN in INDEX_BUDGETS:
+    if should_stop():
+        print(f"Skipping index {INDEX_NAME}: the run is stopping")
+        continue
+    print(f"Starting to process index: {INDEX_NAME} with shard {SHARD_INDEX} of {SHARD_TOTAL}, "
+          f"up to {MAX_DOCS_PER_RUN} documents")
+    try:
+        process_documents()
+        print(f"Processing of index {INDEX_NAME} shard {SHARD_INDEX} completed")
+    except Exception as e:
+        # Keep going so one unavailable index does not starve the others
+        print(f"Processing of index {INDEX_NAME} shard {SHARD_INDEX} failed: {e}")
+        failed_indices.append(INDEX_NAME)
+
+if inference_pool is not None:
+    # After a stop, batches still queued in the workers are of no use
+    if stop_requested.is_set():
+        inference_pool.terminate()
+    else:
+        inference_pool.close()
+if model is None:
+    print("No index had pending documents; the model was not loaded")
+if failed_indices:
+    print(f"Failed indices: {', '.join(failed_indices)}")
+    exit(1)
\ No newline at end of file
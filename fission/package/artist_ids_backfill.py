@@ -0,0 +1,22 @@
+"""Called by hand (fission fn test --name artist-ids-backfill) to tag the posts stored before
+ingest-time tagging with their canonical artist_ids. Each call works for up to the time budget;
+call it again until it reports done. Query parameters: index (default artists), and
+restart=true to walk the index again, e.g. after aliases were added to artists.json."""
+
+from flask import request
+from functions.artist_tagger import build_alias_index, load_artist_groups
+from functions.artist_ids_backfill import backfill_artist_ids
+
+def main():
+    """
+    Main entry point for the artist_ids backfill
+    """
+
+    index_name = request.args.get("index", "artists")
+    restart = request.args.get("restart", "false").lower() == "true"
+
+    alias_index = build_alias_index(load_artist_groups())
+    state = backfill_artist_ids(index_name, alias_index, restart=restart)
+
+    status = "done" if state["done"] else "paused, call again to continue"
+    return f"Backfill of {index_name} {status}: {state['updated']} of {state['scanned']} posts updated"
@@ -0,0 +1,114 @@
+"""Sets artist_ids on the posts already stored before writers started tagging them.
+
+Each call walks the index with a point in time and search_after for up to the time
+budget, and saves its position in the state index, so repeated calls resume where
+the last one stopped until the whole index is done. Only posts whose artist_ids
+change are written; those also get a new sentiment_updated_at so the sentiment
+rollups recompute their hours. A point in time that expired between calls restarts
+the walk from the beginning, which is cheap because unchanged posts are not written.
+"""
+
+import os
+import time
+from datetime import datetime, timezone
+from elasticsearch import NotFoundError, helpers
+from functions.es_client import get_es_client
+from functions.artist_tagger import ARTIST_IDS_FIELD, artist_ids, ensure_artist_ids_mapping
+
+# Connect
+es = get_es_client()
+
+STATE_INDEX = "artist-ids-backfill-state"
+PAGE_SIZE = 500
+PIT_KEEP_ALIVE = "30m"  # Must outlast the gap between two calls
+# Fission stops the function at its functionTimeout (60s); the rest waits for the next call
+TIME_BUDGET_SECONDS = float(os.environ.get("BACKFILL_TIME_BUDGET_SECONDS", "50"))
+
+
+def load_state(index_name):
+    try:
+        return es.get(index=STATE_INDEX, id=index_name)["_source"]
+    except NotFoundError:
+        return {"pit_id": None, "search_after": None, "scanned": 0, "updated": 0, "done": False}
+
+
+def save_state(index_name, state):
+    es.index(index=STATE_INDEX, id=index_name, document={
+        **state,
+        "last_updated": datetime.now(timezone.utc).isoformat()
+    })
+
+
+def open_pit(index_name):
+    return es.open_point_in_time(index=index_name, keep_alive=PIT_KEEP_ALIVE)["id"]
+
+
+def search_page(state):
+    params = {
+        "size": PAGE_SIZE,
+        "pit": {"id": state["pit_id"], "keep_alive": PIT_KEEP_ALIVE},
+        "sort": [{"_shard_doc": "asc"}],
+        "source": ["content", "title", "tags", ARTIST_IDS_FIELD]
+    }
+    if state["search_after"]:
+        params["search_after"] = state["search_after"]
+    return es.search(**params)
+
+
+def backfill_artist_ids(index_name, alias_index, restart=False, time_budget=TIME_BUDGET_SECONDS):
+    """Tag the next part of index_name within the time budget; returns the saved state"""
+    started = time.monotonic()
+    if not es.indices.exists(index=STATE_INDEX):
+        # The point in time id is long and only ever read back from _source
+        es.indices.create(index=STATE_INDEX, mappings={"dynamic": False})
+    ensure_artist_ids_mapping(es, index_name)
+
+    state = load_state(index_name)
+    if restart:
+        state = {"pit_id": None, "search_after": None, "scanned": 0, "updated": 0, "done": False}
+    if state["done"]:
+        print(f"Backfill of {index_name} already done: {state['updated']} of {state['scanned']} posts updated")
+        return state
+    if not state["pit_id"]:
+        state["pit_id"] = open_pit(index_name)
+
+    while time.monotonic() - started < time_budget:
+        try:
+            response = search_page(state)
+        except NotFoundError:
+            print(f"Point in time over {index_name} expired; restarting the walk")
+            state.update(pit_id=open_pit(index_name), search_after=None, scanned=0)
+            continue
+
+        state["pit_id"] = response.get("pit_id", state["pit_id"])
+        hits = response["hits"]["hits"]
+        if not hits:
+            es.close_point_in_time(id=state["pit_id"])
+            state.update(pit_id=None, search_after=None, done=True)
+            break
+
+        now = datetime.now(timezone.utc).isoformat()
+        actions = []
+        for hit in hits:
+            ids = artist_ids(hit["_source"], alias_index)
+            if ids != hit["_source"].get(ARTIST_IDS_FIELD):
+                actions.append({
+                    "_op_type": "update",
+                    "_index": hit["_index"],
+                    "_id": hit["_id"],
+                    "doc": {ARTIST_IDS_FIELD: ids, "sentiment_updated_at": now}
+                })
+
+        if actions:
+            success, errors = helpers.bulk(es, actions, raise_on_error=False)
+            state["updated"] += success
+            for error in errors[:5]:
+                print(f"Error tagging post: {error}")
+        state["scanned"] += len(hits)
+        state["search_after"] = hits[-1]["sort"]
+        save_state(index_name, state)
+
+    save_state(index_name, state)
+    status = "done" if state["done"] else "paused, call again to continue"
+    print(f"Backfill of {index_name} {status}: {state['updated']} of {state['scanned']} posts updated")
+    return state
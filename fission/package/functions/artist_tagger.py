@@ -0,0 +1,91 @@
+"""Tags posts with the canonical ids of the artists they mention.
+
+The ids are the canonical names in artists.json (the same file as the analyser API's
+app/data/artists.json). A post mentions an artist when one of its aliases occurs as a
+phrase in the content or the title (Reddit posts keep much of their text there), or
+equals one of the post's hashtags. Phrases are matched on
+lowercased word tokens, like match_phrase on the content field, so "Taylor Swift!" and
+"taylor  swift" both match while "swiftly" does not.
+
+Writers store the result in the artist_ids keyword field, which lets the analyser API
+count mentions, trends and sentiment with plain terms aggregations instead of
+rebuilding match_phrase filters from the aliases on every request.
+"""
+
+import json
+import os
+import re
+
+ARTIST_IDS_FIELD = "artist_ids"
+ARTIST_IDS_MAPPING = {"properties": {ARTIST_IDS_FIELD: {"type": "keyword"}}}
+DEFAULT_CONFIG_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "artists.json")
+
+TEXT_FIELDS = ("content", "title")  # Searched separately, so a phrase never spans two fields
+HTML_TAG_PATTERN = re.compile(r"<[^>]+>")
+TOKEN_PATTERN = re.compile(r"\w+")
+
+_mapped_indexes = set()
+
+
+def tokenize(text):
+    """Lowercased word tokens of text, markup removed"""
+    return TOKEN_PATTERN.findall(HTML_TAG_PATTERN.sub(" ", text or "").lower())
+
+
+def load_artist_groups(config_path=DEFAULT_CONFIG_PATH):
+    """{canonical name: aliases} of the international and Australian artists"""
+    with open(config_path, "r", encoding="utf-8") as f:
+        config = json.load(f)
+    artist_groups = {}
+    for group in ("artists", "artists_au"):
+        artist_groups.update(config.get(group, {}))
+    return artist_groups
+
+
+def build_alias_index(artist_groups):
+    """Lookup tables for artist_ids: aliases by first token, and hashtags"""
+    phrases = {}
+    hashtags = {}
+    for artist, aliases in artist_groups.items():
+        for alias in [artist, *aliases]:
+            tokens = tokenize(alias)
+            if tokens:
+                phrases.setdefault(tokens[0], set()).add((tuple(tokens), artist))
+            hashtags[alias.lower()] = artist
+    return {"phrases": phrases, "hashtags": hashtags}
+
+
+def artist_ids(post, alias_index):
+    """Sorted canonical ids of the artists a post mentions"""
+    ids = set()
+    for field in TEXT_FIELDS:
+        text = post.get(field)
+        tokens = tokenize(text if isinstance(text, str) else None)
+        for position, token in enumerate(tokens):
+            for alias_tokens, artist in alias_index["phrases"].get(token, ()):
+                if tuple(tokens[position:position + len(alias_tokens)]) == alias_tokens:
+                    ids.add(artist)
+
+    for tag in post.get("tags") or []:
+        # Mastodon tags are {"name", "url"} objects; other sources store plain strings
+        name = tag.get("name") if isinstance(tag, dict) else tag
+        if isinstance(name, str) and name.lower() in alias_index["hashtags"]:
+            ids.add(alias_index["hashtags"][name.lower()])
+    return sorted(ids)
+
+
+def tag_post(post, alias_index):
+    """Set the artist_ids field of a post (a dict) and return it"""
+    post[ARTIST_IDS_FIELD] = artist_ids(post, alias_index)
+    return post
+
+
+def ensure_artist_ids_mapping(es, index_name):
+    """Map artist_ids as a keyword (creating the index if needed), once per process"""
+    if index_name in _mapped_indexes:
+        return
+    if es.indices.exists(index=index_name):
+        es.indices.put_mapping(index=index_name, body=ARTIST_IDS_MAPPING)
+    else:
+        es.indices.create(index=index_name, mappings=ARTIST_IDS_MAPPING)
+    _mapped_indexes.add(index_name)
@@ -1,5 +1,7 @@
+from datetime import datetime, timezone
 from elasticsearch import helpers
 from functions.es_client import get_es_client
+from functions.artist_tagger import build_alias_index, load_artist_groups, tag_post, ensure_artist_ids_mapping
 
 # Connect
 es = get_es_client()
@@ -19,10 +21,17 @@ def make_keyword_query(keywords, check_field):
     }
 
 def process_keywords(keyworddict):
+    alias_index = None
     for entry in keyworddict:
         check_field = "extracted_to_" + entry['to-index']
         query = make_keyword_query(entry['keywords'], check_field)
 
+        # Entries with "tag-artists" get the canonical artist_ids of each copied post
+        if entry.get('tag-artists'):
+            if alias_index is None:
+                alias_index = build_alias_index(load_artist_groups())
+            ensure_artist_ids_mapping(es, entry['to-index'])
+
         docs = helpers.scan(es, index=entry['from-index'], query=query, size=QUERY_SIZE)
         actions = []
         count = 0
@@ -32,7 +41,13 @@ def process_keywords(keyworddict):
                 break
 
             doc_id = doc["_id"]
-            source = doc["_source"]
+            source = dict(doc["_source"])
+            # The stamp tells the sentiment rollups (sentiment_rollup.py) which hours changed; posts
+            # without a label yet are stamped by the sentiment writer when it labels them
+            if "roberta_sentiment_label" in source:
+                source["sentiment_updated_at"] = datetime.now(timezone.utc).isoformat()
+            if entry.get('tag-artists'):
+                tag_post(source, alias_index)
 
             # Add to index-to-new-index action
             actions.append({
@@ -3,7 +3,8 @@ This stores functions related to pre-processing of queued
 harvested data and storing in Elastic
 """
 
-from functions.es_client import initialise_es_index, insert_es_data
+from functions.es_client import es, initialise_es_index, insert_es_data
+from functions.artist_tagger import build_alias_index, load_artist_groups, tag_post, ensure_artist_ids_mapping
 from functions.redis_client import redis_client
 from functions.logger_config import get_logger
 import redis
@@ -11,6 +12,8 @@ import json
 
 logger = get_logger(__name__)
 
+alias_index = build_alias_index(load_artist_groups())
+
 def get_items_from_redis(queue_name, n=100):
     """
     Get items from Redis queue for a given hashtag or public timeline
@@ -38,6 +41,21 @@ def get_items_from_redis(queue_name, n=100):
         logger.error(f"Unexpected error in get_items_from_redis: {str(e)}")
         raise
 
+def tag_artists(items):
+    """
+    Decode queued posts and set their canonical artist_ids
+    """
+    tagged = []
+    for item in items:
+        try:
+            post = json.loads(item) if isinstance(item, (str, bytes, bytearray)) else item
+            if isinstance(post, dict):
+                item = tag_post(post, alias_index)
+        except (json.JSONDecodeError, UnicodeDecodeError):
+            pass  # Passed on unchanged; insert_es_data logs and skips it
+        tagged.append(item)
+    return tagged
+
 def send_items_to_elastic(items, config_path, index):
     """
     Send posts to Elasticsearch
@@ -64,6 +82,8 @@ def send_items_to_elastic(items, config_path, index):
                 continue
 
         initialise_es_index(index, config_path)
+        ensure_artist_ids_mapping(es, index)
+        items = tag_artists(items)
         
         logger.info(f"Inserting {len(items)} items to Elasticsearch index: {index}")
         insert_es_data(index, items)
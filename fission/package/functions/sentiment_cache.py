@@ -0,0 +1,124 @@
+"""Persistent cache of RoBERTa sentiment scores, shared with the batch sentiment
+analyzers in backend/sentiment-score-model (keep the two copies in sync).
+
+Scores are stored in a SQLite database on the model volume, keyed by a SHA-256
+digest of the whitespace-normalized text and the model version. Reposts, boosts
+and copy-pasted comments are therefore scored once across runs and across
+indices, and a model change never serves stale scores. The cache is bounded to
+a maximum number of entries; the least recently used entries are evicted first.
+"""
+
+import hashlib
+import os
+import re
+import sqlite3
+import time
+from functions.logger_config import get_logger
+
+logger = get_logger(__name__)
+
+DEFAULT_CACHE_PATH = "/models/roberta-sentiment/cache/sentiment_cache.db"
+DEFAULT_MAX_ENTRIES = 2000000
+
+# Keep each statement under SQLite's bound-variable limit
+QUERY_CHUNK_SIZE = 500
+
+
+def normalize_text(text):
+    """Collapse whitespace so trivially different copies share one entry"""
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def content_digest(text, model_version):
+    """Stable cache key for a text scored by a given model version"""
+    return hashlib.sha256(f"{model_version}\n{normalize_text(text)}".encode("utf-8")).hexdigest()
+
+
+class SentimentCache:
+    """Size-bounded, persistent digest -> sentiment scores store"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_entries=DEFAULT_MAX_ENTRIES):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+
+        # Parallel workers on the same node share the file; wait for their locks
+        self.conn = sqlite3.connect(path, timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS scores ("
+            "digest TEXT PRIMARY KEY, negative REAL, neutral REAL, positive REAL, last_used INTEGER)"
+        )
+        self.conn.execute("CREATE INDEX IF NOT EXISTS scores_last_used ON scores (last_used)")
+        self.conn.commit()
+
+        # Tracked incrementally so bounding the size does not need a full count per write
+        self.entry_count = self.conn.execute("SELECT COUNT(*) FROM scores").fetchone()[0]
+
+    def get_many(self, digests):
+        """Return {digest: scores} for the digests found in the cache"""
+        found = {}
+        digests = list(digests)
+        now = int(time.time())
+        for start in range(0, len(digests), QUERY_CHUNK_SIZE):
+            chunk = digests[start:start + QUERY_CHUNK_SIZE]
+            placeholders = ",".join("?" * len(chunk))
+            rows = self.conn.execute(
+                f"SELECT digest, negative, neutral, positive FROM scores WHERE digest IN ({placeholders})",
+                chunk
+            ).fetchall()
+            for digest, negative, neutral, positive in rows:
+                found[digest] = {"negative": negative, "neutral": neutral, "positive": positive}
+
+            # Mark hits as recently used so eviction keeps them
+            if rows:
+                self.conn.execute(
+                    f"UPDATE scores SET last_used = ? WHERE digest IN ({','.join('?' * len(rows))})",
+                    [now] + [row[0] for row in rows]
+                )
+        self.conn.commit()
+
+        self.hits += len(found)
+        self.misses += len(digests) - len(found)
+        return found
+
+    def put_many(self, entries):
+        """Store {digest: scores} and evict old entries if the cache is over its bound"""
+        if not entries:
+            return
+        now = int(time.time())
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO scores (digest, negative, neutral, positive, last_used) VALUES (?, ?, ?, ?, ?)",
+            [
+                (digest, scores["negative"], scores["neutral"], scores["positive"], now)
+                for digest, scores in entries.items()
+            ]
+        )
+        self.conn.commit()
+        self.entry_count += len(entries)
+        if self.entry_count > self.max_entries:
+            self.evict()
+
+    def evict(self):
+        """Drop least recently used entries down to 90% of max_entries"""
+        # Other workers may have written too, so recount before deleting
+        self.entry_count = self.conn.execute("SELECT COUNT(*) FROM scores").fetchone()[0]
+        if self.entry_count <= self.max_entries:
+            return
+        to_delete = self.entry_count - int(self.max_entries * 0.9)
+        self.conn.execute(
+            "DELETE FROM scores WHERE digest IN (SELECT digest FROM scores ORDER BY last_used LIMIT ?)",
+            (to_delete,)
+        )
+        self.conn.commit()
+        self.entry_count -= to_delete
+        logger.info(f"Sentiment cache: evicted {to_delete} least recently used entries")
+
+    def close(self):
+        self.conn.close()
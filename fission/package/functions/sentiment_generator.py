@@ -1,8 +1,11 @@
+import os
+import time
+from datetime import datetime, timezone
 import requests
-import torch
 from elasticsearch import Elasticsearch
+from elasticsearch.helpers import bulk
 from tqdm import tqdm
-from transformers import AutoTokenizer, AutoModelForSequenceClassification
+from functions.sentiment_cache import SentimentCache, content_digest
 
 # Connect to Elasticsearch
 es = Elasticsearch(
@@ -27,21 +30,87 @@ def safe_index_exists(index_name):
         print(f"Error checking if index {index_name} exists: {e}")
         return False
 
-# Load CardiffNLP RoBERTa model
-print("Loading sentiment analysis model...")
 MODEL_NAME = "cardiffnlp/twitter-roberta-base-sentiment-latest"
-tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
-model = AutoModelForSequenceClassification.from_pretrained(MODEL_NAME)
-print("Model loaded successfully")
+MODEL_VERSION = MODEL_NAME  # Cache key part for the in-process model: change it whenever the weights change
 
-# Move model to GPU if available
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-model.to(device)
+# Score through the shared inference service (backend/sentiment-score-model/inference_service.py),
+# which keeps one warm model and batches requests from every caller. Set SENTIMENT_SERVICE_URL
+# to an empty string to load the model in this process instead.
+SENTIMENT_SERVICE_URL = os.environ.get("SENTIMENT_SERVICE_URL", "http://sentiment-inference.elastic.svc.cluster.local:8080")
+SERVICE_BATCH_SIZE = 256  # Texts per service request
 
-# Function to get sentiment score
+if not SENTIMENT_SERVICE_URL:
+    # torch and transformers are only needed (and only installable) outside the Fission environment
+    import torch
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification
+
+    # Load CardiffNLP RoBERTa model
+    print("Loading sentiment analysis model...")
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+    model = AutoModelForSequenceClassification.from_pretrained(MODEL_NAME)
+    print("Model loaded successfully")
+
+    # Move model to GPU if available
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    model.to(device)
+
+# Persistent score cache, off unless SENTIMENT_CACHE_PATH names a writable file: the model volume
+# the batch analyzers keep theirs on is not mounted in the Fission pod
+SENTIMENT_CACHE_PATH = os.environ.get("SENTIMENT_CACHE_PATH", "")
+sentiment_cache = None
+if SENTIMENT_CACHE_PATH:
+    try:
+        sentiment_cache = SentimentCache(SENTIMENT_CACHE_PATH)
+    except Exception as e:
+        print(f"Persistent sentiment cache unavailable, continuing without it: {e}")
+
+# Model version the scores are cached under: the one the inference service reports, which changes
+# with its backend and quantization. None (no caching) when the service cannot tell.
+def current_model_version():
+    if not SENTIMENT_SERVICE_URL:
+        return MODEL_VERSION
+    try:
+        response = requests.get(f"{SENTIMENT_SERVICE_URL}/health", timeout=10)
+        response.raise_for_status()
+        return response.json().get("model_version")
+    except Exception as e:
+        print(f"Could not read the inference service's model version, not using the sentiment cache: {e}")
+        return None
+
+# Score texts with the inference service, in order; returns the scores (None for texts
+# without content) and, per text, the model version the service reported for it
+def get_sentiments_from_service(texts):
+    scores = []
+    model_versions = []
+    for start in range(0, len(texts), SERVICE_BATCH_SIZE):
+        response = requests.post(
+            f"{SENTIMENT_SERVICE_URL}/predict",
+            json={"texts": texts[start:start + SERVICE_BATCH_SIZE]},
+            timeout=120
+        )
+        response.raise_for_status()
+        body = response.json()
+        model_versions.extend(body.get("model_version", MODEL_NAME) for _ in body["results"])
+        for result in body["results"]:
+            if result is None:
+                scores.append(None)
+                continue
+            scores.append({"negative": result["negative"], "neutral": result["neutral"], "positive": result["positive"]})
+    return scores, model_versions
+
+# Function to get sentiment scores for several texts, with the model version of each
+def get_sentiments(texts):
+    if SENTIMENT_SERVICE_URL:
+        return get_sentiments_from_service(texts)
+    return [get_sentiment(text) for text in tqdm(texts)], [MODEL_VERSION] * len(texts)
+
+# Function to get sentiment score; None for texts without content, which stay unlabeled
 def get_sentiment(text):
-    if not text:
-        return {"negative": 0.0, "neutral": 0.0, "positive": 0.0}
+    if not text or not text.strip():
+        return None
+
+    if SENTIMENT_SERVICE_URL:
+        return get_sentiments_from_service([text])[0][0]
 
     inputs = tokenizer(text, return_tensors="pt", truncation=True, max_length=512)
 
@@ -82,78 +151,164 @@ def index_mapping(index_name):
         print(f"Error updating mapping for {index_name}: {e}")
         return False
 
-# Process documents in an index
-def process_index(index_name):
-    total_docs = es.count(index=index_name)["count"]
-    print(f"Processing {index_name}: {total_docs} documents")
-
-    # Process documents in batches
-    batch_size = 100
-    for i in range(0, total_docs, batch_size):
-        print(f"Processing batch {i // batch_size + 1} of {(total_docs // batch_size) + 1}")
-
-        # Query documents
-        response = es.search(
-            index=index_name,
-            body={
-                "query": {
-                    "bool": {
-                        "must_not": {
-                            "exists": {
-                                "field": "roberta_sentiment_label"
-                            }
-                        }
-                    }
+# Documents still waiting for a label; posts the analyzer's language filter skipped are not scored
+UNLABELED_QUERY = {"bool": {"must_not": [
+    {"exists": {"field": "roberta_sentiment_label"}},
+    {"exists": {"field": "sentiment_skipped"}}
+]}}
+
+# Fission stops the function at its functionTimeout (60s for our functions). Stop fetching pages
+# once this budget is spent; the rest is still unlabeled and is picked up by the next invocation.
+TIME_BUDGET_SECONDS = float(os.environ.get("SENTIMENT_TIME_BUDGET_SECONDS", "50"))
+PAGE_SIZE = 500  # Documents fetched, scored and written per round trip
+PIT_KEEP_ALIVE = "2m"
+
+# Look up cached scores and score the distinct remaining texts in one go. Returns the cached
+# scores, the new scores (texts without content left out) and the model version of every score.
+def score_documents(docs, cache_version):
+    cached_scores = {}
+    if sentiment_cache is not None and cache_version:
+        try:
+            cached_scores = sentiment_cache.get_many({digest for _, _, _, digest in docs})
+        except Exception as e:
+            print(f"Sentiment cache lookup failed: {e}")
+
+    uncached = {}
+    for _, _, content, digest in docs:
+        # Blank texts (media-only posts) are not sent to the model and stay unlabeled
+        if digest not in cached_scores and content.strip():
+            uncached.setdefault(digest, content)
+    new_scores = {}
+    model_versions = dict.fromkeys(cached_scores, cache_version)
+    if uncached:
+        scores, versions = get_sentiments(list(uncached.values()))
+        for digest, score, version in zip(uncached, scores, versions):
+            if score is not None:
+                new_scores[digest] = score
+                model_versions[digest] = version
+    return cached_scores, new_scores, model_versions
+
+# Partial-update actions for helpers.bulk; the sequence number guard skips documents changed since they were read
+def update_actions(index_name, docs, scores, model_versions):
+    updated_at = datetime.now(timezone.utc).isoformat()
+    for doc_id, hit, _, digest in docs:
+        sentiment_scores = scores.get(digest)
+        if sentiment_scores is None:
+            continue  # No content to score; left unlabeled
+        action = {
+            "_op_type": "update",
+            "_index": index_name,
+            "_id": doc_id,
+            "doc": {
+                "roberta_sentiment": {
+                    "negative": sentiment_scores["negative"],
+                    "neutral": sentiment_scores["neutral"],
+                    "positive": sentiment_scores["positive"]
                 },
-                "size": batch_size,
-                "from": i,
-                "_source": ["id", "content"]
+                "roberta_sentiment_label": max(sentiment_scores, key=sentiment_scores.get),
+                "sentiment_model_version": model_versions[digest],  # Matched by the analyzer's --rescore
+                "sentiment_updated_at": updated_at  # Read by the sentiment rollups
             }
-        )
+        }
+        if "_seq_no" in hit:
+            action["if_seq_no"] = hit["_seq_no"]
+            action["if_primary_term"] = hit["_primary_term"]
+        yield action
 
-        # Process each document
-        success_count = 0
-        error_count = 0
-        for hit in tqdm(response["hits"]["hits"]):
-            doc_id = hit["_id"]
+# Process documents in an index
+def process_index(index_name, time_budget=TIME_BUDGET_SECONDS):
+    started = time.monotonic()
+    pending = es.count(index=index_name, query=UNLABELED_QUERY)["count"]
+    print(f"Processing {index_name}: {pending} documents without a sentiment label")
+    if not pending:
+        return 0
 
-            # Check if content exists and is a string
-            if "content" not in hit["_source"]:
-                print(f"Document {doc_id} has no content field. Skipping.")
-                continue
+    # The analyzer's re-score mode matches model ids exactly, so the field must not be analyzed text
+    try:
+        es.indices.put_mapping(index=index_name, properties={"sentiment_model_version": {"type": "keyword"}})
+    except Exception as e:
+        print(f"Could not map sentiment_model_version as a keyword in {index_name}: {e}")
 
-            content = hit["_source"].get("content", "")
+    # A point in time gives a stable cursor: labeling documents no longer shifts the pages
+    # still to be read, as it did with from/size paging over the unlabeled query
+    pit_id = es.open_point_in_time(index=index_name, keep_alive=PIT_KEEP_ALIVE)["id"]
+    search_after = None
+    cache_version = current_model_version()
+    labeled = failed = conflicts = scored = 0
+    try:
+        while True:
+            if time.monotonic() - started > time_budget:
+                print(f"Time budget of {time_budget:.0f}s spent; leaving the remaining documents for the next run")
+                break
 
-            if not isinstance(content, str):
-                print(f"Document {doc_id} content is not a string. Skipping.")
-                continue
+            search_params = {
+                "query": UNLABELED_QUERY,
+                "size": PAGE_SIZE,
+                "_source": ["id", "content"],
+                "seq_no_primary_term": True,  # Lets the update skip documents changed since this read
+                "pit": {"id": pit_id, "keep_alive": PIT_KEEP_ALIVE},
+                "sort": [{"_shard_doc": "asc"}]
+            }
+            if search_after:
+                search_params["search_after"] = search_after
+            response = es.search(**search_params)
+            pit_id = response.get("pit_id", pit_id)
+            hits = response["hits"]["hits"]
+            if not hits:
+                break
+            search_after = hits[-1]["sort"]
 
-            # Get sentiment scores
-            sentiment_scores = get_sentiment(content)
-            sentiment_label = max(sentiment_scores, key=sentiment_scores.get)
+            # Collect documents with text content
+            docs = []
+            for hit in hits:
+                content = hit["_source"].get("content")
+                if not isinstance(content, str):
+                    print(f"Document {hit['_id']} has no text content. Skipping.")
+                    continue
+                docs.append((hit["_id"], hit, content, content_digest(content, cache_version or MODEL_VERSION)))
+            if not docs:
+                continue
 
-            # Update document with NEW fields that won't interfere with existing ones
             try:
-                es.update(
-                    index=index_name,
-                    id=doc_id,
-                    body={
-                        "doc": {
-                            "roberta_sentiment": {
-                                "negative": sentiment_scores["negative"],
-                                "neutral": sentiment_scores["neutral"],
-                                "positive": sentiment_scores["positive"]
-                            },
-                            "roberta_sentiment_label": sentiment_label
-                        }
-                    }
-                )
-                success_count += 1
+                cached_scores, new_scores, model_versions = score_documents(docs, cache_version)
             except Exception as e:
-                print(f"Error updating document {doc_id}: {e}")
-                error_count += 1
+                print(f"Sentiment scoring failed, leaving the remaining documents for the next run: {e}")
+                break
+
+            success_count, errors = bulk(
+                es, update_actions(index_name, docs, {**cached_scores, **new_scores}, model_versions),
+                raise_on_error=False, refresh=False
+            )
+            page_conflicts = sum(1 for error in errors if error.get("update", {}).get("status") == 409)
+            for error in errors[:5]:
+                if error.get("update", {}).get("status") != 409:
+                    print(f"Error updating document: {error}")
+            labeled += success_count
+            conflicts += page_conflicts
+            failed += len(errors) - page_conflicts
+            scored += len(new_scores)
+
+            # Only cache under the version the digests were keyed on: scores from a service that
+            # was redeployed with another backend or quantization since the run started are not cached
+            if sentiment_cache is not None and cache_version:
+                try:
+                    sentiment_cache.put_many({digest: score for digest, score in new_scores.items()
+                                              if model_versions[digest] == cache_version})
+                except Exception as e:
+                    print(f"Sentiment cache update failed: {e}")
+
+            print(f"Page results: {success_count} labeled, {len(errors)} not updated, "
+                  f"{len(new_scores)} texts scored by the model")
+    finally:
+        try:
+            es.close_point_in_time(id=pit_id)
+        except Exception as e:
+            print(f"Could not close point in time: {e}")
 
-        print(f"Batch results: {success_count} successful updates, {error_count} failures")
+    print(f"Finished {index_name} in {time.monotonic() - started:.1f}s: {labeled} labeled, {failed} failed, "
+          f"{conflicts} changed concurrently, {scored} texts scored by the model, "
+          f"{max(0, pending - labeled)} left for later runs")
+    return labeled
 
 def process_sentiments(index_name):
     process_index(index_name)
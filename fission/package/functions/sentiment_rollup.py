@@ -0,0 +1,193 @@
+"""Maintains the artist x hour x sentiment rollup index read by the analyser API's trend endpoints.
+
+Writers stamp sentiment_updated_at whenever a labeled post enters the artists index, a
+post gets a sentiment label or gets new artist_ids. Each run finds the hours (by created_at) of posts stamped since the
+watermark, then recomputes those hours' counts from the raw posts and overwrites their
+rollup documents. Recomputing a whole hour instead of adding increments keeps the
+rollups exact when a post is re-labeled or copied twice. Hours found but not yet
+recomputed are kept in the state document, so a run cut short by the time budget
+loses nothing.
+"""
+
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from elasticsearch import helpers
+from functions.es_client import get_es_client
+
+# Connect
+es = get_es_client()
+
+SOURCE_INDEX = "artists"
+ROLLUP_INDEX = "artist-sentiment-rollup"
+STATE_INDEX = "sentiment-rollup-state"
+HOUR_MS = 3600 * 1000
+HOURS_PER_SEARCH = 24  # Hours recomputed by one aggregation
+DISCOVERY_PAGE_SIZE = 1000  # Composite buckets per discovery page
+# Stamps newer than this may still be in flight (unrefreshed or retried bulk writes)
+SETTLE_SECONDS = 300
+# Fission stops the function at its functionTimeout (60s); later hours wait for the next run
+TIME_BUDGET_SECONDS = float(os.environ.get("ROLLUP_TIME_BUDGET_SECONDS", "50"))
+
+ROLLUP_MAPPING = {
+    "properties": {
+        "artist": {"type": "keyword"},
+        "period_start": {"type": "date"},
+        "positive": {"type": "integer"},
+        "neutral": {"type": "integer"},
+        "negative": {"type": "integer"},
+        "total": {"type": "integer"}
+    }
+}
+
+STATE_MAPPING = {
+    "properties": {
+        "watermark": {"type": "date"},
+        "pending_hours": {"type": "long", "index": False},
+        "last_updated": {"type": "date"}
+    }
+}
+
+
+def ensure_indices():
+    for index_name, mapping in ((ROLLUP_INDEX, ROLLUP_MAPPING), (STATE_INDEX, STATE_MAPPING)):
+        if not es.indices.exists(index=index_name):
+            es.indices.create(index=index_name, mappings=mapping)
+            print(f"Created index {index_name}")
+
+
+def load_state():
+    try:
+        return es.get(index=STATE_INDEX, id=SOURCE_INDEX)["_source"]
+    except Exception:
+        return {"watermark": None, "pending_hours": []}
+
+
+def save_state(watermark, pending_hours):
+    es.index(index=STATE_INDEX, id=SOURCE_INDEX, document={
+        "watermark": watermark,
+        "pending_hours": sorted(pending_hours),
+        "last_updated": datetime.now(timezone.utc).isoformat()
+    })
+
+
+def discover_hours(watermark, upper):
+    """Hours holding posts stamped in (watermark, upper]; every hour on the first run"""
+    stamped = {"range": {"sentiment_updated_at": {"lte": upper}}}
+    if watermark:
+        stamped["range"]["sentiment_updated_at"]["gt"] = watermark
+        query = stamped
+    else:
+        # Posts written before writers stamped sentiment_updated_at are rolled up once, here
+        query = {"bool": {"should": [stamped, {"bool": {"must_not": {"exists": {"field": "sentiment_updated_at"}}}}]}}
+
+    hours = set()
+    after = None
+    while True:
+        composite = {
+            "size": DISCOVERY_PAGE_SIZE,
+            "sources": [{"hour": {"date_histogram": {"field": "created_at", "fixed_interval": "1h"}}}]
+        }
+        if after:
+            composite["after"] = after
+        response = es.search(index=SOURCE_INDEX, size=0, query=query, aggs={"hours": {"composite": composite}})
+        aggregation = response["aggregations"]["hours"]
+        hours.update(bucket["key"]["hour"] for bucket in aggregation["buckets"])
+        after = aggregation.get("after_key")
+        if not aggregation["buckets"] or not after:
+            return hours
+
+
+def recompute_hours(hours, artist_groups):
+    """Overwrite the rollup documents of the given hours with counts from the raw posts"""
+    response = es.search(
+        index=SOURCE_INDEX,
+        size=0,
+        query={"bool": {"should": [
+            {"range": {"created_at": {"gte": hour, "lt": hour + HOUR_MS, "format": "epoch_millis"}}} for hour in hours
+        ], "minimum_should_match": 1}},
+        aggs={
+            "hours": {
+                "date_histogram": {"field": "created_at", "fixed_interval": "1h", "min_doc_count": 1},
+                "aggs": {
+                    "artists": {
+                        # Canonical ids set at ingest (artist_tagger.py)
+                        "terms": {"field": "artist_ids", "include": list(artist_groups), "size": len(artist_groups)},
+                        "aggs": {
+                            label: {"filter": {"term": {"roberta_sentiment_label.keyword": label}}}
+                            for label in ("positive", "neutral", "negative")
+                        }
+                    }
+                }
+            }
+        }
+    )
+    counts = {
+        bucket["key"]: {artist_bucket["key"]: artist_bucket for artist_bucket in bucket["artists"]["buckets"]}
+        for bucket in response["aggregations"]["hours"]["buckets"]
+    }
+
+    actions = []
+    for hour in hours:
+        artist_buckets = counts.get(hour, {})
+        period_start = datetime.fromtimestamp(hour / 1000, tz=timezone.utc).isoformat()
+        for artist in artist_groups:
+            bucket = artist_buckets.get(artist, {"doc_count": 0})
+            doc_id = f"{artist}|{hour}"
+            if bucket["doc_count"]:
+                actions.append({
+                    "_op_type": "index",
+                    "_index": ROLLUP_INDEX,
+                    "_id": doc_id,
+                    "_source": {
+                        "artist": artist,
+                        "period_start": period_start,
+                        "positive": bucket["positive"]["doc_count"],
+                        "neutral": bucket["neutral"]["doc_count"],
+                        "negative": bucket["negative"]["doc_count"],
+                        "total": bucket["doc_count"]
+                    }
+                })
+            else:
+                # Posts can leave an hour (deleted, re-dated); drop a rollup that is now empty
+                actions.append({"_op_type": "delete", "_index": ROLLUP_INDEX, "_id": doc_id})
+
+    _, errors = helpers.bulk(es, actions, raise_on_error=False, refresh=False)
+    failed = [error for error in errors if error.get("delete", {}).get("status") != 404]
+    for error in failed[:5]:
+        print(f"Error writing rollup: {error}")
+    return len(failed) == 0
+
+
+def update_rollups(artist_groups, time_budget=TIME_BUDGET_SECONDS):
+    """Recompute the rollups of every hour touched since the last run, within the time budget"""
+    started = time.monotonic()
+    ensure_indices()
+    state = load_state()
+    pending = set(state.get("pending_hours") or [])
+
+    # Move the watermark first and remember the hours it covers, so a cut-short run resumes them
+    upper = (datetime.now(timezone.utc) - timedelta(seconds=SETTLE_SECONDS)).isoformat()
+    new_hours = discover_hours(state.get("watermark"), upper)
+    pending.update(new_hours)
+    watermark = upper
+    save_state(watermark, pending)
+    print(f"Rollup watermark moved to {watermark}: {len(new_hours)} hours touched, {len(pending)} to recompute")
+
+    recomputed = 0
+    while pending:
+        if time.monotonic() - started > time_budget:
+            print(f"Time budget of {time_budget:.0f}s spent; {len(pending)} hours left for the next run")
+            break
+        # Newest hours first: they are the ones users look at
+        batch = sorted(pending, reverse=True)[:HOURS_PER_SEARCH]
+        if not recompute_hours(batch, artist_groups):
+            print("Rollup writes failed; the hours stay pending for the next run")
+            break
+        pending.difference_update(batch)
+        recomputed += len(batch)
+        save_state(watermark, pending)
+
+    es.indices.refresh(index=ROLLUP_INDEX)
+    print(f"Recomputed {recomputed} hours of rollups in {time.monotonic() - started:.1f}s")
+    return recomputed
@@ -0,0 +1,15 @@
+"""Called periodically to keep the artist x hour x sentiment rollup index up to date.
+Posts are counted by the canonical artist ids set at ingest; the artists come from
+artists.json (the same file as the analyser API's app/data/artists.json)."""
+
+from functions.artist_tagger import load_artist_groups
+from functions.sentiment_rollup import update_rollups
+
+def main():
+    """
+    Main entry point for the sentiment rollups
+    """
+
+    # International and Australian artists share one rollup per canonical name
+    update_rollups(load_artist_groups())
+    return "Sentiment rollups updated"
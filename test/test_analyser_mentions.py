@@ -0,0 +1,61 @@
+""" test_analyser_mentions.py """
+import sys
+import os
+import asyncio
+
+# Append project root to sys.path (adjust '..' as needed)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend', 'analyser_api')))
+
+import pytest
+from app.api.routes import analyser
+
+ARTIST_GROUPS = {"Sia": ["Sia"], "AC/DC": ["AC/DC", "acdc"]}
+
+
+@pytest.fixture
+def fake_es(monkeypatch):
+    """Artists index where tagged posts count as requested; records the searches"""
+    state = {"tagged": 0, "searches": []}
+
+    async def es_count(index, **params):
+        return {"count": state["tagged"]}
+
+    async def es_search(index, **params):
+        state["searches"].append(params)
+        mentions = params["aggs"]["artist_mentions"]
+        if "filters" in mentions:
+            return {"aggregations": {"artist_mentions": {"buckets": {
+                artist: {"doc_count": 2} for artist in mentions["filters"]["filters"]}}}}
+        return {"aggregations": {"artist_mentions": {"buckets": [{"key": "Sia", "doc_count": 5}]}}}
+
+    monkeypatch.setattr(analyser, "es_count", es_count)
+    monkeypatch.setattr(analyser, "es_search", es_search)
+    monkeypatch.setattr(analyser, "_artist_ids_tagged", False)
+    return state
+
+
+def test_untagged_index_counts_alias_phrases_in_content_and_title(fake_es):
+    counts = asyncio.run(analyser.count_artist_mentions(ARTIST_GROUPS))
+
+    assert counts == {"Sia": 2, "AC/DC": 2}
+    should = fake_es["searches"][0]["aggs"]["artist_mentions"]["filters"]["filters"]["AC/DC"]["bool"]["should"]
+    assert {"match_phrase": {"title": "acdc"}} in should
+    assert len(should) == 4  # The canonical name is also its first alias
+
+
+def test_tagged_index_counts_artist_ids(fake_es):
+    fake_es["tagged"] = 1
+
+    counts = asyncio.run(analyser.count_artist_mentions(ARTIST_GROUPS))
+
+    assert counts == {"Sia": 5, "AC/DC": 0}
+    assert fake_es["searches"][0]["query"] == {"terms": {"artist_ids": ["Sia", "AC/DC"]}}
+
+
+def test_process_artist_groups_keeps_each_group_in_order(fake_es):
+    fake_es["tagged"] = 1
+
+    international, australia = asyncio.run(analyser.process_artist_groups({"AC/DC": ["acdc"]}, {"Sia": ["Sia"]}))
+
+    assert international == [("`" + "AC/DC".rjust(20), 0)]
+    assert australia == [("`" + "Sia".rjust(20), 5)]
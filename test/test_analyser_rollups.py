@@ -0,0 +1,90 @@
+""" test_analyser_rollups.py """
+import sys
+import os
+import asyncio
+
+# Append project root to sys.path (adjust '..' as needed)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend', 'analyser_api')))
+
+import pytest
+from app.api.routes import analyser
+from app.config import settings
+
+HOUR = analyser.HOUR_MS
+JAN = 1735689600000  # 2025-01-01T00:00:00Z
+FEB = 1738368000000  # 2025-02-01T00:00:00Z
+WATERMARK = "2025-02-01T05:20:00+00:00"
+
+
+@pytest.fixture
+def fake_es(monkeypatch):
+    """Rollup state, rollup and artists indexes answering canned aggregations; records the searches"""
+    state = {"rollup_state": [{"_source": {"watermark": WATERMARK, "pending_hours": [JAN + 2 * HOUR, JAN + 3 * HOUR]}}],
+             "searches": {}}
+
+    async def es_search(index, **params):
+        state["searches"][index] = params
+        if index == settings.ELASTICSEARCH_ROLLUP_STATE_INDEX:
+            return {"hits": {"hits": state["rollup_state"]}}
+        if index == settings.ELASTICSEARCH_ROLLUP_INDEX and "periods" in params["aggs"]:
+            return {"aggregations": {"periods": {"buckets": [
+                {"key": JAN, "key_as_string": "202501", "positive": {"value": 3.0}, "negative": {"value": 1.0},
+                 "neutral": {"value": 0.0}, "total": {"value": 4.0}}]}}}
+        if index == settings.ELASTICSEARCH_ROLLUP_INDEX:
+            return {"aggregations": {"artists": {"buckets": [
+                {"key": "Sia", "monthly_trend": {"buckets": [{"key_as_string": "202501", "total": {"value": 7.0}}]}}]}}}
+        if "periods" in params["aggs"]:
+            return {"aggregations": {"periods": {"buckets": [
+                {"key": FEB, "key_as_string": "202502", "doc_count": 2, "positive": {"doc_count": 2},
+                 "negative": {"doc_count": 0}, "neutral": {"doc_count": 0}},
+                {"key": JAN, "key_as_string": "202501", "doc_count": 1, "positive": {"doc_count": 0},
+                 "negative": {"doc_count": 0}, "neutral": {"doc_count": 1}}]}}}
+        return {"aggregations": {"artists": {"buckets": [
+            {"key": "Sia", "monthly_trend": {"buckets": [{"key_as_string": "202501", "doc_count": 1},
+                                                         {"key_as_string": "202502", "doc_count": 4}]}}]}}}
+
+    async def es_count(index, **params):
+        return {"count": 1}
+
+    monkeypatch.setattr(analyser, "es_search", es_search)
+    monkeypatch.setattr(analyser, "es_count", es_count)
+    monkeypatch.setattr(analyser, "_artist_ids_tagged", False)
+    return state
+
+
+def test_rollups_are_not_used_before_the_first_rollup_run(fake_es):
+    fake_es["rollup_state"] = []
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(analyser.rollup_trends("Sia", "month", None, None))
+
+
+def test_hours_the_rollups_miss_are_counted_live(fake_es):
+    cutoff = FEB + 5 * HOUR
+
+    points = asyncio.run(analyser.rollup_trends("Sia", "month", None, None))
+
+    assert [(point.period, point.positiveSentimentCount, point.neutralSentimentCount, point.totalPostCount)
+            for point in points] == [("202501", 3, 1, 5), ("202502", 2, 0, 2)]
+    rollup_filters = fake_es["searches"][settings.ELASTICSEARCH_ROLLUP_INDEX]["query"]["bool"]["filter"]
+    assert {"terms": {"period_start": [JAN + 2 * HOUR, JAN + 3 * HOUR]}} in rollup_filters[-1]["bool"]["must_not"]
+    live_filters = fake_es["searches"][settings.ELASTICSEARCH_ARTISTS_INDEX]["query"]["bool"]["filter"]
+    assert live_filters[-1]["bool"]["should"] == [
+        {"range": {"created_at": {"gte": JAN + 2 * HOUR, "lt": JAN + 4 * HOUR, "format": "epoch_millis"}}},
+        {"range": {"created_at": {"gte": cutoff, "format": "epoch_millis"}}}
+    ]
+
+
+def test_monthly_mentions_add_live_counts_to_the_rollups(fake_es):
+    mentions = asyncio.run(analyser.rollup_monthly_mentions(["Sia", "Drake"]))
+
+    assert mentions == {"Sia": {"202501": 8, "202502": 4}, "Drake": {}}
+
+
+def test_monthly_mentions_skip_the_rollups_until_posts_are_tagged(fake_es, monkeypatch):
+    async def untagged(index, **params):
+        return {"count": 0}
+    monkeypatch.setattr(analyser, "es_count", untagged)
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(analyser.rollup_monthly_mentions(["Sia"]))
@@ -0,0 +1,69 @@
+""" test_artist_tagger.py """
+import sys
+import os
+
+# The Fission functions are imported as the functions package
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'fission', 'package')))
+
+import pytest
+from functions.artist_tagger import (ARTIST_IDS_FIELD, artist_ids, build_alias_index, load_artist_groups,
+                                     tag_post, tokenize)
+
+
+@pytest.fixture(scope="module")
+def alias_index():
+    return build_alias_index(load_artist_groups())
+
+
+def test_tokenize_lowercases_and_drops_markup():
+    assert tokenize("<p>Taylor  SWIFT!</p>") == ["taylor", "swift"]
+    assert tokenize(None) == []
+
+
+@pytest.mark.parametrize("content", [
+    "Taylor Swift!",
+    "taylor  swift tonight",
+    "<p>Can't wait for <b>TAYLOR SWIFT</b></p>",
+])
+def test_alias_phrases_match_regardless_of_case_and_punctuation(alias_index, content):
+    assert artist_ids({"content": content}, alias_index) == ["Taylor Swift"]
+
+
+def test_partial_words_and_reordered_phrases_do_not_match(alias_index):
+    assert artist_ids({"content": "swiftly taylor"}, alias_index) == []
+    assert artist_ids({"content": "taylor swiftly"}, alias_index) == []
+
+
+def test_short_aliases_map_to_the_canonical_name(alias_index):
+    assert artist_ids({"content": "gaga was great"}, alias_index) == ["Lady Gaga"]
+
+
+def test_ac_dc_matches_its_punctuated_aliases(alias_index):
+    for content in ["AC/DC live", "ac dc live", "ac-dc live"]:
+        assert artist_ids({"content": content}, alias_index) == ["AC/DC"]
+
+
+@pytest.mark.parametrize("tags", [
+    [{"name": "TaylorSwift", "url": "https://mastodon.social/tags/taylorswift"}],
+    ["taylorswift"],
+])
+def test_hashtags_match_as_objects_or_strings(alias_index, tags):
+    assert artist_ids({"content": "new album out", "tags": tags}, alias_index) == ["Taylor Swift"]
+
+
+def test_several_artists_are_sorted_and_deduplicated(alias_index):
+    post = {"content": "Katy Perry and Taylor Swift, then taylor swift again", "tags": ["katyperry", None]}
+
+    assert artist_ids(post, alias_index) == ["Katy Perry", "Taylor Swift"]
+
+
+def test_tag_post_sets_artist_ids(alias_index):
+    post = tag_post({"content": "nothing to see"}, alias_index)
+
+    assert post[ARTIST_IDS_FIELD] == []
+
+
+def test_reddit_titles_are_searched_separately_from_the_content(alias_index):
+    assert artist_ids({"title": "Sia announces a tour", "content": ""}, alias_index) == ["Sia"]
+    # A phrase split across title and content is not a mention
+    assert artist_ids({"title": "I love Taylor", "content": "Swift replies"}, alias_index) == []
@@ -0,0 +1,87 @@
+""" test_bulk_controller.py """
+import sys
+import os
+import types
+
+# The sentiment model scripts run from their own directory
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend', 'sentiment-score-model')))
+
+from bulk_controller import BulkController, is_rejection
+
+
+def fake_es(nodes):
+    return types.SimpleNamespace(cat=types.SimpleNamespace(thread_pool=lambda **kwargs: nodes))
+
+
+def test_clean_full_requests_grow_by_a_fixed_step():
+    controller = BulkController(None, initial_size=500, min_size=50, max_size=5000)
+
+    sizes = []
+    for _ in range(3):
+        controller.record_response(latency=0.1, items=controller.size, rejected=0)
+        sizes.append(controller.size)
+
+    assert sizes == [550, 600, 650]
+
+
+def test_growth_stops_at_max_size():
+    controller = BulkController(None, initial_size=980, min_size=50, max_size=1000)
+
+    controller.record_response(latency=0.1, items=980, rejected=0)
+
+    assert controller.size == 1000
+
+
+def test_partial_requests_do_not_grow():
+    controller = BulkController(None, initial_size=500, min_size=50)
+
+    controller.record_response(latency=0.1, items=120, rejected=0)
+
+    assert controller.size == 500
+
+
+def test_rejections_halve_the_size_and_double_the_pause():
+    controller = BulkController(None, initial_size=800, min_size=50)
+
+    controller.record_response(latency=0.1, items=800, rejected=3)
+    assert (controller.size, controller.delay) == (400, 0.25)
+    controller.record_response(latency=0.1, items=400, rejected=1)
+    assert (controller.size, controller.delay) == (200, 0.5)
+    assert controller.rejected_items == 4
+
+
+def test_slow_requests_shrink_and_size_never_drops_below_min():
+    controller = BulkController(None, initial_size=60, min_size=50)
+
+    controller.record_response(latency=5.0, items=60, rejected=0)
+    controller.record_failure(RuntimeError("timeout"))
+
+    assert controller.size == 50
+    assert controller.delay == 1.0
+
+
+def test_clean_requests_halve_the_pause_after_a_back_off():
+    controller = BulkController(None, initial_size=400, min_size=50)
+    controller.record_failure(RuntimeError("timeout"))
+
+    controller.record_response(latency=0.1, items=10, rejected=0)
+
+    assert controller.delay == 0.5
+
+
+def test_new_write_pool_rejections_back_off():
+    nodes = [{"node_name": "es-0", "queue": "0", "queue_size": "1000", "rejected": "7"}]
+    controller = BulkController(fake_es(nodes), initial_size=400, min_size=50)
+
+    controller.sample_thread_pool()
+    assert controller.size == 400  # The first sample only sets the baseline
+    nodes[0]["rejected"] = "9"
+    controller.sample_thread_pool()
+
+    assert controller.size == 200
+
+
+def test_is_rejection():
+    assert is_rejection({"status": 429})
+    assert is_rejection({"status": 500, "error": {"type": "es_rejected_execution_exception"}})
+    assert not is_rejection({"status": 409, "error": {"type": "version_conflict_engine_exception"}})
@@ -0,0 +1,158 @@
+""" test_cache.py """
+import sys
+import os
+import asyncio
+from datetime import datetime
+
+# Append project root to sys.path (adjust '..' as needed)
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend', 'analyser_api')))
+
+import pytest
+from fastapi import Request
+from app.config import settings
+from app.core import cache
+from app.core.cache import ResponseCache, cache_key
+from app.models.query_models import IntervalEnum
+
+
+def test_cache_key_ignores_artist_case_and_spacing():
+    assert cache_key("trends", {"artist": "Katy  Perry "}) == cache_key("trends", {"artist": "katy perry"})
+
+
+def test_cache_key_is_independent_of_parameter_order():
+    first = cache_key("trends", {"artist": "Katy Perry", "interval": IntervalEnum.week})
+    second = cache_key("trends", {"interval": IntervalEnum.week, "artist": "Katy Perry"})
+
+    assert first == second == "analyser-api:trends?artist=katy perry&interval=week"
+
+
+def test_cache_key_skips_request_and_missing_parameters():
+    request = Request({"type": "http"})
+
+    assert cache_key("metadata", {"request": request, "artist": None}) == "analyser-api:metadata?"
+
+
+def test_cache_key_formats_datetimes_and_separates_endpoints():
+    params = {"startTime": datetime(2024, 1, 2, 3, 4, 5)}
+
+    assert cache_key("trends", params) == "analyser-api:trends?startTime=2024-01-02T03:04:05"
+    assert cache_key("trends", params) != cache_key("distribution", params)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Controls the cache's wall clock and the artists index freshness token"""
+    state = {"now": 1000.0, "token": ["2024-01-01", 10]}
+    monkeypatch.setattr(cache.time, "time", lambda: state["now"])
+    monkeypatch.setattr(settings, "REDIS_URL", "")
+    monkeypatch.setattr(settings, "RESPONSE_CACHE_TTL_SECONDS", 600.0)
+    monkeypatch.setattr(settings, "RESPONSE_CACHE_MAX_STALE_SECONDS", 86400.0)
+    return state
+
+
+def make_cache(clock):
+    response_cache = ResponseCache()
+
+    async def freshness_token():
+        return clock["token"]
+    response_cache.freshness_token = freshness_token
+    return response_cache
+
+
+def counting_compute():
+    calls = []
+
+    async def compute():
+        calls.append(len(calls) + 1)
+        return {"version": len(calls)}
+    return compute, calls
+
+
+async def settle():
+    """Let background refreshes finish"""
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_fresh_entry_is_served_without_recomputing(clock):
+    async def scenario():
+        response_cache = make_cache(clock)
+        compute, calls = counting_compute()
+        first = await response_cache.get_or_compute("key", compute)
+        clock["now"] += 599
+        second = await response_cache.get_or_compute("key", compute)
+        await settle()
+        return first, second, calls
+
+    first, second, calls = asyncio.run(scenario())
+
+    assert first == second == {"version": 1}
+    assert calls == [1]
+
+
+def test_entry_past_ttl_is_served_stale_and_refreshed(clock):
+    async def scenario():
+        response_cache = make_cache(clock)
+        compute, calls = counting_compute()
+        await response_cache.get_or_compute("key", compute)
+        clock["now"] += 601
+        stale = await response_cache.get_or_compute("key", compute)
+        await settle()
+        refreshed = await response_cache.get_or_compute("key", compute)
+        return stale, refreshed, calls
+
+    stale, refreshed, calls = asyncio.run(scenario())
+
+    assert stale == {"version": 1}
+    assert refreshed == {"version": 2}
+    assert calls == [1, 2]
+
+
+def test_new_posts_make_an_entry_stale_before_its_ttl(clock):
+    async def scenario():
+        response_cache = make_cache(clock)
+        compute, calls = counting_compute()
+        await response_cache.get_or_compute("key", compute)
+        clock["token"] = ["2024-01-02", 11]
+        stale = await response_cache.get_or_compute("key", compute)
+        await settle()
+        refreshed = await response_cache.get_or_compute("key", compute)
+        return stale, refreshed, calls
+
+    stale, refreshed, calls = asyncio.run(scenario())
+
+    assert stale == {"version": 1}
+    assert refreshed == {"version": 2}
+    assert calls == [1, 2]
+
+
+def test_entry_past_max_stale_is_recomputed_before_answering(clock):
+    async def scenario():
+        response_cache = make_cache(clock)
+        compute, calls = counting_compute()
+        await response_cache.get_or_compute("key", compute)
+        clock["now"] += 86401
+        return await response_cache.get_or_compute("key", compute), calls
+
+    value, calls = asyncio.run(scenario())
+
+    assert value == {"version": 2}
+    assert calls == [1, 2]
+
+
+def test_concurrent_misses_share_one_computation(clock):
+    async def scenario():
+        response_cache = make_cache(clock)
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return {"total": 3}
+        values = await asyncio.gather(*(response_cache.get_or_compute("key", compute) for _ in range(3)))
+        return values, calls
+
+    values, calls = asyncio.run(scenario())
+
+    assert values == [{"total": 3}] * 3
+    assert calls == [1]
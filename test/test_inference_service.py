@@ -0,0 +1,66 @@
+""" test_inference_service.py """
+import sys
+import os
+import argparse
+import concurrent.futures
+
+# The sentiment model scripts run from their own directory
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend', 'sentiment-score-model')))
+
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("transformers")
+
+from fastapi.testclient import TestClient
+from inference_service import MODEL_NAME, create_app
+
+
+class FakeTokenizer:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts, **kwargs):
+        self.calls.append(texts)
+        return {"input_ids": [[0, len(text), 2] for text in texts], "attention_mask": [[1, 1, 1] for _ in texts]}
+
+
+class FakeBatcher:
+    """Scores a text as positive; no model or inference thread"""
+
+    def submit(self, input_ids, attention_mask):
+        future = concurrent.futures.Future()
+        future.set_result([0.1, 0.2, 0.7])
+        return future
+
+
+@pytest.fixture
+def service():
+    # Without entering the client the startup hook does not run, so no model is loaded
+    app = create_app(argparse.Namespace())
+    app.state.tokenizer = FakeTokenizer()
+    app.state.batcher = FakeBatcher()
+    app.state.model_version = MODEL_NAME
+    return app, TestClient(app)
+
+
+@pytest.mark.parametrize("texts", [[], [""], ["", None], ["  ", "\n"]])
+def test_requests_without_content_get_null_results_without_inference(service, texts):
+    app, client = service
+
+    response = client.post("/predict", json={"texts": texts})
+
+    assert response.status_code == 200
+    assert response.json() == {"model_version": MODEL_NAME, "results": [None] * len(texts)}
+    assert app.state.tokenizer.calls == []
+
+
+def test_blank_texts_keep_their_positions(service):
+    app, client = service
+
+    response = client.post("/predict", json={"texts": ["", "great show", None]})
+
+    results = response.json()["results"]
+    assert results[0] is None and results[2] is None
+    assert results[1] == {"negative": 0.1, "neutral": 0.2, "positive": 0.7, "label": "positive"}
+    assert app.state.tokenizer.calls == [["great show"]]
@@ -0,0 +1,53 @@
+""" test_lexicon_scorer.py """
+import sys
+import os
+import argparse
+
+# The sentiment model scripts run from their own directory
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend', 'sentiment-score-model')))
+
+import pytest
+from lexicon_scorer import MIN_THRESHOLD, cascade_threshold, score_texts
+
+
+def label(scores):
+    return max(scores, key=scores.get)
+
+
+def test_confident_texts_are_labeled_by_polarity():
+    (positive, positive_confidence), (negative, negative_confidence) = score_texts(
+        ["What a great, amazing show :)", "Awful and terrible, I hate it"])
+
+    assert label(positive) == "positive" and positive_confidence > MIN_THRESHOLD
+    assert label(negative) == "negative" and negative_confidence > MIN_THRESHOLD
+
+
+def test_negation_flips_polarity():
+    [(scores, _)] = score_texts(["not good"])
+
+    assert scores["negative"] > 0 and scores["positive"] == 0
+
+
+def test_weak_texts_stay_at_or_below_min_threshold():
+    for text in ["good", "meh", "the album is out", ""]:
+        [(_, confidence)] = score_texts([text])
+        assert confidence <= MIN_THRESHOLD
+
+
+def test_every_accepted_threshold_yields_a_polarity_label():
+    texts = ["good", "great", "so good", "not bad", "love it", "hate it", "awful :(", "meh"]
+    threshold = cascade_threshold("0.55")
+    for scores, confidence in score_texts(texts):
+        if confidence >= threshold:
+            assert label(scores) != "neutral"
+
+
+@pytest.mark.parametrize("value", ["0.5", "0.3", "1.5"])
+def test_cascade_threshold_rejects_values_that_could_label_neutral(value):
+    with pytest.raises(argparse.ArgumentTypeError):
+        cascade_threshold(value)
+
+
+def test_cascade_threshold_accepts_zero_to_disable():
+    assert cascade_threshold("0") == 0
+    assert cascade_threshold("0.8") == 0.8